@@ -0,0 +1,212 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Бенчмарк методов PostgreSQLDatabase при разном числе одновременных
+запросов. Пользователи выбираются случайно из диапазона, заполненного
+seed_database.py, кэш профилей отключен, поэтому каждый вызов обращается
+к базе данных. Результаты (задержки, пропускная способность, размеры
+таблиц) сохраняются в JSON; с --baseline текущий запуск сравнивается с
+предыдущим и завершается с кодом 1 при регрессии.
+
+Запускайте на тестовой базе: deduct_credits и add_balance изменяют баланс
+и записывают операции в историю.
+Запустите: python benchmarks/db_benchmark.py --users 1000000 --concurrency 1,8,32 --output results.json
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+import time
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from cache import UserProfileCache
+from database import PostgreSQLDatabase
+from metrics import db_method_errors
+from seed_database import FIRST_USER_ID
+
+# Метод -> вызов для пользователя
+METHODS = {
+    'get_user_language': lambda db, user_id: db.get_user_language(user_id),
+    'get_user_balance': lambda db, user_id: db.get_user_balance(user_id),
+    'deduct_credits': lambda db, user_id: db.deduct_credits(user_id, 1),
+    'add_balance': lambda db, user_id: db.add_balance(user_id, 1),
+    'get_user_stats': lambda db, user_id: db.get_user_stats(user_id),
+}
+
+# Показатели, рост которых считается регрессией
+REGRESSION_METRICS = ('p50', 'p95', 'p99')
+
+
+def percentile(values: List[float], fraction: float) -> float:
+    return values[min(int(len(values) * fraction), len(values) - 1)]
+
+
+async def measure(db: PostgreSQLDatabase, method: str, concurrency: int, duration: float,
+                  first_id: int, users: int) -> dict:
+    """Вызывает метод из concurrency задач в течение duration секунд"""
+    call = METHODS[method]
+    latencies: List[float] = []
+    errors_before = db_method_errors.value(method)
+    deadline = time.perf_counter() + duration
+
+    async def worker():
+        while time.perf_counter() < deadline:
+            user_id = first_id + random.randrange(users)
+            started = time.perf_counter()
+            await call(db, user_id)
+            latencies.append((time.perf_counter() - started) * 1000)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    calls = len(latencies)
+    if calls:
+        latency_ms = {
+            'mean': round(sum(latencies) / calls, 3),
+            'p50': round(percentile(latencies, 0.5), 3),
+            'p95': round(percentile(latencies, 0.95), 3),
+            'p99': round(percentile(latencies, 0.99), 3),
+            'max': round(latencies[-1], 3),
+        }
+    else:
+        # Ни один вызов не успел выполниться (нулевая длительность или concurrency)
+        latency_ms = dict.fromkeys(('mean', 'p50', 'p95', 'p99', 'max'), 0.0)
+
+    return {
+        'method': method,
+        'concurrency': concurrency,
+        'duration': round(elapsed, 3),
+        'calls': calls,
+        'errors': int(db_method_errors.value(method) - errors_before),
+        'throughput': round(calls / elapsed, 1) if elapsed > 0 else 0.0,
+        'latency_ms': latency_ms,
+    }
+
+
+def describe_database(conn) -> Tuple[str, Dict[str, int]]:
+    """Версия сервера и оценка размеров таблиц"""
+    with conn.cursor() as cursor:
+        cursor.execute("SHOW server_version")
+        version = cursor.fetchone()[0]
+        # Оценка планировщика: точный count(*) по миллионам строк слишком долгий
+        cursor.execute("""
+            SELECT c.relname, GREATEST(c.reltuples, 0)::bigint + COALESCE(
+                (SELECT sum(GREATEST(p.reltuples, 0))::bigint
+                 FROM pg_inherits i JOIN pg_class p ON p.oid = i.inhrelid
+                 WHERE i.inhparent = c.oid), 0)
+            FROM pg_class c
+            WHERE c.relname IN ('users', 'operations', 'user_stats') AND c.relkind IN ('r', 'p')
+        """)
+        return version, dict(cursor.fetchall())
+
+
+async def run(args) -> dict:
+    db = PostgreSQLDatabase()
+    # Без кэша каждый вызов обращается к базе данных
+    db.profile_cache = UserProfileCache(max_size=0)
+    if args.pool_size:
+        db.pool.max_size = args.pool_size
+    await db.open()
+
+    try:
+        version, table_rows = await db.pool.run(describe_database)
+        results = []
+        for method in args.methods:
+            for concurrency in args.concurrency:
+                # Прогрев: открытие соединений и подготовка запросов
+                await measure(db, method, concurrency, min(args.duration, 1.0), args.first_user_id, args.users)
+                result = await measure(db, method, concurrency, args.duration, args.first_user_id, args.users)
+                results.append(result)
+                latency = result['latency_ms']
+                print(f"{method:<18} {concurrency:>4} {result['throughput']:>10.1f} "
+                      f"{latency['p50']:>9.3f} {latency['p95']:>9.3f} {latency['p99']:>9.3f} {result['errors']:>7}")
+    finally:
+        await db.close()
+
+    return {
+        'label': args.label,
+        'started_at': datetime.now().isoformat(timespec='seconds'),
+        'environment': {
+            'server_version': version,
+            'table_rows': table_rows,
+            'pool_max_size': db.pool.max_size,
+            'prepared_statements': db.prepare_statements,
+            'ledger_write_behind': db.ledger is not None,
+            'users': args.users,
+        },
+        'results': results,
+    }
+
+
+def compare(report: dict, baseline: dict, threshold: float) -> List[str]:
+    """Ухудшения относительно предыдущего запуска больше threshold (доля)"""
+    previous = {(r['method'], r['concurrency']): r for r in baseline['results']}
+    regressions = []
+    for result in report['results']:
+        old = previous.get((result['method'], result['concurrency']))
+        if old is None:
+            continue
+        case = f"{result['method']} x{result['concurrency']}"
+        for metric in REGRESSION_METRICS:
+            before, after = old['latency_ms'][metric], result['latency_ms'][metric]
+            if before and after > before * (1 + threshold):
+                regressions.append(f"{case}: {metric} {before:.3f} -> {after:.3f} мс")
+        if old['throughput'] and result['throughput'] < old['throughput'] * (1 - threshold):
+            regressions.append(f"{case}: throughput {old['throughput']} -> {result['throughput']} вызовов/с")
+    return regressions
+
+
+def parse_list(value: str) -> List[str]:
+    return [item.strip() for item in value.split(",") if item.strip()]
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Бенчмарк методов базы данных")
+    parser.add_argument("--methods", type=parse_list, default=list(METHODS),
+                        help="методы через запятую (по умолчанию все)")
+    parser.add_argument("--concurrency", type=lambda v: [int(x) for x in parse_list(v)], default=[1, 8, 32],
+                        help="уровни параллельности через запятую")
+    parser.add_argument("--duration", type=float, default=10.0, help="длительность каждого замера, с")
+    parser.add_argument("--users", type=int, default=1_000_000, help="размер диапазона пользователей")
+    parser.add_argument("--first-user-id", type=int, default=FIRST_USER_ID)
+    parser.add_argument("--pool-size", type=int, default=0, help="размер пула (по умолчанию DB_POOL_MAX_SIZE)")
+    parser.add_argument("--label", default="", help="метка запуска в отчете")
+    parser.add_argument("--output", help="файл JSON для результатов")
+    parser.add_argument("--baseline", help="JSON предыдущего запуска для сравнения")
+    parser.add_argument("--threshold", type=float, default=0.1, help="допустимое ухудшение (доля)")
+    args = parser.parse_args(argv)
+
+    unknown = [method for method in args.methods if method not in METHODS]
+    if unknown:
+        parser.error(f"неизвестные методы: {', '.join(unknown)}")
+
+    print(f"{'метод':<18} {'conc':>4} {'вызовов/с':>10} {'p50, мс':>9} {'p95, мс':>9} {'p99, мс':>9} {'ошибок':>7}")
+    report = asyncio.run(run(args))
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"Результаты сохранены в {args.output}")
+
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            regressions = compare(report, json.load(f), args.threshold)
+        if regressions:
+            print("Регрессии относительно", args.baseline)
+            for line in regressions:
+                print("  " + line)
+            return 1
+        print("Регрессий относительно", args.baseline, "нет")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
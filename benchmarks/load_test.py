@@ -0,0 +1,278 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Нагрузочный тест диспетчера бота. Собирает настоящий Dispatcher через
+register_handlers и подает ему сгенерированные обновления через
+feed_update от имени множества пользователей. Запросы к Telegram
+обрабатываются локальной заглушкой сессии, база данных - настоящая,
+поэтому запускайте скрипт на тестовой базе: он создает пользователей
+и записывает операции в историю.
+
+Каждый пользователь проходит сценарии start, templates, top_up и
+generation; для каждого сценария выводятся p50/p95/p99 задержки
+обработки обновления и общая пропускная способность. Ограничение частоты
+по умолчанию отключено (--throttling включает его); отклоненные им
+обновления считаются отдельно и не входят в задержки.
+Запустите: python benchmarks/load_test.py --users 2000 --concurrency 200
+"""
+
+import argparse
+import asyncio
+import itertools
+import os
+import sys
+import time
+from collections import Counter, defaultdict
+from typing import Any, AsyncGenerator, Dict, List, Optional
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from aiogram import Bot, Dispatcher
+from aiogram.client.session.base import BaseSession
+from aiogram.types import File, Message, Update
+
+from database import db
+from fsm_storage import create_storage
+from generation import generation_queue
+from handlers import generation_job_failed, process_generation_job, register_handlers, throttling
+from send_scheduler import send_scheduler
+from throttling import THROTTLED
+
+# ID, которые не пересекаются с реальными пользователями Telegram
+FIRST_USER_ID = 9_000_000_100_000
+
+FLOWS = ("start", "templates", "top_up", "generation")
+
+# Размер "загружаемого" фото, байт
+PHOTO_SIZE = 64 * 1024
+
+
+class StubSession(BaseSession):
+    """Сессия бота, отвечающая на запросы Bot API без обращения к сети"""
+
+    def __init__(self, latency: float = 0.0):
+        super().__init__()
+        self.latency = latency
+        self.calls: Counter = Counter()
+        self._message_ids = itertools.count(1)
+
+    async def make_request(self, bot: Bot, method, timeout: Optional[int] = None) -> Any:
+        api_method = method.__api_method__
+        self.calls[api_method] += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+
+        if api_method == "getFile":
+            return File(
+                file_id=method.file_id,
+                file_unique_id=f"unique_{method.file_id}",
+                file_size=PHOTO_SIZE,
+                file_path=f"photos/{method.file_id}.jpg"
+            )
+        if api_method in ("sendMessage", "sendPhoto", "editMessageText"):
+            return self._message(method, api_method == "sendPhoto")
+        return True
+
+    async def stream_content(self, url: str, headers: Optional[Dict[str, Any]] = None,
+                             timeout: int = 30, chunk_size: int = 65536,
+                             raise_for_status: bool = True) -> AsyncGenerator[bytes, None]:
+        self.calls["downloadFile"] += 1
+        yield b"\xff" * PHOTO_SIZE
+
+    async def close(self):
+        pass
+
+    def _message(self, method, with_photo: bool) -> Message:
+        message_id = next(self._message_ids)
+        data = {
+            "message_id": message_id,
+            "date": int(time.time()),
+            "chat": {"id": getattr(method, "chat_id", None) or 0, "type": "private"},
+            "text": getattr(method, "text", None),
+        }
+        if with_photo:
+            data["photo"] = [{
+                "file_id": f"result_{message_id}",
+                "file_unique_id": f"result_unique_{message_id}",
+                "width": 512,
+                "height": 512
+            }]
+        return Message.model_validate(data)
+
+
+class UpdateFactory:
+    """Обновления Telegram от имени тестовых пользователей"""
+
+    def __init__(self):
+        self._update_ids = itertools.count(1)
+        self._message_ids = itertools.count(1)
+
+    def message(self, user_id: int, text: Optional[str] = None, photo_id: Optional[str] = None) -> Update:
+        message = {
+            "message_id": next(self._message_ids),
+            "date": int(time.time()),
+            "chat": {"id": user_id, "type": "private"},
+            "from": self._user(user_id),
+        }
+        if text is not None:
+            message["text"] = text
+        if photo_id is not None:
+            message["photo"] = [{
+                "file_id": photo_id,
+                "file_unique_id": f"unique_{photo_id}",
+                "width": 1280,
+                "height": 960,
+                "file_size": PHOTO_SIZE
+            }]
+        return Update.model_validate({"update_id": next(self._update_ids), "message": message})
+
+    def callback(self, user_id: int, data: str) -> Update:
+        return Update.model_validate({
+            "update_id": next(self._update_ids),
+            "callback_query": {
+                "id": str(next(self._update_ids)),
+                "from": self._user(user_id),
+                "chat_instance": str(user_id),
+                "data": data,
+                "message": {
+                    "message_id": next(self._message_ids),
+                    "date": int(time.time()),
+                    "chat": {"id": user_id, "type": "private"},
+                    "text": "menu"
+                }
+            }
+        })
+
+    @staticmethod
+    def _user(user_id: int) -> dict:
+        return {"id": user_id, "is_bot": False, "first_name": "Load", "language_code": "ru"}
+
+
+def flow_updates(factory: UpdateFactory, user_id: int, flow: str, round_number: int) -> List[Update]:
+    """Последовательность обновлений сценария"""
+    if flow == "start":
+        return [factory.message(user_id, text="/start"), factory.callback(user_id, "lang_ru")]
+    if flow == "templates":
+        return [
+            factory.callback(user_id, "send_photo"),
+            factory.callback(user_id, "templates_page_1"),
+            factory.callback(user_id, "templates_page_2"),
+            factory.callback(user_id, "back_to_menu"),
+        ]
+    if flow == "top_up":
+        return [
+            factory.callback(user_id, "top_up_balance"),
+            factory.callback(user_id, "payment_card"),
+            factory.message(user_id, text="100"),
+        ]
+    if flow == "generation":
+        return [
+            factory.callback(user_id, f"template_{round_number % 10 + 1}"),
+            factory.message(user_id, photo_id=f"photo_{user_id}_{round_number}"),
+        ]
+    raise ValueError(f"Неизвестный сценарий: {flow}")
+
+
+def percentile(values: List[float], fraction: float) -> float:
+    return values[min(int(len(values) * fraction), len(values) - 1)]
+
+
+async def simulate_user(dp: Dispatcher, bot: Bot, factory: UpdateFactory, user_id: int,
+                        rounds: int, think_time: float, latencies: Dict[str, List[float]],
+                        rejected: Counter, errors: Counter, semaphore: asyncio.Semaphore):
+    async with semaphore:
+        for round_number in range(rounds):
+            for flow in FLOWS:
+                if flow == "start" and round_number:
+                    continue
+                for update in flow_updates(factory, user_id, flow, round_number):
+                    started = time.perf_counter()
+                    try:
+                        result = await dp.feed_update(bot, update)
+                    except Exception as e:
+                        # Ошибка обработчика не останавливает тест
+                        errors[(flow, type(e).__name__)] += 1
+                        result = None
+                    if result is THROTTLED:
+                        # Отклоненное обновление не доходит до обработчика
+                        rejected[flow] += 1
+                    else:
+                        latencies[flow].append((time.perf_counter() - started) * 1000)
+                    if think_time:
+                        await asyncio.sleep(think_time)
+
+
+async def run(args):
+    session = StubSession(args.api_latency / 1000)
+    bot = Bot(token="123456:LOADTEST", session=session)
+    if args.send_scheduler:
+        bot.session.middleware(send_scheduler)
+
+    storage = create_storage(db)
+    dp = Dispatcher(storage=storage)
+    register_handlers(dp)
+    # Без ограничения частоты измеряется пропускная способность обработчиков
+    throttling.enabled = args.throttling
+
+    await db.open()
+    generation_queue.start(bot, process_generation_job, generation_job_failed)
+
+    factory = UpdateFactory()
+    latencies: Dict[str, List[float]] = defaultdict(list)
+    rejected: Counter = Counter()
+    errors: Counter = Counter()
+    semaphore = asyncio.Semaphore(args.concurrency)
+    started = time.perf_counter()
+    try:
+        await asyncio.gather(*(
+            simulate_user(dp, bot, factory, FIRST_USER_ID + i, args.rounds, args.think_time / 1000,
+                          latencies, rejected, errors, semaphore)
+            for i in range(args.users)
+        ))
+        elapsed = time.perf_counter() - started
+        # Задачи генерации выполняются в фоне после ответа обработчика
+        await generation_queue.close(args.drain_timeout)
+        drained = time.perf_counter() - started
+    finally:
+        await storage.close()
+        await db.close()
+
+    total = sum(len(values) for values in latencies.values())
+    print(f"Пользователей: {args.users}, одновременно: {args.concurrency}, раундов: {args.rounds}")
+    print(f"Обработано обновлений: {total} за {elapsed:.2f} с - {total / elapsed:.1f} обновлений/с, "
+          f"отклонено ограничением частоты: {sum(rejected.values())}")
+    print(f"Очередь генерации завершена через {drained:.2f} с: выполнено {generation_queue.completed}, "
+          f"ошибок {generation_queue.failed}, отклонено {generation_queue.rejected}")
+    print()
+    print(f"{'сценарий':<12} {'обновлений':>10} {'отклонено':>10} "
+          f"{'p50, мс':>10} {'p95, мс':>10} {'p99, мс':>10} {'max, мс':>10}")
+    for flow in FLOWS:
+        values = sorted(latencies[flow])
+        if not values:
+            if rejected[flow]:
+                print(f"{flow:<12} {0:>10} {rejected[flow]:>10}")
+            continue
+        print(f"{flow:<12} {len(values):>10} {rejected[flow]:>10} {percentile(values, 0.5):>10.2f} "
+              f"{percentile(values, 0.95):>10.2f} {percentile(values, 0.99):>10.2f} {values[-1]:>10.2f}")
+    print()
+    if errors:
+        print("Ошибки обработчиков:", {f"{flow}/{name}": count for (flow, name), count in errors.items()})
+    if args.throttling:
+        print("Ограничение частоты:", throttling.stats())
+    print("Запросы к Bot API:", dict(session.calls.most_common()))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Нагрузочный тест диспетчера бота")
+    parser.add_argument("--users", type=int, default=1000, help="количество пользователей")
+    parser.add_argument("--concurrency", type=int, default=100, help="одновременно активных пользователей")
+    parser.add_argument("--rounds", type=int, default=3, help="повторов сценариев на пользователя")
+    parser.add_argument("--think-time", type=float, default=0.0, help="пауза между обновлениями, мс")
+    parser.add_argument("--api-latency", type=float, default=0.0, help="задержка ответа заглушки Bot API, мс")
+    parser.add_argument("--send-scheduler", action="store_true",
+                        help="пропускать запросы через планировщик отправки с лимитами Telegram")
+    parser.add_argument("--throttling", action="store_true",
+                        help="включить ограничение частоты обновлений (отклоненные считаются отдельно)")
+    parser.add_argument("--drain-timeout", type=float, default=60.0,
+                        help="ожидание завершения очереди генерации, с")
+    asyncio.run(run(parser.parse_args()))
@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Сравнение задержек get_user_balance и deduct_credits с подготовленными
+запросами и без них. Запускайте на тестовой базе: скрипт создает
+пользователя и записывает операции в историю.
+Запустите: python benchmarks/prepared_statements.py --iterations 2000
+"""
+
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from cache import UserProfileCache
+from database import PostgreSQLDatabase
+
+# ID, который не пересекается с реальными пользователями Telegram
+BENCH_USER_ID = 9_000_000_000_001
+
+
+async def measure(call, iterations: int) -> dict:
+    """Последовательно вызывает корутину и возвращает задержки в миллисекундах"""
+    # Прогрев: открытие соединений и подготовка запросов
+    for _ in range(10):
+        await call()
+
+    latencies = []
+    for _ in range(iterations):
+        started = time.perf_counter()
+        await call()
+        latencies.append((time.perf_counter() - started) * 1000)
+
+    latencies.sort()
+    return {
+        'mean': statistics.mean(latencies),
+        'p50': latencies[len(latencies) // 2],
+        'p95': latencies[int(len(latencies) * 0.95)],
+    }
+
+
+async def run(iterations: int):
+    results = {}
+    for prepared in (False, True):
+        db = PostgreSQLDatabase(prepare_statements=prepared)
+        # Без кэша каждый вызов get_user_balance обращается к базе данных
+        db.profile_cache = UserProfileCache(max_size=0)
+        await db.open()
+        try:
+            await db.set_user_language(BENCH_USER_ID, 'ru')
+            await db.add_balance(BENCH_USER_ID, iterations + 100)
+
+            results[prepared] = {
+                'get_user_balance': await measure(lambda: db.get_user_balance(BENCH_USER_ID), iterations),
+                'deduct_credits': await measure(lambda: db.deduct_credits(BENCH_USER_ID, 1), iterations),
+            }
+        finally:
+            await db.close()
+
+    print(f"{'метод':<18} {'режим':<10} {'mean, мс':>10} {'p50, мс':>10} {'p95, мс':>10}")
+    for method in ('get_user_balance', 'deduct_credits'):
+        for prepared in (False, True):
+            row = results[prepared][method]
+            mode = 'prepared' if prepared else 'plain'
+            print(f"{method:<18} {mode:<10} {row['mean']:>10.3f} {row['p50']:>10.3f} {row['p95']:>10.3f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Бенчмарк подготовленных запросов")
+    parser.add_argument("--iterations", type=int, default=1000)
+    args = parser.parse_args()
+    asyncio.run(run(args.iterations))
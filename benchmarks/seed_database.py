@@ -0,0 +1,153 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Заполнение тестовой базы пользователями и историей операций для
+бенчмарков. Строки генерируются на сервере (generate_series) пачками
+пользователей, каждая пачка - отдельная транзакция. Триггер статистики
+отключается один раз на все время заполнения (операции, записанные в это
+время ботом, не попадут в user_stats), а user_stats заполняется одним
+агрегирующим запросом на пачку. Баланс до и после операции случайный
+и не образует цепочку - для измерения задержек это не важно.
+
+Только для тестовой базы!
+Запустите: python benchmarks/seed_database.py --users 1000000 --operations-per-user 10
+Удалить данные: python benchmarks/seed_database.py --users 1000000 --clean
+"""
+
+import argparse
+import os
+import sys
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database import db
+
+# ID, которые не пересекаются с реальными пользователями Telegram
+FIRST_USER_ID = 9_100_000_000_000
+
+INSERT_USERS = """
+    INSERT INTO users (user_id, language, balance, created_at, updated_at)
+    SELECT id, CASE WHEN random() < 0.7 THEN 'ru' ELSE 'en' END,
+           round((random() * 1000)::numeric, 2), created_at, created_at
+    FROM (
+        SELECT id, LOCALTIMESTAMP - random() * make_interval(days => %(days)s) AS created_at
+        FROM generate_series(%(first)s::bigint, %(last)s::bigint) AS id
+    ) AS generated
+    ON CONFLICT (user_id) DO NOTHING
+"""
+
+INSERT_OPERATIONS = """
+    INSERT INTO operations (user_id, operation_type, amount, balance_before, balance_after, created_at)
+    SELECT user_id, operation_type, amount, balance_before,
+           CASE WHEN operation_type = 'top_up' THEN balance_before + amount
+                ELSE balance_before - amount END,
+           created_at
+    FROM (
+        SELECT user_id, operation_type,
+               CASE WHEN operation_type = 'top_up' THEN round((100 + random() * 900)::numeric, 2)
+                    WHEN random() < 0.8 THEN 50 ELSE 15 END AS amount,
+               round((random() * 1000)::numeric, 2) AS balance_before,
+               created_at
+        FROM (
+            SELECT user_id,
+                   CASE WHEN random() < 0.3 THEN 'top_up' ELSE 'deduct' END AS operation_type,
+                   LOCALTIMESTAMP - random() * make_interval(days => %(days)s) AS created_at
+            FROM generate_series(%(first)s::bigint, %(last)s::bigint) AS user_id,
+                 generate_series(1, %(per_user)s)
+        ) AS generated
+    ) AS priced
+"""
+
+FILL_USER_STATS = """
+    INSERT INTO user_stats (user_id, total_operations, total_top_ups, total_deductions)
+    SELECT user_id, count(*),
+           COALESCE(sum(amount) FILTER (WHERE operation_type = 'top_up'), 0),
+           COALESCE(sum(amount) FILTER (WHERE operation_type = 'deduct'), 0)
+    FROM operations
+    WHERE user_id BETWEEN %(first)s AND %(last)s
+    GROUP BY user_id
+    ON CONFLICT (user_id) DO UPDATE SET
+        total_operations = EXCLUDED.total_operations,
+        total_top_ups = EXCLUDED.total_top_ups,
+        total_deductions = EXCLUDED.total_deductions
+"""
+
+
+def set_stats_trigger(conn, enabled: bool):
+    action = "ENABLE" if enabled else "DISABLE"
+    with conn.cursor() as cursor:
+        cursor.execute(f"ALTER TABLE operations {action} TRIGGER operations_user_stats")
+    conn.commit()
+
+
+def seed(conn, users: int, per_user: int, batch_size: int, days: int, first_id: int):
+    started = time.perf_counter()
+    # ALTER TABLE берет эксклюзивную блокировку operations, поэтому триггер
+    # отключается один раз, а не для каждой пачки
+    if per_user:
+        set_stats_trigger(conn, enabled=False)
+    try:
+        for batch_first in range(first_id, first_id + users, batch_size):
+            params = {
+                'first': batch_first,
+                'last': min(batch_first + batch_size, first_id + users) - 1,
+                'per_user': per_user,
+                'days': days,
+            }
+            with conn.cursor() as cursor:
+                cursor.execute(INSERT_USERS, params)
+                if per_user:
+                    cursor.execute(INSERT_OPERATIONS, params)
+                    cursor.execute(FILL_USER_STATS, params)
+            conn.commit()
+
+            done = params['last'] - first_id + 1
+            elapsed = time.perf_counter() - started
+            print(f"Пользователей: {done}/{users}, операций: {done * per_user}, {elapsed:.0f} с")
+    finally:
+        if per_user:
+            # Прерванная пачка откатывается, триггер включается в любом случае
+            conn.rollback()
+            set_stats_trigger(conn, enabled=True)
+
+    print("Обновление статистики планировщика (ANALYZE)...")
+    conn.autocommit = True
+    with conn.cursor() as cursor:
+        cursor.execute("ANALYZE users")
+        cursor.execute("ANALYZE operations")
+        cursor.execute("ANALYZE user_stats")
+    print(f"Готово за {time.perf_counter() - started:.0f} с")
+
+
+def clean(conn, users: int, first_id: int):
+    params = {'first': first_id, 'last': first_id + users - 1}
+    with conn.cursor() as cursor:
+        cursor.execute("DELETE FROM operations WHERE user_id BETWEEN %(first)s AND %(last)s", params)
+        operations = cursor.rowcount
+        cursor.execute("DELETE FROM user_stats WHERE user_id BETWEEN %(first)s AND %(last)s", params)
+        cursor.execute("DELETE FROM users WHERE user_id BETWEEN %(first)s AND %(last)s", params)
+        print(f"Удалено пользователей: {cursor.rowcount}, операций: {operations}")
+    conn.commit()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Заполнение тестовой базы для бенчмарков")
+    parser.add_argument("--users", type=int, default=1_000_000, help="количество пользователей")
+    parser.add_argument("--operations-per-user", type=int, default=10, help="операций на пользователя")
+    parser.add_argument("--batch-size", type=int, default=50_000, help="пользователей в транзакции")
+    parser.add_argument("--days", type=int, default=365, help="период истории операций, дней")
+    parser.add_argument("--first-user-id", type=int, default=FIRST_USER_ID)
+    parser.add_argument("--clean", action="store_true", help="удалить ранее созданные данные")
+    args = parser.parse_args()
+
+    conn = db.get_connection()
+    if conn is None:
+        sys.exit(1)
+    try:
+        if args.clean:
+            clean(conn, args.users, args.first_user_id)
+        else:
+            seed(conn, args.users, args.operations_per_user, args.batch_size, args.days, args.first_user_id)
+    finally:
+        conn.close()
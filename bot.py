@@ -1,17 +1,82 @@
 import asyncio
 from aiogram import Bot, Dispatcher
-from config import BOT_TOKEN
-from handlers import register_handlers
+from config import (
+    BOT_TOKEN, BOT_MODE, GENERATION_SHUTDOWN_TIMEOUT, METRICS_HOST, METRICS_PORT,
+    PROFILE_DEFAULT_SECONDS
+)
+from database import db
+from engine import generation_engine
+from fsm_storage import PostgreSQLStorage, create_storage
+from generation import generation_queue
+from handlers import register_handlers, process_generation_job, generation_job_failed
+from maintenance import maintain_partitions, refresh_user_statistics, purge_fsm_states
+from metrics import ApiMetricsMiddleware, InFlightMiddleware, start_metrics_server
+from profiling import install_profile_signal, loop_monitor, loop_profiler
+from send_scheduler import send_scheduler
+from texts import install_reload_signal
 
 async def start_bot():
     bot = Bot(token=BOT_TOKEN)
-    dp = Dispatcher()
-    
+    # Все исходящие запросы проходят через планировщик с лимитами Telegram
+    bot.session.middleware(send_scheduler)
+    # Время запросов к Bot API без ожидания в планировщике
+    bot.session.middleware(ApiMetricsMiddleware())
+    # Общее хранилище FSM позволяет запускать несколько экземпляров бота
+    storage = create_storage(db)
+    dp = Dispatcher(storage=storage)
+    dp.update.outer_middleware(InFlightMiddleware())
+
     # Регистрируем обработчики
     register_handlers(dp)
-    
-    # Запускаем бота
-    await dp.start_polling(bot)
+
+    # Тексты перечитываются из locales/ по SIGHUP без перезапуска
+    install_reload_signal()
+
+    # Профилирование по SIGUSR1 и отчеты о блокировках event loop
+    install_profile_signal(loop_profiler, PROFILE_DEFAULT_SECONDS)
+    if loop_monitor is not None:
+        loop_monitor.watch(dp)
+        loop_monitor.start()
+
+    # Открываем пул соединений с базой данных
+    await db.open()
+
+    # Обработчики очереди генерации изображений
+    generation_queue.start(bot, process_generation_job, generation_job_failed)
+
+    # Фоновое обслуживание: секции истории операций и снимок статистики
+    maintenance = [
+        asyncio.create_task(maintain_partitions(db)),
+        asyncio.create_task(refresh_user_statistics(db))
+    ]
+    if isinstance(storage, PostgreSQLStorage):
+        maintenance.append(asyncio.create_task(purge_fsm_states(storage)))
+
+    metrics_runner = None
+    if METRICS_PORT:
+        metrics_runner = await start_metrics_server(METRICS_HOST, METRICS_PORT)
+
+    try:
+        # Запускаем бота
+        if BOT_MODE == 'webhook':
+            from webhook import run_webhook
+            await run_webhook(dp, bot)
+        else:
+            await dp.start_polling(bot, close_bot_session=False)
+    finally:
+        for task in maintenance:
+            task.cancel()
+        # Очередь завершается до закрытия пула и сессии бота: задачам нужно
+        # отправить результат или вернуть кредиты
+        await generation_queue.close(GENERATION_SHUTDOWN_TIMEOUT)
+        await generation_engine.close()
+        await storage.close()
+        await db.close()
+        await bot.session.close()
+        if metrics_runner is not None:
+            await metrics_runner.cleanup()
+        if loop_monitor is not None:
+            await loop_monitor.stop()
 
 if __name__ == "__main__":
     asyncio.run(start_bot())
@@ -0,0 +1,109 @@
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, replace
+from typing import Dict, Optional, Tuple
+
+
+@dataclass(frozen=True)
+class UserProfile:
+    """Данные пользователя, нужные для отрисовки меню"""
+    language: str
+    balance: float
+    exists: bool = True
+
+
+class UserProfileCache:
+    """LRU-кэш профилей пользователей с ограниченным временем жизни записей.
+
+    Изменения профиля записываются в кэш сразу после записи в базу данных.
+    Чтобы результат чтения, начатого до изменения, не перезаписал более
+    свежие данные, загрузка из базы оформляется парой begin_load()/fill().
+
+    Кэш принадлежит процессу: изменения, сделанные другим экземпляром бота,
+    видны только после истечения ttl. ttl <= 0 отключает кэш.
+    """
+
+    def __init__(self, max_size: int = 10000, ttl: float = 300.0):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        # user_id -> (профиль, момент устаревания)
+        self._entries: "OrderedDict[int, Tuple[UserProfile, float]]" = OrderedDict()
+        # user_id -> маркер текущей загрузки из базы
+        self._loading: Dict[int, object] = {}
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, user_id: int) -> Optional[UserProfile]:
+        """Возвращает профиль из кэша или None"""
+        entry = self._entries.get(user_id)
+        if entry is None:
+            self.misses += 1
+            return None
+
+        profile, expires_at = entry
+        if expires_at <= time.monotonic():
+            del self._entries[user_id]
+            self.misses += 1
+            return None
+
+        self._entries.move_to_end(user_id)
+        self.hits += 1
+        return profile
+
+    def begin_load(self, user_id: int) -> object:
+        """Отмечает начало загрузки профиля из базы данных"""
+        token = object()
+        self._loading[user_id] = token
+        return token
+
+    def fill(self, user_id: int, profile: Optional[UserProfile], token: object):
+        """Завершает загрузку и сохраняет профиль, если за это время он не изменялся"""
+        if self._loading.get(user_id) is not token:
+            return
+        del self._loading[user_id]
+        if profile is not None:
+            self._store(user_id, profile)
+
+    def put(self, user_id: int, profile: UserProfile):
+        """Сохраняет профиль, полностью известный после записи в базу данных"""
+        self._loading.pop(user_id, None)
+        self._store(user_id, profile)
+
+    def update(self, user_id: int, **changes):
+        """Обновляет поля закэшированного профиля после записи в базу данных"""
+        self._loading.pop(user_id, None)
+        entry = self._entries.get(user_id)
+        if entry is not None:
+            profile, expires_at = entry
+            self._entries[user_id] = (replace(profile, **changes), expires_at)
+
+    def invalidate(self, user_id: int):
+        """Удаляет профиль из кэша"""
+        self._loading.pop(user_id, None)
+        self._entries.pop(user_id, None)
+
+    def clear(self):
+        """Очищает кэш"""
+        self._loading.clear()
+        self._entries.clear()
+
+    def stats(self) -> dict:
+        """Счетчики попаданий и промахов"""
+        total = self.hits + self.misses
+        return {
+            'size': len(self._entries),
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_ratio': self.hits / total if total else 0.0
+        }
+
+    def _store(self, user_id: int, profile: UserProfile):
+        if self.ttl <= 0:
+            return
+        self._entries[user_id] = (profile, time.monotonic() + self.ttl)
+        self._entries.move_to_end(user_id)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
@@ -9,3 +9,108 @@ DB_PORT = os.getenv('DB_PORT', '6200')
 DB_NAME = os.getenv('DB_NAME', 'genbot')
 DB_USER = os.getenv('DB_USER', 'postgres')
 DB_PASSWORD = os.getenv('DB_PASSWORD', '123321')
+
+# Connection pool
+DB_POOL_MIN_SIZE = int(os.getenv('DB_POOL_MIN_SIZE', '2'))
+DB_POOL_MAX_SIZE = int(os.getenv('DB_POOL_MAX_SIZE', '10'))
+DB_POOL_ACQUIRE_TIMEOUT = float(os.getenv('DB_POOL_ACQUIRE_TIMEOUT', '5.0'))
+DB_POOL_HEALTH_CHECK_INTERVAL = float(os.getenv('DB_POOL_HEALTH_CHECK_INTERVAL', '30.0'))
+
+# User profile cache (per process, not invalidated across bot instances).
+# TTL 0 disables it; that is the default with a shared FSM storage (several instances)
+PROFILE_CACHE_SIZE = int(os.getenv('PROFILE_CACHE_SIZE', '10000'))
+PROFILE_CACHE_TTL = float(os.getenv(
+    'PROFILE_CACHE_TTL', '300' if os.getenv('FSM_STORAGE', 'memory') == 'memory' else '0'
+))
+
+# Operations ledger partitioning and retention
+OPERATIONS_PARTITIONS_AHEAD = int(os.getenv('OPERATIONS_PARTITIONS_AHEAD', '3'))
+PARTITION_MAINTENANCE_INTERVAL = float(os.getenv('PARTITION_MAINTENANCE_INTERVAL', '86400'))
+OPERATIONS_RETENTION_MONTHS = int(os.getenv('OPERATIONS_RETENTION_MONTHS', '12'))
+OPERATIONS_ARCHIVE_DIR = os.getenv('OPERATIONS_ARCHIVE_DIR', 'archive')
+
+# Disable when running behind a transaction-mode pooler (pgbouncer)
+DB_PREPARED_STATEMENTS = os.getenv('DB_PREPARED_STATEMENTS', '1') == '1'
+
+# Admin reporting
+ADMIN_IDS = {int(x) for x in os.getenv('ADMIN_IDS', '').split(',') if x.strip()}
+USER_STATISTICS_REFRESH_INTERVAL = float(os.getenv('USER_STATISTICS_REFRESH_INTERVAL', '600'))
+
+# Write-behind operations ledger: balances are updated synchronously,
+# history rows are buffered and written with COPY in batches
+LEDGER_WRITE_BEHIND = os.getenv('LEDGER_WRITE_BEHIND', '0') == '1'
+LEDGER_FLUSH_ROWS = int(os.getenv('LEDGER_FLUSH_ROWS', '500'))
+LEDGER_FLUSH_INTERVAL_MS = int(os.getenv('LEDGER_FLUSH_INTERVAL_MS', '200'))
+LEDGER_SPILL_FILE = os.getenv('LEDGER_SPILL_FILE', 'ledger_unflushed.tsv')
+# Rows kept in memory while the database is unavailable, the rest go to the spill file
+LEDGER_MAX_BUFFER_ROWS = int(os.getenv('LEDGER_MAX_BUFFER_ROWS', '100000'))
+
+# Run mode: 'polling' or 'webhook'
+BOT_MODE = os.getenv('BOT_MODE', 'polling')
+WEBHOOK_URL = os.getenv('WEBHOOK_URL', '')  # Public base URL, e.g. https://bot.example.com
+WEBHOOK_PATH = os.getenv('WEBHOOK_PATH', '/webhook')
+WEBHOOK_HOST = os.getenv('WEBHOOK_HOST', '0.0.0.0')
+WEBHOOK_PORT = int(os.getenv('WEBHOOK_PORT', '8080'))
+WEBHOOK_SECRET = os.getenv('WEBHOOK_SECRET', '')
+WEBHOOK_MAX_IN_FLIGHT = int(os.getenv('WEBHOOK_MAX_IN_FLIGHT', '100'))
+WEBHOOK_SHUTDOWN_TIMEOUT = float(os.getenv('WEBHOOK_SHUTDOWN_TIMEOUT', '30'))
+
+# Image generation queue
+GENERATION_WORKERS = int(os.getenv('GENERATION_WORKERS', '4'))
+GENERATION_QUEUE_SIZE = int(os.getenv('GENERATION_QUEUE_SIZE', '100'))
+GENERATION_SHUTDOWN_TIMEOUT = float(os.getenv('GENERATION_SHUTDOWN_TIMEOUT', '60'))
+# Refunds that failed after all retries, for manual processing
+REFUND_FAILURES_FILE = os.getenv('REFUND_FAILURES_FILE', 'refunds_failed.tsv')
+
+# Generation engine and micro-batching
+GENERATION_ENGINE = os.getenv('GENERATION_ENGINE', 'stub')
+GENERATION_BATCH_SIZE = int(os.getenv('GENERATION_BATCH_SIZE', '4'))
+GENERATION_BATCH_WAIT_MS = int(os.getenv('GENERATION_BATCH_WAIT_MS', '50'))
+GENERATION_STUB_LATENCY = float(os.getenv('GENERATION_STUB_LATENCY', '0'))
+
+# Photo downloads
+DOWNLOAD_CACHE_BYTES = int(os.getenv('DOWNLOAD_CACHE_BYTES', str(64 * 1024 * 1024)))
+DOWNLOAD_SPOOL_BYTES = int(os.getenv('DOWNLOAD_SPOOL_BYTES', str(1024 * 1024)))
+DOWNLOAD_MAX_BYTES = int(os.getenv('DOWNLOAD_MAX_BYTES', str(20 * 1024 * 1024)))
+
+# Generation result cache on local disk (0 disables the cache)
+RESULT_CACHE_DIR = os.getenv('RESULT_CACHE_DIR', 'result_cache')
+RESULT_CACHE_MAX_BYTES = int(os.getenv('RESULT_CACHE_MAX_BYTES', '0'))
+
+# FSM storage: 'memory' (single process), 'postgres' or 'redis'
+FSM_STORAGE = os.getenv('FSM_STORAGE', 'memory')
+FSM_REDIS_URL = os.getenv('FSM_REDIS_URL', 'redis://localhost:6379/0')
+FSM_STATE_TTL = float(os.getenv('FSM_STATE_TTL', '604800'))  # 0 disables expiry
+FSM_PURGE_INTERVAL = float(os.getenv('FSM_PURGE_INTERVAL', '3600'))
+
+# Throttling: tokens per second and bucket size per user and handler class
+THROTTLE_NAVIGATION_RATE = float(os.getenv('THROTTLE_NAVIGATION_RATE', '3'))
+THROTTLE_NAVIGATION_BURST = float(os.getenv('THROTTLE_NAVIGATION_BURST', '10'))
+THROTTLE_GENERATION_RATE = float(os.getenv('THROTTLE_GENERATION_RATE', '0.2'))
+THROTTLE_GENERATION_BURST = float(os.getenv('THROTTLE_GENERATION_BURST', '2'))
+THROTTLE_PAYMENT_RATE = float(os.getenv('THROTTLE_PAYMENT_RATE', '0.5'))
+THROTTLE_PAYMENT_BURST = float(os.getenv('THROTTLE_PAYMENT_BURST', '3'))
+# Limit for all users together (0 disables)
+THROTTLE_GLOBAL_RATE = float(os.getenv('THROTTLE_GLOBAL_RATE', '200'))
+THROTTLE_GLOBAL_BURST = float(os.getenv('THROTTLE_GLOBAL_BURST', '400'))
+
+# Outbound sends: messages per second and burst for the whole bot and per chat
+SEND_GLOBAL_RATE = float(os.getenv('SEND_GLOBAL_RATE', '30'))
+SEND_GLOBAL_BURST = float(os.getenv('SEND_GLOBAL_BURST', '30'))
+SEND_CHAT_RATE = float(os.getenv('SEND_CHAT_RATE', '1'))
+SEND_CHAT_BURST = float(os.getenv('SEND_CHAT_BURST', '3'))
+# Groups and channels: 20 messages per minute
+SEND_GROUP_RATE = float(os.getenv('SEND_GROUP_RATE', '0.33'))
+SEND_GROUP_BURST = float(os.getenv('SEND_GROUP_BURST', '3'))
+SEND_MAX_RETRIES = int(os.getenv('SEND_MAX_RETRIES', '3'))
+
+# Metrics endpoint (/metrics in Prometheus text format, 0 disables)
+METRICS_HOST = os.getenv('METRICS_HOST', '127.0.0.1')
+METRICS_PORT = int(os.getenv('METRICS_PORT', '0'))
+
+# Profiling: /profile admin command and SIGUSR1 write cProfile stats to PROFILE_DIR
+PROFILE_DIR = os.getenv('PROFILE_DIR', 'profiles')
+PROFILE_DEFAULT_SECONDS = float(os.getenv('PROFILE_DEFAULT_SECONDS', '30'))
+PROFILE_MAX_SECONDS = float(os.getenv('PROFILE_MAX_SECONDS', '300'))
+# Report handlers blocking the event loop longer than this (0 disables)
+LOOP_LAG_THRESHOLD_MS = float(os.getenv('LOOP_LAG_THRESHOLD_MS', '100'))
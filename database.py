@@ -1,10 +1,125 @@
+import asyncio
 import psycopg2
 from psycopg2.extras import RealDictCursor
 from typing import Optional, Tuple
-from config import DB_HOST, DB_PORT, DB_NAME, DB_USER, DB_PASSWORD
+from config import (
+    DB_HOST, DB_PORT, DB_NAME, DB_USER, DB_PASSWORD,
+    DB_POOL_MIN_SIZE, DB_POOL_MAX_SIZE, DB_POOL_ACQUIRE_TIMEOUT, DB_POOL_HEALTH_CHECK_INTERVAL,
+    PROFILE_CACHE_SIZE, PROFILE_CACHE_TTL, DB_PREPARED_STATEMENTS,
+    LEDGER_WRITE_BEHIND, LEDGER_FLUSH_ROWS, LEDGER_FLUSH_INTERVAL_MS, LEDGER_SPILL_FILE,
+    LEDGER_MAX_BUFFER_ROWS
+)
+from db_pool import ConnectionPool, PoolTimeoutError, PreparedStatement
+from cache import UserProfile, UserProfileCache
+from ledger import LedgerJournal
+from metrics import count_db_error, observe_db_method, registry
+from migrator import get_schema_version, latest_version
+
+# Ошибки, при которых методы базы данных возвращают значения по умолчанию
+DB_ERRORS = (psycopg2.Error, PoolTimeoutError)
+
+# Ключ advisory-блокировки, чтобы снимок статистики обновлял один экземпляр бота
+USER_STATISTICS_LOCK_ID = 62000002
+
+# Часто выполняемые запросы, подготавливаемые на каждом соединении пула
+GET_USER_PROFILE = PreparedStatement(
+    "get_user_profile", ("bigint",),
+    "SELECT language, balance FROM users WHERE user_id = $1"
+)
+
+SET_USER_LANGUAGE = PreparedStatement(
+    "set_user_language", ("bigint", "varchar"),
+    """
+    INSERT INTO users (user_id, language, balance)
+    VALUES ($1, $2, 10.0)
+    ON CONFLICT (user_id) DO UPDATE
+    SET language = EXCLUDED.language, updated_at = CURRENT_TIMESTAMP
+    RETURNING balance
+    """
+)
+
+# Пополнение и запись операции выполняются одним запросом
+ADD_BALANCE = PreparedStatement(
+    "add_balance", ("bigint", "numeric"),
+    """
+    WITH updated AS (
+        UPDATE users
+        SET balance = balance + $2::numeric(10,2),
+            updated_at = CURRENT_TIMESTAMP
+        WHERE user_id = $1
+        RETURNING balance - $2::numeric(10,2) AS balance_before,
+                  balance AS balance_after
+    ), logged AS (
+        INSERT INTO operations (user_id, operation_type, amount, balance_before, balance_after)
+        SELECT $1, 'top_up', $2::numeric(10,2), balance_before, balance_after
+        FROM updated
+    )
+    SELECT balance_after FROM updated
+    """
+)
+
+# Условное списание и запись операции выполняются одним запросом:
+# при нехватке средств UPDATE не затрагивает строку, и вместо
+# результата списания возвращается текущий баланс
+DEDUCT_CREDITS = PreparedStatement(
+    "deduct_credits", ("bigint", "numeric"),
+    """
+    WITH updated AS (
+        UPDATE users
+        SET balance = balance - $2::numeric(10,2),
+            updated_at = CURRENT_TIMESTAMP
+        WHERE user_id = $1 AND balance >= $2::numeric(10,2)
+        RETURNING balance + $2::numeric(10,2) AS balance_before,
+                  balance AS balance_after
+    ), logged AS (
+        INSERT INTO operations (user_id, operation_type, amount, balance_before, balance_after)
+        SELECT $1, 'deduct', $2::numeric(10,2), balance_before, balance_after
+        FROM updated
+    )
+    SELECT TRUE, balance_after FROM updated
+    UNION ALL
+    SELECT FALSE, balance FROM users
+    WHERE user_id = $1 AND NOT EXISTS (SELECT 1 FROM updated)
+    """
+)
+
+# Варианты для отложенной записи истории: запрос только изменяет баланс и
+# возвращает поля строки истории (amount, balance_before, balance_after,
+# created_at), которую затем записывает LedgerJournal
+ADD_BALANCE_DEFERRED = PreparedStatement(
+    "add_balance_deferred", ("bigint", "numeric"),
+    """
+    UPDATE users
+    SET balance = balance + $2::numeric(10,2),
+        updated_at = CURRENT_TIMESTAMP
+    WHERE user_id = $1
+    RETURNING balance, $2::numeric(10,2), balance - $2::numeric(10,2), balance, LOCALTIMESTAMP
+    """
+)
+
+DEDUCT_CREDITS_DEFERRED = PreparedStatement(
+    "deduct_credits_deferred", ("bigint", "numeric"),
+    """
+    WITH updated AS (
+        UPDATE users
+        SET balance = balance - $2::numeric(10,2),
+            updated_at = CURRENT_TIMESTAMP
+        WHERE user_id = $1 AND balance >= $2::numeric(10,2)
+        RETURNING balance + $2::numeric(10,2) AS balance_before,
+                  balance AS balance_after
+    )
+    SELECT TRUE, balance_after,
+           $2::numeric(10,2), balance_before, balance_after, LOCALTIMESTAMP
+    FROM updated
+    UNION ALL
+    SELECT FALSE, balance, NULL, NULL, NULL, NULL FROM users
+    WHERE user_id = $1 AND NOT EXISTS (SELECT 1 FROM updated)
+    """
+)
 
 class PostgreSQLDatabase:
-    def __init__(self):
+    def __init__(self, prepare_statements: bool = DB_PREPARED_STATEMENTS,
+                 ledger_write_behind: bool = LEDGER_WRITE_BEHIND):
         # Параметры подключения к PostgreSQL
         self.db_params = {
             'host': DB_HOST,
@@ -13,272 +128,372 @@ class PostgreSQLDatabase:
             'user': DB_USER,
             'password': DB_PASSWORD
         }
-        self.init_database()
-    
+        # Пул соединений открывается при первом запросе или в open()
+        self.pool = ConnectionPool(
+            self.db_params,
+            min_size=DB_POOL_MIN_SIZE,
+            max_size=DB_POOL_MAX_SIZE,
+            acquire_timeout=DB_POOL_ACQUIRE_TIMEOUT,
+            health_check_interval=DB_POOL_HEALTH_CHECK_INTERVAL
+        )
+        # Подготовленные запросы несовместимы с пулерами в режиме transaction
+        self.prepare_statements = prepare_statements
+        # Кэш языка и баланса пользователей для отрисовки меню
+        self.profile_cache = UserProfileCache(PROFILE_CACHE_SIZE, PROFILE_CACHE_TTL)
+        # Буфер отложенной записи истории операций (None - запись в той же транзакции)
+        self.ledger = None
+        if ledger_write_behind:
+            self.ledger = LedgerJournal(
+                self.pool,
+                flush_rows=LEDGER_FLUSH_ROWS,
+                flush_interval=LEDGER_FLUSH_INTERVAL_MS / 1000,
+                spill_path=LEDGER_SPILL_FILE,
+                max_rows=LEDGER_MAX_BUFFER_ROWS
+            )
+
+    async def open(self):
+        """Открывает пул соединений и проверяет версию схемы"""
+        if self.ledger is not None:
+            self.ledger.start()
+
+        try:
+            await self.pool.open()
+            schema_version = await self.pool.run(get_schema_version)
+        except DB_ERRORS as e:
+            count_db_error()
+            print(f"Ошибка открытия пула соединений: {e}")
+            return
+
+        expected_version = latest_version()
+        if schema_version < expected_version:
+            print(
+                f"Схема базы данных устарела (версия {schema_version}, "
+                f"ожидается {expected_version}). Выполните: python manage.py migrate"
+            )
+
+    async def close(self):
+        """Записывает буфер истории операций и закрывает пул соединений"""
+        if self.ledger is not None:
+            await self.ledger.close()
+        await self.pool.close()
+
     def get_connection(self):
-        """Получает соединение с базой данных"""
+        """Получает отдельное соединение с базой данных (вне пула)"""
         try:
             return psycopg2.connect(**self.db_params)
         except psycopg2.Error as e:
             print(f"Ошибка подключения к PostgreSQL: {e}")
             return None
-    
-    def init_database(self):
-        """Инициализирует базу данных и создает таблицы"""
-        conn = self.get_connection()
-        if not conn:
-            return
-        
-        try:
+
+    @observe_db_method
+    async def ensure_operations_partitions(self, months_ahead: int) -> int:
+        """Создает недостающие месячные секции истории операций"""
+        def query(conn):
             with conn.cursor() as cursor:
-                # Создаем таблицу пользователей
-                cursor.execute("""
-                    CREATE TABLE IF NOT EXISTS users (
-                        user_id BIGINT PRIMARY KEY,
-                        language VARCHAR(2) NOT NULL DEFAULT 'ru',
-                        balance DECIMAL(10,2) NOT NULL DEFAULT 10.0,
-                        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                        updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-                    )
-                """)
-                
-                # Создаем таблицу для истории операций
-                cursor.execute("""
-                    CREATE TABLE IF NOT EXISTS operations (
-                        id SERIAL PRIMARY KEY,
-                        user_id BIGINT NOT NULL,
-                        operation_type VARCHAR(50) NOT NULL,
-                        amount DECIMAL(10,2) NOT NULL,
-                        balance_before DECIMAL(10,2) NOT NULL,
-                        balance_after DECIMAL(10,2) NOT NULL,
-                        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                        FOREIGN KEY (user_id) REFERENCES users(user_id)
-                    )
-                """)
-                
+                cursor.execute("SELECT ensure_operations_partitions(%s)", (months_ahead,))
+                created = cursor.fetchone()[0]
                 conn.commit()
-                print("База данных PostgreSQL инициализирована успешно")
-                
-        except psycopg2.Error as e:
-            print(f"Ошибка инициализации базы данных: {e}")
-        finally:
-            conn.close()
-    
-    def is_new_user(self, user_id: int) -> bool:
+                return created
+
+        try:
+            return await self.pool.run(query)
+        except DB_ERRORS as e:
+            count_db_error()
+            print(f"Ошибка создания секций истории операций: {e}")
+            return 0
+
+    @observe_db_method
+    async def is_new_user(self, user_id: int) -> bool:
         """Проверяет, является ли пользователь новым"""
-        conn = self.get_connection()
-        if not conn:
-            return False
-        
         try:
-            with conn.cursor() as cursor:
-                cursor.execute("SELECT COUNT(*) FROM users WHERE user_id = %s", (user_id,))
-                count = cursor.fetchone()[0]
-                return count == 0
-        except psycopg2.Error as e:
+            profile = await self._load_profile(user_id)
+            return not profile.exists
+        except DB_ERRORS as e:
+            count_db_error()
             print(f"Ошибка проверки нового пользователя: {e}")
             return False
-        finally:
-            conn.close()
-    
-    def add_user(self, user_id: int, language: str) -> bool:
+
+    @observe_db_method
+    async def add_user(self, user_id: int, language: str) -> bool:
         """Добавляет нового пользователя"""
-        conn = self.get_connection()
-        if not conn:
-            return False
-        
-        try:
+        def query(conn):
             with conn.cursor() as cursor:
                 cursor.execute("""
-                    INSERT INTO users (user_id, language, balance) 
+                    INSERT INTO users (user_id, language, balance)
                     VALUES (%s, %s, 10.0)
                     ON CONFLICT (user_id) DO NOTHING
                 """, (user_id, language))
                 conn.commit()
                 return True
-        except psycopg2.Error as e:
+
+        try:
+            return await self.pool.run(query)
+        except DB_ERRORS as e:
+            count_db_error()
             print(f"Ошибка добавления пользователя: {e}")
             return False
         finally:
-            conn.close()
-    
-    def get_user_language(self, user_id: int) -> str:
-        """Получает язык пользователя"""
-        conn = self.get_connection()
-        if not conn:
-            return 'ru'
-        
-        try:
+            self.profile_cache.invalidate(user_id)
+
+    @observe_db_method
+    async def set_user_language(self, user_id: int, language: str) -> UserProfile:
+        """Создает пользователя с выбранным языком или обновляет язык существующего"""
+        def query(conn):
             with conn.cursor() as cursor:
-                cursor.execute("SELECT language FROM users WHERE user_id = %s", (user_id,))
+                SET_USER_LANGUAGE.execute(cursor, (user_id, language), self.prepare_statements)
                 result = cursor.fetchone()
-                return result[0] if result else 'ru'
-        except psycopg2.Error as e:
+                conn.commit()
+                return float(result[0])
+
+        try:
+            balance = await self.pool.run(query)
+        except DB_ERRORS as e:
+            count_db_error()
+            self.profile_cache.invalidate(user_id)
+            print(f"Ошибка сохранения языка пользователя: {e}")
+            return UserProfile(language=language, balance=0.0)
+
+        profile = UserProfile(language=language, balance=balance)
+        self.profile_cache.put(user_id, profile)
+        return profile
+
+    async def _load_profile(self, user_id: int) -> UserProfile:
+        """Получает язык и баланс пользователя из кэша или базы данных"""
+        profile = self.profile_cache.get(user_id)
+        if profile is not None:
+            return profile
+
+        def query(conn):
+            with conn.cursor() as cursor:
+                GET_USER_PROFILE.execute(cursor, (user_id,), self.prepare_statements)
+                return cursor.fetchone()
+
+        token = self.profile_cache.begin_load(user_id)
+        try:
+            result = await self.pool.run(query)
+        except BaseException:
+            self.profile_cache.fill(user_id, None, token)
+            raise
+
+        if result:
+            profile = UserProfile(language=result[0], balance=float(result[1]))
+        else:
+            profile = UserProfile(language='ru', balance=0.0, exists=False)
+        self.profile_cache.fill(user_id, profile, token)
+        return profile
+
+    @observe_db_method
+    async def get_user_profile(self, user_id: int) -> UserProfile:
+        """Получает язык, баланс и признак существования пользователя одним запросом"""
+        try:
+            return await self._load_profile(user_id)
+        except DB_ERRORS as e:
+            count_db_error()
+            print(f"Ошибка получения профиля пользователя: {e}")
+            return UserProfile(language='ru', balance=0.0)
+
+    @observe_db_method
+    async def get_user_language(self, user_id: int) -> str:
+        """Получает язык пользователя"""
+        try:
+            profile = await self._load_profile(user_id)
+            return profile.language
+        except DB_ERRORS as e:
+            count_db_error()
             print(f"Ошибка получения языка пользователя: {e}")
             return 'ru'
-        finally:
-            conn.close()
-    
-    def update_user_language(self, user_id: int, language: str) -> bool:
+
+    @observe_db_method
+    async def update_user_language(self, user_id: int, language: str) -> bool:
         """Обновляет язык пользователя"""
-        conn = self.get_connection()
-        if not conn:
-            return False
-        
-        try:
+        def query(conn):
             with conn.cursor() as cursor:
                 cursor.execute("""
-                    UPDATE users 
-                    SET language = %s, updated_at = CURRENT_TIMESTAMP 
+                    UPDATE users
+                    SET language = %s, updated_at = CURRENT_TIMESTAMP
                     WHERE user_id = %s
                 """, (language, user_id))
                 conn.commit()
                 return True
-        except psycopg2.Error as e:
+
+        try:
+            result = await self.pool.run(query)
+        except DB_ERRORS as e:
+            count_db_error()
+            self.profile_cache.invalidate(user_id)
             print(f"Ошибка обновления языка пользователя: {e}")
             return False
-        finally:
-            conn.close()
-    
-    def get_user_balance(self, user_id: int) -> float:
+
+        self.profile_cache.update(user_id, language=language)
+        return result
+
+    @observe_db_method
+    async def get_user_balance(self, user_id: int) -> float:
         """Получает баланс пользователя"""
-        conn = self.get_connection()
-        if not conn:
-            return 0.0
-        
         try:
-            with conn.cursor() as cursor:
-                cursor.execute("SELECT balance FROM users WHERE user_id = %s", (user_id,))
-                result = cursor.fetchone()
-                return float(result[0]) if result else 0.0
-        except psycopg2.Error as e:
+            profile = await self._load_profile(user_id)
+            return profile.balance
+        except DB_ERRORS as e:
+            count_db_error()
             print(f"Ошибка получения баланса пользователя: {e}")
             return 0.0
-        finally:
-            conn.close()
-    
-    def add_balance(self, user_id: int, amount: float) -> float:
+
+    @observe_db_method
+    async def add_balance(self, user_id: int, amount: float) -> float:
         """Пополняет баланс пользователя"""
-        conn = self.get_connection()
-        if not conn:
-            return 0.0
-        
-        try:
+        statement = ADD_BALANCE if self.ledger is None else ADD_BALANCE_DEFERRED
+
+        def query(conn):
             with conn.cursor() as cursor:
-                # Получаем текущий баланс
-                cursor.execute("SELECT balance FROM users WHERE user_id = %s", (user_id,))
+                statement.execute(cursor, (user_id, amount), self.prepare_statements)
                 result = cursor.fetchone()
-                if not result:
-                    return 0.0
-                
-                current_balance = float(result[0])
-                new_balance = current_balance + amount
-                
-                # Обновляем баланс
-                cursor.execute("""
-                    UPDATE users 
-                    SET balance = %s, updated_at = CURRENT_TIMESTAMP 
-                    WHERE user_id = %s
-                """, (new_balance, user_id))
-                
-                # Записываем операцию
-                cursor.execute("""
-                    INSERT INTO operations (user_id, operation_type, amount, balance_before, balance_after)
-                    VALUES (%s, 'top_up', %s, %s, %s)
-                """, (user_id, amount, current_balance, new_balance))
-                
                 conn.commit()
-                return new_balance
-                
-        except psycopg2.Error as e:
+                return result
+
+        try:
+            result = await self.pool.run(query)
+        except DB_ERRORS as e:
+            count_db_error()
+            self.profile_cache.invalidate(user_id)
             print(f"Ошибка пополнения баланса: {e}")
             return 0.0
-        finally:
-            conn.close()
-    
-    def deduct_credits(self, user_id: int, amount: float) -> Tuple[bool, float]:
+
+        # Пользователь не найден
+        if not result:
+            return 0.0
+
+        if self.ledger is not None:
+            self.ledger.append((user_id, 'top_up', *result[1:]))
+
+        new_balance = float(result[0])
+        self.profile_cache.update(user_id, balance=new_balance)
+        return new_balance
+
+    @observe_db_method
+    async def deduct_credits(self, user_id: int, amount: float) -> Tuple[bool, float]:
         """Списывает кредиты с баланса пользователя"""
-        conn = self.get_connection()
-        if not conn:
-            return False, 0.0
-        
-        try:
+        statement = DEDUCT_CREDITS if self.ledger is None else DEDUCT_CREDITS_DEFERRED
+
+        def query(conn):
             with conn.cursor() as cursor:
-                # Получаем текущий баланс
-                cursor.execute("SELECT balance FROM users WHERE user_id = %s", (user_id,))
+                statement.execute(cursor, (user_id, amount), self.prepare_statements)
                 result = cursor.fetchone()
-                if not result:
-                    return False, 0.0
-                
-                current_balance = float(result[0])
-                
-                # Проверяем достаточность средств
-                if current_balance < amount:
-                    return False, current_balance
-                
-                new_balance = current_balance - amount
-                
-                # Обновляем баланс
-                cursor.execute("""
-                    UPDATE users 
-                    SET balance = %s, updated_at = CURRENT_TIMESTAMP 
-                    WHERE user_id = %s
-                """, (new_balance, user_id))
-                
-                # Записываем операцию
-                cursor.execute("""
-                    INSERT INTO operations (user_id, operation_type, amount, balance_before, balance_after)
-                    VALUES (%s, 'deduct', %s, %s, %s)
-                """, (user_id, amount, current_balance, new_balance))
-                
                 conn.commit()
-                return True, new_balance
-                
-        except psycopg2.Error as e:
+                return result
+
+        try:
+            result = await self.pool.run(query)
+        except DB_ERRORS as e:
+            count_db_error()
+            self.profile_cache.invalidate(user_id)
             print(f"Ошибка списания кредитов: {e}")
             return False, 0.0
-        finally:
-            conn.close()
-    
-    def get_user_stats(self, user_id: int) -> dict:
+
+        # Пользователь не найден
+        if not result:
+            return False, 0.0
+
+        deducted, balance = result[0], float(result[1])
+        if self.ledger is not None and deducted:
+            self.ledger.append((user_id, 'deduct', *result[2:]))
+
+        # Запрос возвращает актуальный баланс и при нехватке средств
+        self.profile_cache.update(user_id, balance=balance)
+        return deducted, balance
+
+    @observe_db_method
+    async def get_user_stats(self, user_id: int) -> dict:
         """Получает статистику пользователя"""
-        conn = self.get_connection()
-        if not conn:
-            return {}
-        
-        try:
+        def query(conn):
             with conn.cursor(cursor_factory=RealDictCursor) as cursor:
-                # Получаем основную информацию о пользователе
+                # Статистика поддерживается триггером, поэтому не зависит от объема истории
                 cursor.execute("""
-                    SELECT user_id, language, balance, created_at, updated_at
-                    FROM users WHERE user_id = %s
+                    SELECT
+                        u.user_id, u.language, u.balance, u.created_at, u.updated_at,
+                        COALESCE(s.total_operations, 0) as total_operations,
+                        COALESCE(s.total_top_ups, 0) as total_top_ups,
+                        COALESCE(s.total_deductions, 0) as total_deductions
+                    FROM users u
+                    LEFT JOIN user_stats s ON s.user_id = u.user_id
+                    WHERE u.user_id = %s
                 """, (user_id,))
-                user_info = cursor.fetchone()
-                
-                if not user_info:
+                row = cursor.fetchone()
+
+                if not row:
                     return {}
-                
-                # Получаем статистику операций
-                cursor.execute("""
-                    SELECT 
-                        COUNT(*) as total_operations,
-                        SUM(CASE WHEN operation_type = 'top_up' THEN amount ELSE 0 END) as total_top_ups,
-                        SUM(CASE WHEN operation_type = 'deduct' THEN amount ELSE 0 END) as total_deductions
-                    FROM operations 
-                    WHERE user_id = %s
-                """, (user_id,))
-                stats = cursor.fetchone()
-                
+
+                stats_keys = ('total_operations', 'total_top_ups', 'total_deductions')
                 return {
-                    'user_info': dict(user_info),
-                    'stats': dict(stats) if stats else {}
+                    'user_info': {k: v for k, v in row.items() if k not in stats_keys},
+                    'stats': {k: row[k] for k in stats_keys}
                 }
-                
-        except psycopg2.Error as e:
+
+        try:
+            return await self.pool.run(query)
+        except DB_ERRORS as e:
+            count_db_error()
             print(f"Ошибка получения статистики пользователя: {e}")
             return {}
-        finally:
-            conn.close()
 
-# Создаем глобальный экземпляр базы данных
+    @observe_db_method
+    async def refresh_user_statistics(self) -> bool:
+        """Обновляет снимок статистики пользователей"""
+        def refresh():
+            # Долгое обновление выполняется на отдельном соединении, не занимая пул
+            conn = self.get_connection()
+            if not conn:
+                return False
+
+            try:
+                with conn.cursor() as cursor:
+                    cursor.execute("SELECT pg_try_advisory_xact_lock(%s)", (USER_STATISTICS_LOCK_ID,))
+                    if not cursor.fetchone()[0]:
+                        conn.rollback()
+                        return False
+                    cursor.execute("REFRESH MATERIALIZED VIEW CONCURRENTLY user_statistics")
+                conn.commit()
+                return True
+            finally:
+                conn.close()
+
+        try:
+            return await asyncio.get_running_loop().run_in_executor(None, refresh)
+        except psycopg2.Error as e:
+            print(f"Ошибка обновления статистики пользователей: {e}")
+            return False
+
+    @observe_db_method
+    async def get_statistics_summary(self) -> dict:
+        """Получает сводную статистику из снимка user_statistics"""
+        def query(conn):
+            with conn.cursor(cursor_factory=RealDictCursor) as cursor:
+                cursor.execute("""
+                    SELECT
+                        COUNT(*) as users,
+                        COALESCE(SUM(balance), 0) as total_balance,
+                        COALESCE(SUM(total_operations), 0) as total_operations,
+                        COALESCE(SUM(total_top_ups), 0) as total_top_ups,
+                        COALESCE(SUM(total_deductions), 0) as total_deductions
+                    FROM user_statistics
+                """)
+                return dict(cursor.fetchone())
+
+        try:
+            return await self.pool.run(query)
+        except DB_ERRORS as e:
+            count_db_error()
+            print(f"Ошибка получения сводной статистики: {e}")
+            return {}
+
+# Создаем глобальный экземпляр базы данных (соединения открываются при первом запросе)
 db = PostgreSQLDatabase()
+
+# Загрузка пула соединений
+registry.gauge("bot_db_pool_connections", "Открытые соединения пула", function=lambda: db.pool.size)
+registry.gauge("bot_db_pool_in_use", "Занятые соединения пула", function=lambda: db.pool.in_use)
+registry.gauge("bot_db_pool_max_size", "Максимальный размер пула", function=lambda: db.pool.max_size)
+
+# Кэш профилей пользователей
+registry.counter("bot_profile_cache_hits_total", "Попадания в кэш профилей", function=lambda: db.profile_cache.hits)
+registry.counter("bot_profile_cache_misses_total", "Промахи кэша профилей", function=lambda: db.profile_cache.misses)
+registry.gauge("bot_profile_cache_size", "Профили в кэше", function=lambda: len(db.profile_cache))
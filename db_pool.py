@@ -0,0 +1,235 @@
+import asyncio
+import re
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from typing import Any, Callable, Deque, Dict, List, Optional, Tuple
+
+import psycopg2
+from psycopg2 import errors, extensions
+
+
+class PoolTimeoutError(Exception):
+    """Не удалось получить соединение из пула за отведенное время"""
+
+
+class PooledConnection(extensions.connection):
+    """Соединение пула, помнящее подготовленные на нем запросы"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.prepared_statements = set()
+
+
+class PreparedStatement:
+    """Запрос, который подготавливается один раз на каждом соединении пула.
+
+    Параметры в тексте запроса записываются как $1, $2, ... Если подготовка
+    отключена (например, за pgbouncer в режиме transaction), запрос
+    выполняется обычным образом с теми же параметрами. Запрос должен быть
+    первым в транзакции: при повторной подготовке транзакция откатывается.
+    """
+
+    def __init__(self, name: str, param_types: Tuple[str, ...], sql: str):
+        self.name = name
+        placeholders = ", ".join(["%s"] * len(param_types))
+        self.prepare_sql = f"PREPARE {name}({', '.join(param_types)}) AS {sql}"
+        self.execute_sql = f"EXECUTE {name}({placeholders})"
+        self.plain_sql = re.sub(r"\$(\d+)", r"%(p\1)s", sql)
+
+    def execute(self, cursor, params: tuple, prepare: bool = True):
+        """Выполняет запрос, при необходимости подготовив его на соединении"""
+        if not prepare:
+            cursor.execute(self.plain_sql, {f"p{i}": value for i, value in enumerate(params, 1)})
+            return
+
+        prepared = cursor.connection.prepared_statements
+        if self.name not in prepared:
+            cursor.execute(self.prepare_sql)
+            prepared.add(self.name)
+
+        try:
+            cursor.execute(self.execute_sql, params)
+        except errors.InvalidSqlStatementName:
+            # Подготовленные запросы сброшены на сервере (например, DISCARD ALL):
+            # ошибка прервала транзакцию, поэтому она откатывается, а запрос
+            # подготавливается заново и выполняется еще один раз
+            prepared.clear()
+            cursor.connection.rollback()
+            cursor.execute(self.prepare_sql)
+            prepared.add(self.name)
+            cursor.execute(self.execute_sql, params)
+
+
+class ConnectionPool:
+    """Ограниченный асинхронный пул соединений psycopg2.
+
+    Драйвер psycopg2 блокирующий, поэтому запросы выполняются в отдельном
+    пуле потоков, а event loop только ожидает их результат. Количество
+    одновременно занятых соединений ограничено max_size, ожидание свободного
+    соединения - acquire_timeout секунд.
+    """
+
+    def __init__(
+        self,
+        db_params: Dict[str, Any],
+        min_size: int = 2,
+        max_size: int = 10,
+        acquire_timeout: float = 5.0,
+        health_check_interval: float = 30.0,
+    ):
+        if min_size < 0 or max_size < 1 or min_size > max_size:
+            raise ValueError("Некорректные размеры пула соединений")
+
+        self.db_params = db_params
+        self.min_size = min_size
+        self.max_size = max_size
+        self.acquire_timeout = acquire_timeout
+        self.health_check_interval = health_check_interval
+
+        # Свободные соединения и время их возврата в пул
+        self._idle: Deque[Tuple[Any, float]] = deque()
+        self._size = 0
+        self._closed = False
+        # Семафор создается внутри работающего event loop
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._executor: Optional[ThreadPoolExecutor] = None
+
+    @property
+    def size(self) -> int:
+        """Количество открытых соединений"""
+        return self._size
+
+    @property
+    def idle(self) -> int:
+        """Количество свободных соединений"""
+        return len(self._idle)
+
+    @property
+    def in_use(self) -> int:
+        """Количество занятых соединений"""
+        return self._size - len(self._idle)
+
+    async def open(self):
+        """Открывает пул и заранее создает min_size соединений"""
+        self._closed = False
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_size)
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(
+                max_workers=self.max_size, thread_name_prefix="db"
+            )
+
+        while self._size < self.min_size:
+            conn = await self._connect()
+            self._idle.append((conn, time.monotonic()))
+
+    async def close(self):
+        """Закрывает свободные соединения; занятые закроются при возврате"""
+        self._closed = True
+        while self._idle:
+            conn, _ = self._idle.popleft()
+            self._discard(conn)
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+            self._executor = None
+
+    async def run(self, func: Callable, *args):
+        """Выполняет func(conn, *args) на соединении из пула в отдельном потоке"""
+        slot = await self._acquire()
+        loop = asyncio.get_running_loop()
+
+        # Проверка, переподключение и запрос выполняются одной задачей в потоке,
+        # а соединение возвращается в пул только после ее завершения,
+        # даже если ожидающая корутина была отменена
+        future = self._executor.submit(self._call, slot, func, args)
+        future.add_done_callback(
+            lambda _: loop.call_soon_threadsafe(self._release, slot)
+        )
+        return await asyncio.wrap_future(future)
+
+    async def _acquire(self) -> List[Any]:
+        if self._closed:
+            raise PoolTimeoutError("Пул соединений закрыт")
+        if self._executor is None:
+            await self.open()
+
+        try:
+            await asyncio.wait_for(self._semaphore.acquire(), self.acquire_timeout)
+        except asyncio.TimeoutError:
+            raise PoolTimeoutError(
+                f"Нет свободных соединений в течение {self.acquire_timeout} с"
+            ) from None
+
+        while self._idle:
+            # Берем последнее возвращенное соединение - оно "горячее"
+            conn, released_at = self._idle.pop()
+            if conn.closed:
+                self._discard(conn)
+                continue
+
+            # Давно простаивающее соединение проверяется перед запросом
+            stale = time.monotonic() - released_at > self.health_check_interval
+            return [conn, stale]
+
+        # Свободных соединений нет - новое будет открыто в потоке
+        self._size += 1
+        return [None, False]
+
+    async def _connect(self):
+        loop = asyncio.get_running_loop()
+        self._size += 1
+        try:
+            return await loop.run_in_executor(
+                self._executor, partial(psycopg2.connect, connection_factory=PooledConnection, **self.db_params)
+            )
+        except BaseException:
+            self._size -= 1
+            raise
+
+    def _release(self, slot: List[Any]):
+        conn = slot[0]
+        if conn is None:
+            # Не удалось открыть соединение
+            self._size -= 1
+        elif self._closed or conn.closed:
+            self._discard(conn)
+        else:
+            self._idle.append((conn, time.monotonic()))
+        self._semaphore.release()
+
+    def _discard(self, conn):
+        self._size -= 1
+        try:
+            conn.close()
+        except psycopg2.Error:
+            pass
+
+    def _call(self, slot: List[Any], func: Callable, args: tuple):
+        conn, stale = slot
+        if conn is not None and stale and not self._ping(conn):
+            conn.close()
+            conn = slot[0] = None
+        if conn is None:
+            conn = slot[0] = psycopg2.connect(connection_factory=PooledConnection, **self.db_params)
+
+        try:
+            return func(conn, *args)
+        finally:
+            # Не оставляем открытых транзакций на соединении в пуле
+            if not conn.closed and conn.get_transaction_status() != extensions.TRANSACTION_STATUS_IDLE:
+                try:
+                    conn.rollback()
+                except psycopg2.Error:
+                    conn.close()
+
+    @staticmethod
+    def _ping(conn) -> bool:
+        try:
+            with conn.cursor() as cursor:
+                cursor.execute("SELECT 1")
+            conn.rollback()
+            return True
+        except psycopg2.Error:
+            return False
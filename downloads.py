@@ -0,0 +1,125 @@
+import asyncio
+import tempfile
+from collections import OrderedDict
+from typing import Dict
+
+from config import DOWNLOAD_CACHE_BYTES, DOWNLOAD_SPOOL_BYTES, DOWNLOAD_MAX_BYTES
+
+
+class PhotoTooLargeError(Exception):
+    """Размер фото превышает допустимый"""
+
+
+class SizeLimitedWriter:
+    """Буфер загрузки, прерывающий ее, как только получено больше max_size байт.
+
+    Размер из getFile необязателен и сообщается клиентом, поэтому
+    ограничение проверяется по фактически полученным данным.
+    """
+
+    def __init__(self, buffer, max_size: int):
+        self.buffer = buffer
+        self.max_size = max_size
+        self.size = 0
+
+    def write(self, chunk: bytes) -> int:
+        self.size += len(chunk)
+        if self.size > self.max_size:
+            raise PhotoTooLargeError(f"Размер фото превышает {self.max_size} байт")
+        return self.buffer.write(chunk)
+
+    def flush(self):
+        self.buffer.flush()
+
+    def seek(self, offset: int, whence: int = 0) -> int:
+        return self.buffer.seek(offset, whence)
+
+
+class PhotoDownloader:
+    """Загрузка фото пользователей с Telegram.
+
+    Файл загружается потоком во временный буфер, который переходит из памяти
+    на диск после spool_size байт. Одновременные загрузки одного файла
+    (по file_unique_id) объединяются в одну, а недавно загруженные фото
+    хранятся в LRU-кэше объемом не более cache_bytes байт.
+    """
+
+    def __init__(self, cache_bytes: int = 64 * 1024 * 1024, spool_size: int = 1024 * 1024,
+                 max_file_size: int = 20 * 1024 * 1024):
+        self.cache_bytes = cache_bytes
+        self.spool_size = spool_size
+        self.max_file_size = max_file_size
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+
+        self._cache: "OrderedDict[str, bytes]" = OrderedDict()
+        self._cache_size = 0
+        self._inflight: Dict[str, asyncio.Task] = {}
+
+    @property
+    def cache_size(self) -> int:
+        return self._cache_size
+
+    async def download(self, bot, file_id: str, file_unique_id: str = "") -> bytes:
+        """Возвращает содержимое фото из кэша или загружает его"""
+        # file_id различается у разных ботов и запросов, file_unique_id - нет
+        key = file_unique_id or file_id
+
+        data = self._cache.get(key)
+        if data is not None:
+            self._cache.move_to_end(key)
+            self.hits += 1
+            return data
+
+        task = self._inflight.get(key)
+        if task is None:
+            self.misses += 1
+            task = asyncio.create_task(self._fetch(bot, file_id))
+            self._inflight[key] = task
+            task.add_done_callback(lambda t: self._finish(key, t))
+        else:
+            self.coalesced += 1
+
+        # Отмена одного ожидающего не прерывает общую загрузку
+        return await asyncio.shield(task)
+
+    def clear(self):
+        """Очищает кэш загруженных фото"""
+        self._cache.clear()
+        self._cache_size = 0
+
+    async def _fetch(self, bot, file_id: str) -> bytes:
+        file = await bot.get_file(file_id)
+        # Заявленный размер позволяет отказать без загрузки
+        if file.file_size and file.file_size > self.max_file_size:
+            raise PhotoTooLargeError(f"Размер фото {file.file_size} байт превышает {self.max_file_size}")
+
+        with tempfile.SpooledTemporaryFile(max_size=self.spool_size) as buffer:
+            await bot.download_file(file.file_path, destination=SizeLimitedWriter(buffer, self.max_file_size))
+            buffer.seek(0)
+            return buffer.read()
+
+    def _finish(self, key: str, task: asyncio.Task):
+        self._inflight.pop(key, None)
+        if task.cancelled() or task.exception() is not None:
+            return
+        self._store(key, task.result())
+
+    def _store(self, key: str, data: bytes):
+        if len(data) > self.cache_bytes:
+            return
+
+        old = self._cache.pop(key, None)
+        if old is not None:
+            self._cache_size -= len(old)
+        self._cache[key] = data
+        self._cache_size += len(data)
+
+        while self._cache_size > self.cache_bytes:
+            _, evicted = self._cache.popitem(last=False)
+            self._cache_size -= len(evicted)
+
+
+# Глобальный загрузчик фото пользователей
+photo_downloader = PhotoDownloader(DOWNLOAD_CACHE_BYTES, DOWNLOAD_SPOOL_BYTES, DOWNLOAD_MAX_BYTES)
@@ -0,0 +1,166 @@
+import asyncio
+from abc import ABC, abstractmethod
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Optional, Sequence, Set, Tuple
+
+from config import (
+    GENERATION_ENGINE, GENERATION_BATCH_SIZE, GENERATION_BATCH_WAIT_MS, GENERATION_STUB_LATENCY
+)
+
+
+class GenerationEngineError(Exception):
+    """Ошибка движка генерации"""
+
+
+@dataclass(frozen=True)
+class EngineRequest:
+    """Один запрос к движку: исходное изображение и промпт"""
+    image: bytes
+    prompt: str
+
+
+class GenerationEngine(ABC):
+    """Движок генерации изображений.
+
+    Движок обрабатывает запросы пакетами: generate_batch() получает список
+    запросов и возвращает изображения в том же порядке. Версия движка
+    входит в ключи кэша результатов, а кэшируются результаты только
+    детерминированных движков.
+    """
+
+    name = ""
+    version = ""
+    deterministic = False
+
+    @abstractmethod
+    async def generate_batch(self, requests: Sequence[EngineRequest]) -> List[bytes]:
+        """Генерирует изображения для пакета запросов"""
+
+    async def close(self):
+        """Освобождает ресурсы движка"""
+
+
+class LocalStubEngine(GenerationEngine):
+    """Локальная заглушка без GPU: возвращает исходные изображения"""
+
+    name = "stub"
+    version = "stub-1"
+    deterministic = True
+
+    def __init__(self, latency: float = 0.0):
+        # Имитация времени обработки одного пакета
+        self.latency = latency
+
+    async def generate_batch(self, requests: Sequence[EngineRequest]) -> List[bytes]:
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        return [request.image for request in requests]
+
+
+# Фабрики движков по значению GENERATION_ENGINE
+ENGINES: Dict[str, Callable[[], GenerationEngine]] = {
+    LocalStubEngine.name: lambda: LocalStubEngine(latency=GENERATION_STUB_LATENCY),
+}
+
+
+def create_engine(name: str) -> GenerationEngine:
+    """Создает движок генерации по имени"""
+    try:
+        factory = ENGINES[name]
+    except KeyError:
+        raise ValueError(f"Неизвестный движок генерации: {name}") from None
+    return factory()
+
+
+class MicroBatcher:
+    """Группирует одновременные запросы в пакеты для движка генерации.
+
+    Пакет отправляется, когда набрано max_batch_size запросов или с момента
+    первого запроса в пакете прошло max_wait секунд.
+    """
+
+    def __init__(self, engine: GenerationEngine, max_batch_size: int = 8, max_wait: float = 0.05):
+        self.engine = engine
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+        self.batches = 0
+        self.batched_requests = 0
+
+        self._pending: List[Tuple[EngineRequest, asyncio.Future]] = []
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._running: Set[asyncio.Task] = set()
+
+    @property
+    def version(self) -> str:
+        return self.engine.version
+
+    @property
+    def deterministic(self) -> bool:
+        return self.engine.deterministic
+
+    async def generate(self, image: bytes, prompt: str) -> bytes:
+        """Генерирует одно изображение в составе ближайшего пакета"""
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((EngineRequest(image, prompt), future))
+
+        if len(self._pending) >= self.max_batch_size:
+            self._flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.max_wait, self._flush)
+
+        return await future
+
+    async def close(self):
+        """Отправляет накопленные запросы, дожидается пакетов и закрывает движок"""
+        while self._pending:
+            self._flush()
+        if self._running:
+            await asyncio.gather(*self._running, return_exceptions=True)
+        await self.engine.close()
+
+    def _flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+
+        batch = self._pending[:self.max_batch_size]
+        self._pending = self._pending[self.max_batch_size:]
+        if self._pending:
+            self._timer = asyncio.get_running_loop().call_later(self.max_wait, self._flush)
+
+        # Запросы, ожидание которых отменено, в пакет не попадают
+        batch = [(request, future) for request, future in batch if not future.done()]
+        if not batch:
+            return
+
+        task = asyncio.create_task(self._run(batch))
+        self._running.add(task)
+        task.add_done_callback(self._running.discard)
+
+    async def _run(self, batch: List[Tuple[EngineRequest, asyncio.Future]]):
+        self.batches += 1
+        self.batched_requests += len(batch)
+        try:
+            results = await self.engine.generate_batch([request for request, _ in batch])
+            if len(results) != len(batch):
+                raise GenerationEngineError(
+                    f"Движок вернул {len(results)} результатов для пакета из {len(batch)}"
+                )
+        except Exception as e:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        for (_, future), result in zip(batch, results):
+            if not future.done():
+                future.set_result(result)
+
+
+# Глобальный движок генерации с пакетной обработкой запросов
+generation_engine = MicroBatcher(
+    create_engine(GENERATION_ENGINE),
+    max_batch_size=GENERATION_BATCH_SIZE,
+    max_wait=GENERATION_BATCH_WAIT_MS / 1000
+)
@@ -0,0 +1,155 @@
+import json
+from datetime import timedelta
+from typing import Any, Dict, Mapping, Optional
+
+from aiogram.fsm.state import State
+from aiogram.fsm.storage.base import BaseStorage, StateType, StorageKey
+from aiogram.fsm.storage.memory import MemoryStorage
+
+from config import FSM_STORAGE, FSM_REDIS_URL, FSM_STATE_TTL
+
+# Актуальная запись: срок хранения не задан или еще не истек
+ALIVE = "(expires_at IS NULL OR expires_at > now())"
+
+# Поле state и data записи с истекшим сроком хранения считаются пустыми
+SET_STATE = """
+    INSERT INTO fsm_states AS s (key, state, expires_at)
+    VALUES (%(key)s, %(state)s, now() + %(ttl)s * interval '1 second')
+    ON CONFLICT (key) DO UPDATE SET
+        state = EXCLUDED.state,
+        data = CASE WHEN s.expires_at IS NULL OR s.expires_at > now() THEN s.data ELSE '{}' END,
+        expires_at = EXCLUDED.expires_at
+"""
+
+SET_DATA = """
+    INSERT INTO fsm_states AS s (key, data, expires_at)
+    VALUES (%(key)s, %(data)s, now() + %(ttl)s * interval '1 second')
+    ON CONFLICT (key) DO UPDATE SET
+        state = CASE WHEN s.expires_at IS NULL OR s.expires_at > now() THEN s.state END,
+        data = EXCLUDED.data,
+        expires_at = EXCLUDED.expires_at
+"""
+
+# Слияние выполняется в базе, поэтому параллельные обновления не теряются
+UPDATE_DATA = """
+    INSERT INTO fsm_states AS s (key, data, expires_at)
+    VALUES (%(key)s, %(data)s, now() + %(ttl)s * interval '1 second')
+    ON CONFLICT (key) DO UPDATE SET
+        state = CASE WHEN s.expires_at IS NULL OR s.expires_at > now() THEN s.state END,
+        data = CASE WHEN s.expires_at IS NULL OR s.expires_at > now() THEN s.data ELSE '{}' END
+               || EXCLUDED.data,
+        expires_at = EXCLUDED.expires_at
+    RETURNING data
+"""
+
+# Пустые записи не хранятся
+DELETE_EMPTY = "DELETE FROM fsm_states WHERE key = %(key)s AND state IS NULL AND data = '{}'"
+
+
+def storage_key(key: StorageKey) -> str:
+    """Компактный строковый ключ записи FSM"""
+    return ":".join((
+        str(key.bot_id),
+        str(key.chat_id),
+        str(key.user_id),
+        str(key.thread_id or ""),
+        key.business_connection_id or "",
+        key.destiny
+    ))
+
+
+def dump_data(data: Mapping[str, Any]) -> str:
+    """Сериализует данные FSM в компактный JSON"""
+    return json.dumps(data, ensure_ascii=False, separators=(",", ":"))
+
+
+class PostgreSQLStorage(BaseStorage):
+    """Хранилище FSM в таблице fsm_states через пул соединений бота.
+
+    Каждая запись продлевается на ttl секунд при изменении (None - без срока).
+    Истекшие записи не читаются и удаляются purge_expired().
+    """
+
+    def __init__(self, pool, ttl: Optional[float] = None):
+        self.pool = pool
+        self.ttl = ttl
+
+    async def set_state(self, key: StorageKey, state: StateType = None) -> None:
+        params = self._params(key, state=state.state if isinstance(state, State) else state)
+        await self.pool.run(self._write, SET_STATE, params)
+
+    async def get_state(self, key: StorageKey) -> Optional[str]:
+        row = await self.pool.run(self._read, "state", storage_key(key))
+        return row[0] if row else None
+
+    async def set_data(self, key: StorageKey, data: Mapping[str, Any]) -> None:
+        params = self._params(key, data=dump_data(data))
+        await self.pool.run(self._write, SET_DATA, params)
+
+    async def get_data(self, key: StorageKey) -> Dict[str, Any]:
+        row = await self.pool.run(self._read, "data", storage_key(key))
+        return dict(row[0]) if row else {}
+
+    async def update_data(self, key: StorageKey, data: Mapping[str, Any]) -> Dict[str, Any]:
+        params = self._params(key, data=dump_data(data))
+        return dict(await self.pool.run(self._write, UPDATE_DATA, params))
+
+    async def purge_expired(self) -> int:
+        """Удаляет записи с истекшим сроком хранения"""
+        def query(conn):
+            with conn.cursor() as cursor:
+                cursor.execute("DELETE FROM fsm_states WHERE expires_at <= now()")
+                deleted = cursor.rowcount
+            conn.commit()
+            return deleted
+
+        return await self.pool.run(query)
+
+    async def close(self) -> None:
+        # Пул соединений принадлежит базе данных и закрывается вместе с ней
+        pass
+
+    def _params(self, key: StorageKey, **values) -> dict:
+        return {"key": storage_key(key), "ttl": self.ttl, **values}
+
+    @staticmethod
+    def _read(conn, column: str, key: str):
+        with conn.cursor() as cursor:
+            cursor.execute(f"SELECT {column} FROM fsm_states WHERE key = %s AND {ALIVE}", (key,))
+            return cursor.fetchone()
+
+    @staticmethod
+    def _write(conn, query: str, params: dict):
+        with conn.cursor() as cursor:
+            cursor.execute(query, params)
+            result = cursor.fetchone()[0] if cursor.description else None
+            cursor.execute(DELETE_EMPTY, params)
+        conn.commit()
+        return result
+
+
+def create_redis_storage(redis, ttl: Optional[float] = None) -> BaseStorage:
+    """Хранилище FSM в Redis; ttl - срок хранения в секундах (None - без срока)"""
+    from aiogram.fsm.storage.redis import RedisStorage
+
+    # redis-py принимает срок SET ex только как int или timedelta целых секунд
+    expiry = timedelta(seconds=max(int(ttl), 1)) if ttl else None
+    return RedisStorage(redis, state_ttl=expiry, data_ttl=expiry)
+
+
+def create_storage(db) -> BaseStorage:
+    """Создает хранилище FSM по значению FSM_STORAGE"""
+    ttl = FSM_STATE_TTL or None
+
+    if FSM_STORAGE == "postgres":
+        return PostgreSQLStorage(db.pool, ttl=ttl)
+
+    if FSM_STORAGE == "redis":
+        # Требует пакет redis: pip install redis
+        from redis.asyncio import Redis
+        return create_redis_storage(Redis.from_url(FSM_REDIS_URL), ttl)
+
+    if FSM_STORAGE == "memory":
+        return MemoryStorage()
+
+    raise ValueError(f"Неизвестное хранилище FSM: {FSM_STORAGE}")
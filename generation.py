@@ -0,0 +1,210 @@
+import asyncio
+import time
+from dataclasses import asdict, dataclass
+from datetime import datetime
+from typing import Awaitable, Callable, List, Optional
+
+from config import GENERATION_WORKERS, GENERATION_QUEUE_SIZE, REFUND_FAILURES_FILE
+from database import db
+from metrics import registry
+from send_scheduler import bulk_sends
+
+# Попытки возврата кредитов и пауза перед повтором (растет с номером попытки), с
+REFUND_ATTEMPTS = 3
+REFUND_RETRY_DELAY = 0.5
+
+generation_latency = registry.histogram(
+    "bot_generation_job_duration_seconds", "Время выполнения задач генерации", ("status",)
+)
+queue_wait = registry.histogram(
+    "bot_generation_queue_wait_seconds", "Время ожидания задач генерации в очереди"
+)
+refund_failures = registry.counter(
+    "bot_refund_failures_total", "Возвраты кредитов, не выполненные после всех попыток"
+)
+
+
+async def refund_credits(user_id: int, amount: float) -> Optional[float]:
+    """Возвращает кредиты на баланс, повторяя попытку при ошибке базы данных.
+
+    add_balance при ошибке возвращает 0.0, а после возврата положительной
+    суммы баланс не меньше нее. Возвращает новый баланс или None, если
+    вернуть кредиты не удалось: тогда возврат дописывается в
+    REFUND_FAILURES_FILE для ручной обработки.
+    """
+    for attempt in range(1, REFUND_ATTEMPTS + 1):
+        balance = await db.add_balance(user_id, amount)
+        if balance >= amount:
+            return balance
+        if attempt < REFUND_ATTEMPTS:
+            await asyncio.sleep(REFUND_RETRY_DELAY * attempt)
+
+    refund_failures.inc()
+    try:
+        with open(REFUND_FAILURES_FILE, "a", encoding="utf-8") as f:
+            f.write(f"{user_id}\t{amount}\t{datetime.now().isoformat(timespec='seconds')}\n")
+    except OSError as e:
+        print(f"Ошибка записи в {REFUND_FAILURES_FILE}: {e}")
+    print(f"Не удалось вернуть {amount} кредитов пользователю {user_id}, возврат записан в {REFUND_FAILURES_FILE}")
+    return None
+
+
+class GenerationQueueFull(Exception):
+    """Очередь генерации заполнена"""
+
+
+class CreditsNotDeducted(Exception):
+    """Не удалось списать стоимость генерации"""
+
+
+@dataclass(frozen=True)
+class GenerationRequest:
+    """Параметры генерации, сохраняемые в FSM для повторной генерации"""
+    photo_file_id: str
+    prompt_type: str
+    prompt: str
+    # Ключ для объединения загрузок одного фото
+    photo_unique_id: str = ""
+
+    @property
+    def engine_prompt(self) -> str:
+        """Промпт для движка генерации (шаблон передается идентификатором)"""
+        if self.prompt_type == "template":
+            return f"template_{self.prompt}"
+        return self.prompt
+
+
+@dataclass(frozen=True)
+class GenerationJob:
+    """Оплаченная задача генерации"""
+    user_id: int
+    chat_id: int
+    language: str
+    request: GenerationRequest
+    cost: float
+    # Баланс после списания стоимости задачи
+    balance: float
+
+    def state_data(self) -> dict:
+        return asdict(self.request)
+
+
+class GenerationQueue:
+    """Ограниченная очередь задач генерации с пулом обработчиков.
+
+    Обработчики обновлений ставят оплаченную задачу в очередь и сразу
+    завершаются, а генерацию выполняют workers фоновых задач. Если задача
+    завершилась ошибкой или была прервана остановкой бота, ее стоимость
+    возвращается на баланс пользователя.
+    """
+
+    def __init__(self, workers: int = 4, max_size: int = 100):
+        self.workers = workers
+        self.max_size = max_size
+        self.submitted = 0
+        self.completed = 0
+        self.failed = 0
+        self.rejected = 0
+
+        self._queue: Optional[asyncio.Queue] = None
+        self._tasks: List[asyncio.Task] = []
+        self._bot = None
+        self._process = None
+        self._on_failure = None
+
+    def __len__(self) -> int:
+        return self._queue.qsize() if self._queue is not None else 0
+
+    def start(self, bot,
+              process: Callable[..., Awaitable],
+              on_failure: Callable[..., Awaitable]):
+        """Запускает обработчики очереди.
+
+        process(bot, job) выполняет генерацию и отправляет результат,
+        on_failure(bot, job, refunded) уведомляет пользователя после попытки
+        возврата кредитов (refunded - удалось ли их вернуть).
+        """
+        if self._tasks:
+            return
+        self._bot = bot
+        self._process = process
+        self._on_failure = on_failure
+        self._queue = asyncio.Queue(self.max_size)
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+    def full(self) -> bool:
+        return self._queue is None or self._queue.full()
+
+    def submit(self, job: GenerationJob):
+        """Ставит задачу в очередь или выбрасывает GenerationQueueFull"""
+        if self._queue is None:
+            raise GenerationQueueFull("Очередь генерации не запущена")
+        try:
+            # Момент постановки нужен для времени ожидания в очереди
+            self._queue.put_nowait((job, time.perf_counter()))
+        except asyncio.QueueFull:
+            self.rejected += 1
+            raise GenerationQueueFull("Очередь генерации заполнена") from None
+        self.submitted += 1
+
+    async def close(self, timeout: float):
+        """Дожидается выполнения поставленных задач и останавливает обработчики"""
+        if not self._tasks:
+            return
+
+        try:
+            await asyncio.wait_for(self._queue.join(), timeout)
+        except asyncio.TimeoutError:
+            print(f"Очередь генерации не завершена за {timeout} с, задачи будут отменены")
+
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+        # Задачи, до которых обработчики не дошли, уже оплачены
+        while not self._queue.empty():
+            job, _ = self._queue.get_nowait()
+            await self._refund(job)
+        self._queue = None
+
+    async def _worker(self):
+        while True:
+            job, submitted = await self._queue.get()
+            queue_wait.observe(time.perf_counter() - submitted)
+            try:
+                # Результаты генерации пропускают вперед ответы на действия пользователей
+                with bulk_sends():
+                    await self._run(job)
+            finally:
+                self._queue.task_done()
+
+    async def _run(self, job: GenerationJob):
+        started = time.perf_counter()
+        try:
+            await self._process(self._bot, job)
+        except asyncio.CancelledError:
+            await self._refund(job)
+            raise
+        except Exception as e:
+            generation_latency.observe(time.perf_counter() - started, "error")
+            self.failed += 1
+            print(f"Ошибка генерации для пользователя {job.user_id}: {e}")
+            refunded = await self._refund(job)
+            try:
+                await self._on_failure(self._bot, job, refunded)
+            except Exception as e:
+                print(f"Ошибка уведомления о неудачной генерации: {e}")
+        else:
+            generation_latency.observe(time.perf_counter() - started, "ok")
+            self.completed += 1
+
+    @staticmethod
+    async def _refund(job: GenerationJob) -> bool:
+        return await refund_credits(job.user_id, job.cost) is not None
+
+
+# Глобальная очередь генерации (обработчики запускаются в start_bot)
+generation_queue = GenerationQueue(GENERATION_WORKERS, GENERATION_QUEUE_SIZE)
+
+registry.gauge("bot_generation_queue_length", "Задачи в очереди генерации", function=lambda: len(generation_queue))
@@ -1,11 +1,24 @@
 from aiogram import Router, F
-from aiogram.types import Message, CallbackQuery, InlineKeyboardMarkup, InlineKeyboardButton
+from aiogram.types import Message, CallbackQuery, BufferedInputFile
 from aiogram.filters import Command
-from aiogram.utils.keyboard import InlineKeyboardBuilder
 from aiogram.fsm.context import FSMContext
 from aiogram.fsm.state import State, StatesGroup
+from config import ADMIN_IDS, PROFILE_DEFAULT_SECONDS
 from database import db
+from downloads import photo_downloader
+from engine import generation_engine
+from generation import CreditsNotDeducted, GenerationJob, GenerationQueueFull, GenerationRequest, generation_queue, refund_credits
+from keyboards import (
+    get_language_keyboard, get_main_menu_keyboard, get_settings_keyboard,
+    get_payment_methods_keyboard, get_templates_keyboard, get_custom_prompt_keyboard,
+    get_prompt_review_keyboard, get_generation_result_keyboard, get_insufficient_balance_keyboard
+)
+from metrics import HandlerMetricsMiddleware, registry
+from profiling import ProfilerBusyError, loop_profiler
+from result_cache import result_cache
 from texts import get_text
+from throttling import create_throttling
+from user_context import UserContext, UserContextMiddleware
 
 router = Router()
 
@@ -19,187 +32,9 @@ class PromptStates(StatesGroup):
 class GenerationStates(StatesGroup):
     waiting_for_photo = State()
 
-def get_language_keyboard():
-    """Создает клавиатуру для выбора языка"""
-    builder = InlineKeyboardBuilder()
-    builder.button(text="🇷🇺 Русский", callback_data="lang_ru")
-    builder.button(text="🇺🇸 English", callback_data="lang_en")
-    builder.adjust(2)
-    return builder.as_markup()
-
-def get_main_menu_keyboard(language):
-    """Создает главное меню"""
-    builder = InlineKeyboardBuilder()
-    builder.button(
-        text=get_text(language, "send_photo"), 
-        callback_data="send_photo"
-    )
-    builder.button(
-        text=get_text(language, "settings"), 
-        callback_data="settings"
-    )
-    builder.adjust(1)
-    return builder.as_markup()
-
-def get_settings_keyboard(language, balance):
-    """Создает клавиатуру настроек"""
-    builder = InlineKeyboardBuilder()
-    builder.button(
-        text=get_text(language, "top_up_balance"), 
-        callback_data="top_up_balance"
-    )
-    builder.button(
-        text=get_text(language, "change_language"), 
-        callback_data="change_language"
-    )
-    builder.button(
-        text=get_text(language, "back_to_menu"), 
-        callback_data="back_to_menu"
-    )
-    builder.adjust(1)
-    return builder.as_markup()
-
-def get_payment_methods_keyboard(language):
-    """Создает клавиатуру для выбора способа оплаты"""
-    builder = InlineKeyboardBuilder()
-    builder.button(
-        text=get_text(language, "yookassa"), 
-        callback_data="payment_yookassa"
-    )
-    builder.button(
-        text=get_text(language, "card_transfer"), 
-        callback_data="payment_card"
-    )
-    builder.button(
-        text=get_text(language, "sbp"), 
-        callback_data="payment_sbp"
-    )
-    builder.button(
-        text=get_text(language, "back_to_settings"), 
-        callback_data="back_to_settings"
-    )
-    builder.adjust(1)
-    return builder.as_markup()
-
-def get_templates_keyboard(language, page=0):
-    """Создает клавиатуру для выбора шаблонов с пагинацией"""
-    templates_per_page = 5
-    total_templates = 20
-    total_pages = (total_templates + templates_per_page - 1) // templates_per_page
-    
-    builder = InlineKeyboardBuilder()
-    
-    # Добавляем шаблоны для текущей страницы
-    start_template = page * templates_per_page + 1
-    end_template = min(start_template + templates_per_page - 1, total_templates)
-    
-    for i in range(start_template, end_template + 1):
-        builder.button(
-            text=get_text(language, f"template_{i}"), 
-            callback_data=f"template_{i}"
-        )
-    
-    # Добавляем кнопки "Свой промпт" и "Назад в меню" на каждую страницу
-    builder.button(
-        text=get_text(language, "custom_prompt"), 
-        callback_data="custom_prompt"
-    )
-    builder.button(
-        text=get_text(language, "back_to_menu"), 
-        callback_data="back_to_menu"
-    )
-    
-    # Добавляем навигацию по страницам
-    if total_pages > 1:
-        nav_row = []
-        
-        # Кнопка "Предыдущая страница"
-        if page > 0:
-            nav_row.append(("⬅️", f"templates_page_{page - 1}"))
-        
-        # Индикатор текущей страницы
-        nav_row.append((f"{page + 1}/{total_pages}", "current_page"))
-        
-        # Кнопка "Следующая страница"
-        if page < total_pages - 1:
-            nav_row.append(("➡️", f"templates_page_{page + 1}"))
-        
-        # Добавляем кнопки навигации
-        for text, callback_data in nav_row:
-            if callback_data != "current_page":  # Пропускаем индикатор страницы
-                builder.button(text=text, callback_data=callback_data)
-    
-    # Настраиваем расположение: шаблоны по одному в ряд, затем 2 кнопки в ряд, затем навигация
-    layout = [1] * (end_template - start_template + 1) + [2] + [len(nav_row) if total_pages > 1 else 0]
-    builder.adjust(*[x for x in layout if x > 0])
-    
-    return builder.as_markup()
-
-def get_custom_prompt_keyboard(language):
-    """Создает клавиатуру для ввода собственного промпта"""
-    builder = InlineKeyboardBuilder()
-    builder.button(
-        text=get_text(language, "back_to_templates"), 
-        callback_data="back_to_templates"
-    )
-    builder.adjust(1)
-    return builder.as_markup()
-
-def get_prompt_review_keyboard(language):
-    """Создает клавиатуру для просмотра промпта с предложением улучшить"""
-    builder = InlineKeyboardBuilder()
-    builder.button(
-        text=get_text(language, "improve_prompt"), 
-        callback_data="improve_prompt"
-    )
-    builder.button(
-        text=get_text(language, "keep_my_prompt"), 
-        callback_data="keep_my_prompt"
-    )
-    builder.button(
-        text=get_text(language, "back_to_templates"), 
-        callback_data="back_to_templates"
-    )
-    builder.adjust(1)
-    return builder.as_markup()
-
-def get_generation_result_keyboard(language):
-    """Создает клавиатуру для результата генерации"""
-    builder = InlineKeyboardBuilder()
-    builder.button(
-        text=get_text(language, "try_again"), 
-        callback_data="try_again"
-    )
-    builder.button(
-        text=get_text(language, "send_another_photo"), 
-        callback_data="send_another_photo"
-    )
-    builder.button(
-        text=get_text(language, "menu"), 
-        callback_data="back_to_menu"
-    )
-    builder.adjust(1)
-    return builder.as_markup()
-
-def get_insufficient_balance_keyboard(language: str) -> InlineKeyboardMarkup:
-    """Создает клавиатуру для случаев недостатка баланса"""
-    keyboard = [
-        [InlineKeyboardButton(
-            text=get_text(language, "top_up_balance_button"),
-            callback_data="top_up_balance"
-        )],
-        [InlineKeyboardButton(
-            text=get_text(language, "main_menu_button"),
-            callback_data="back_to_menu"
-        )]
-    ]
-    return InlineKeyboardMarkup(inline_keyboard=keyboard)
-
 @router.message(Command("start"))
-async def cmd_start(message: Message):
-    user_id = message.from_user.id
-    
-    if db.is_new_user(user_id):
+async def cmd_start(message: Message, user: UserContext):
+    if not user.exists:
         # Новый пользователь - предлагаем выбрать язык
         await message.answer(
             get_text("ru", "welcome_new"),
@@ -207,23 +42,18 @@ async def cmd_start(message: Message):
         )
     else:
         # Существующий пользователь - показываем главное меню
-        language = db.get_user_language(user_id)
+        language = user.language
         await message.answer(
             get_text(language, "welcome_back"),
             reply_markup=get_main_menu_keyboard(language)
         )
 
 @router.callback_query(F.data.startswith("lang_"))
-async def language_selected(callback: CallbackQuery):
-    user_id = callback.from_user.id
+async def language_selected(callback: CallbackQuery, user: UserContext):
     language = callback.data.split("_")[1]
     
-    if db.is_new_user(user_id):
-        # Новый пользователь - добавляем в базу данных
-        db.add_user(user_id, language)
-    else:
-        # Существующий пользователь - обновляет язык
-        db.update_user_language(user_id, language)
+    # Создаем нового пользователя или обновляем язык существующего
+    await user.set_language(language)
     
     # Показываем главное меню
     await callback.message.edit_text(
@@ -237,9 +67,8 @@ async def language_selected(callback: CallbackQuery):
     await callback.answer()
 
 @router.callback_query(F.data == "send_photo")
-async def send_photo_handler(callback: CallbackQuery):
-    user_id = callback.from_user.id
-    language = db.get_user_language(user_id)
+async def send_photo_handler(callback: CallbackQuery, user: UserContext):
+    language = user.language
     
     # Показываем выбор шаблонов (первая страница)
     await callback.message.edit_text(
@@ -250,10 +79,9 @@ async def send_photo_handler(callback: CallbackQuery):
     await callback.answer()
 
 @router.callback_query(F.data.startswith("templates_page_"))
-async def templates_page_handler(callback: CallbackQuery):
+async def templates_page_handler(callback: CallbackQuery, user: UserContext):
     """Обработчик для навигации по страницам шаблонов"""
-    user_id = callback.from_user.id
-    language = db.get_user_language(user_id)
+    language = user.language
     
     # Получаем номер страницы
     page = int(callback.data.split("_")[-1])
@@ -267,11 +95,9 @@ async def templates_page_handler(callback: CallbackQuery):
     await callback.answer()
 
 @router.callback_query(F.data.startswith("template_"))
-async def template_selected(callback: CallbackQuery, state: FSMContext):
-    user_id = callback.from_user.id
-    language = db.get_user_language(user_id)
+async def template_selected(callback: CallbackQuery, state: FSMContext, user: UserContext):
+    language, balance = user.language, user.balance
     template = callback.data.split("_")[1]
-    balance = db.get_user_balance(user_id)
     
     # Проверяем баланс для генерации
     if balance < 50:
@@ -297,9 +123,8 @@ async def template_selected(callback: CallbackQuery, state: FSMContext):
     await callback.answer()
 
 @router.callback_query(F.data == "custom_prompt")
-async def custom_prompt_handler(callback: CallbackQuery, state: FSMContext):
-    user_id = callback.from_user.id
-    language = db.get_user_language(user_id)
+async def custom_prompt_handler(callback: CallbackQuery, state: FSMContext, user: UserContext):
+    language = user.language
     
     # Переходим к вводу собственного промпта
     await state.set_state(PromptStates.waiting_for_custom_prompt)
@@ -312,9 +137,8 @@ async def custom_prompt_handler(callback: CallbackQuery, state: FSMContext):
     await callback.answer()
 
 @router.message(PromptStates.waiting_for_custom_prompt)
-async def process_custom_prompt(message: Message, state: FSMContext):
-    user_id = message.from_user.id
-    language = db.get_user_language(user_id)
+async def process_custom_prompt(message: Message, state: FSMContext, user: UserContext):
+    language = user.language
     
     # Сохраняем введенный промпт
     await state.update_data(custom_prompt=message.text, prompt_type="custom")
@@ -325,11 +149,9 @@ async def process_custom_prompt(message: Message, state: FSMContext):
         reply_markup=get_prompt_review_keyboard(language)
     )
 
-@router.callback_query(F.data == "improve_prompt")
-async def improve_prompt_handler(callback: CallbackQuery, state: FSMContext):
-    user_id = callback.from_user.id
-    language = db.get_user_language(user_id)
-    balance = db.get_user_balance(user_id)
+@router.callback_query(F.data == "improve_prompt", flags={"throttling": "generation"})
+async def improve_prompt_handler(callback: CallbackQuery, state: FSMContext, user: UserContext):
+    language, balance = user.language, user.balance
     
     # Проверяем баланс
     if balance < 15:
@@ -348,7 +170,7 @@ async def improve_prompt_handler(callback: CallbackQuery, state: FSMContext):
     
     if custom_prompt:
         # Списываем 15 кредитов
-        success, new_balance = db.deduct_credits(user_id, 15)
+        success, new_balance = await user.deduct_credits(15)
         
         if success:
             # Здесь будет логика улучшения промпта
@@ -375,10 +197,8 @@ async def improve_prompt_handler(callback: CallbackQuery, state: FSMContext):
     await callback.answer()
 
 @router.callback_query(F.data == "keep_my_prompt")
-async def keep_my_prompt_handler(callback: CallbackQuery, state: FSMContext):
-    user_id = callback.from_user.id
-    language = db.get_user_language(user_id)
-    balance = db.get_user_balance(user_id)
+async def keep_my_prompt_handler(callback: CallbackQuery, state: FSMContext, user: UserContext):
+    language, balance = user.language, user.balance
     
     # Проверяем баланс для генерации
     if balance < 50:
@@ -413,9 +233,8 @@ async def keep_my_prompt_handler(callback: CallbackQuery, state: FSMContext):
     await callback.answer()
 
 @router.callback_query(F.data == "back_to_templates")
-async def back_to_templates_handler(callback: CallbackQuery, state: FSMContext):
-    user_id = callback.from_user.id
-    language = db.get_user_language(user_id)
+async def back_to_templates_handler(callback: CallbackQuery, state: FSMContext, user: UserContext):
+    language = user.language
     
     # Очищаем состояние
     await state.clear()
@@ -428,11 +247,97 @@ async def back_to_templates_handler(callback: CallbackQuery, state: FSMContext):
     
     await callback.answer()
 
-@router.message(GenerationStates.waiting_for_photo)
-async def process_photo_for_generation(message: Message, state: FSMContext):
-    user_id = message.from_user.id
-    language = db.get_user_language(user_id)
-    balance = db.get_user_balance(user_id)
+async def enqueue_generation(user: UserContext, chat_id: int, request: GenerationRequest) -> GenerationJob:
+    """Списывает стоимость генерации и ставит задачу в очередь.
+
+    Возвращает задачу. CreditsNotDeducted - списание не выполнено,
+    GenerationQueueFull - очередь заполнена, кредиты возвращены.
+    """
+    success, new_balance = await user.deduct_credits(50)
+    if not success:
+        raise CreditsNotDeducted()
+
+    job = GenerationJob(
+        user_id=user.user_id,
+        chat_id=chat_id,
+        language=user.language,
+        request=request,
+        cost=50,
+        balance=new_balance
+    )
+    try:
+        generation_queue.submit(job)
+    except GenerationQueueFull:
+        balance = await refund_credits(user.user_id, 50)
+        if balance is not None:
+            user.balance = balance
+        raise
+
+    return job
+
+async def process_generation_job(bot, job: GenerationJob):
+    """Выполняет генерацию в обработчике очереди и отправляет результат"""
+    language = job.language
+    request = job.request
+
+    if request.prompt_type == "template":
+        prompt_info = f"Шаблон: {request.prompt}"
+    else:
+        prompt_info = f"Промпт: {request.prompt}"
+    caption = f"{get_text(language, 'generation_success')}\n\n{prompt_info}\n\n💰 Новый баланс: {job.balance} кредитов"
+
+    # Результат детерминированного движка для того же фото и промпта берем из кэша
+    cache_key = None
+    if result_cache.enabled and generation_engine.deterministic:
+        cache_key = result_cache.make_key(
+            request.photo_unique_id or request.photo_file_id,
+            request.engine_prompt,
+            generation_engine.version
+        )
+
+    if not cache_key or not await result_cache.send(bot, job.chat_id, cache_key, caption):
+        # Загружаем исходное фото и генерируем изображение в составе пакета
+        photo = await photo_downloader.download(bot, request.photo_file_id, request.photo_unique_id)
+        result = await generation_engine.generate(photo, request.engine_prompt)
+
+        # Показываем результат
+        sent = await bot.send_photo(
+            job.chat_id,
+            photo=BufferedInputFile(result, filename="result.jpg"),
+            caption=caption
+        )
+        if cache_key:
+            await result_cache.put(cache_key, result, sent.photo[-1].file_id)
+
+    # Показываем клавиатуру с результатом
+    await bot.send_message(
+        job.chat_id,
+        "Выберите действие:",
+        reply_markup=get_generation_result_keyboard(language)
+    )
+
+async def generation_job_failed(bot, job: GenerationJob, refunded: bool):
+    """Уведомляет пользователя о неудачной генерации и возврате кредитов"""
+    language = job.language
+    
+    # Уведомляем о возврате кредитов (неудавшийся возврат выполнит администратор)
+    await bot.send_message(
+        job.chat_id, get_text(language, "credits_refunded" if refunded else "credits_refund_pending")
+    )
+    
+    # Обработка ошибки
+    await bot.send_message(job.chat_id, get_text(language, "generation_error"))
+    
+    # Возвращаем в главное меню
+    await bot.send_message(
+        job.chat_id,
+        get_text(language, "welcome_back"),
+        reply_markup=get_main_menu_keyboard(language)
+    )
+
+@router.message(GenerationStates.waiting_for_photo, flags={"throttling": "generation"})
+async def process_photo_for_generation(message: Message, state: FSMContext, user: UserContext):
+    language, balance = user.language, user.balance
     
     # Проверяем, что это фото
     if not message.photo:
@@ -450,71 +355,53 @@ async def process_photo_for_generation(message: Message, state: FSMContext):
         )
         return
     
-    # Списываем 50 кредитов за генерацию
-    success, new_balance = db.deduct_credits(user_id, 50)
+    # Не списываем кредиты, если очередь генерации заполнена
+    if generation_queue.full():
+        await message.answer(get_text(language, "generation_busy"))
+        return
     
-    if not success:
+    # Получаем данные о промпте
+    data = await state.get_data()
+    photo = message.photo[-1]
+    if data.get("prompt_type") == "template":
+        prompt_type, prompt = "template", data.get("selected_template")
+    else:
+        prompt_type, prompt = "custom", data.get("custom_prompt", "")
+    request = GenerationRequest(
+        photo_file_id=photo.file_id,
+        prompt_type=prompt_type,
+        prompt=prompt,
+        photo_unique_id=photo.file_unique_id
+    )
+    
+    # Списываем 50 кредитов и ставим генерацию в очередь
+    try:
+        job = await enqueue_generation(user, message.chat.id, request)
+    except CreditsNotDeducted:
         await message.answer("Ошибка при списании кредитов!")
         return
+    except GenerationQueueFull:
+        await message.answer(get_text(language, "generation_busy"))
+        return
     
     # Показываем сообщение о начале генерации
     await message.answer(get_text(language, "generation_in_progress"))
     
-    try:
-        # Здесь будет логика генерации изображения
-        # Пока что просто симулируем успешную генерацию
-        
-        # Получаем данные о промпте
-        data = await state.get_data()
-        prompt_type = data.get("prompt_type")
-        
-        if prompt_type == "template":
-            template = data.get("selected_template")
-            prompt_info = f"Шаблон: {template}"
-        else:
-            custom_prompt = data.get("custom_prompt", "")
-            prompt_info = f"Промпт: {custom_prompt}"
-        
-        # Показываем результат (пока исходное фото)
-        await message.answer_photo(
-            photo=message.photo[-1].file_id,
-            caption=f"{get_text(language, 'generation_success')}\n\n{prompt_info}\n\n💰 Новый баланс: {new_balance} кредитов"
-        )
-        
-        # Показываем клавиатуру с результатом
-        await message.answer(
-            "Выберите действие:",
-            reply_markup=get_generation_result_keyboard(language)
-        )
-        
-        # Очищаем состояние
-        await state.clear()
-        
-    except Exception as e:
-        # При ошибке возвращаем списанные кредиты
-        db.add_balance(user_id, 50)
-        restored_balance = db.get_user_balance(user_id)
-        
-        # Уведомляем о возврате кредитов
-        await message.answer(get_text(language, "credits_refunded"))
-        
-        # Обработка ошибки
-        await message.answer(get_text(language, "generation_error"))
-        
-        # Возвращаем в главное меню
-        await message.answer(
-            get_text(language, "welcome_back"),
-            reply_markup=get_main_menu_keyboard(language)
-        )
-        
-        # Очищаем состояние
-        await state.clear()
+    # Очищаем состояние, сохраняя параметры для повторной генерации
+    await state.set_state(None)
+    await state.set_data({"last_generation": job.state_data()})
 
-@router.callback_query(F.data == "try_again")
-async def try_again_handler(callback: CallbackQuery, state: FSMContext):
-    user_id = callback.from_user.id
-    language = db.get_user_language(user_id)
-    balance = db.get_user_balance(user_id)
+@router.callback_query(F.data == "try_again", flags={"throttling": "generation"})
+async def try_again_handler(callback: CallbackQuery, state: FSMContext, user: UserContext):
+    language, balance = user.language, user.balance
+    
+    # Параметры последней генерации сохранены в состоянии
+    data = await state.get_data()
+    last_generation = data.get("last_generation")
+    
+    if not last_generation:
+        await callback.answer(get_text(language, "try_again_unavailable"))
+        return
     
     # Проверяем баланс для повторной генерации
     if balance < 50:
@@ -527,61 +414,33 @@ async def try_again_handler(callback: CallbackQuery, state: FSMContext):
         )
         return
     
-    # Списываем 50 кредитов за повторную генерацию
-    success, new_balance = db.deduct_credits(user_id, 50)
+    # Не списываем кредиты, если очередь генерации заполнена
+    if generation_queue.full():
+        await callback.answer(get_text(language, "generation_busy"))
+        return
     
-    if not success:
+    # Списываем 50 кредитов за повторную генерацию
+    try:
+        job = await enqueue_generation(
+            user, callback.message.chat.id, GenerationRequest(**last_generation)
+        )
+    except CreditsNotDeducted:
         await callback.answer("Ошибка при списании кредитов!")
         return
+    except GenerationQueueFull:
+        await callback.answer(get_text(language, "generation_busy"))
+        return
     
     # Показываем сообщение о начале генерации
     await callback.message.edit_text(
-        f"{get_text(language, 'generation_in_progress')}\n\n💰 Новый баланс: {new_balance} кредитов"
+        f"{get_text(language, 'generation_in_progress')}\n\n💰 Новый баланс: {job.balance} кредитов"
     )
     
-    try:
-        # Здесь будет логика повторной генерации изображения
-        # Пока что просто симулируем успешную генерацию
-        
-        # Получаем данные о промпте из предыдущего состояния
-        # (нужно будет сохранить их в отдельном месте или передать через callback_data)
-        
-        # Показываем результат (пока исходное фото)
-        await callback.message.answer_photo(
-            photo=callback.message.reply_to_message.photo[-1].file_id if callback.message.reply_to_message and callback.message.reply_to_message.photo else None,
-            caption=f"{get_text(language, 'generation_success')}\n\n💰 Новый баланс: {new_balance} кредитов"
-        )
-        
-        # Показываем клавиатуру с результатом
-        await callback.message.answer(
-            "Выберите действие:",
-            reply_markup=get_generation_result_keyboard(language)
-        )
-        
-    except Exception as e:
-        # При ошибке возвращаем списанные кредиты
-        db.add_balance(user_id, 50)
-        restored_balance = db.get_user_balance(user_id)
-        
-        # Уведомляем о возврате кредитов
-        await callback.message.answer(get_text(language, "credits_refunded"))
-        
-        # Обработка ошибки
-        await callback.message.answer(get_text(language, "generation_error"))
-        
-        # Возвращаем в главное меню
-        await callback.message.answer(
-            get_text(language, "welcome_back"),
-            reply_markup=get_main_menu_keyboard(language)
-        )
-    
     await callback.answer()
 
 @router.callback_query(F.data == "send_another_photo")
-async def send_another_photo_handler(callback: CallbackQuery, state: FSMContext):
-    user_id = callback.from_user.id
-    language = db.get_user_language(user_id)
-    balance = db.get_user_balance(user_id)
+async def send_another_photo_handler(callback: CallbackQuery, state: FSMContext, user: UserContext):
+    language, balance = user.language, user.balance
     
     # Проверяем баланс для генерации
     if balance < 50:
@@ -604,25 +463,22 @@ async def send_another_photo_handler(callback: CallbackQuery, state: FSMContext)
     await callback.answer()
 
 @router.callback_query(F.data == "settings")
-async def settings_handler(callback: CallbackQuery):
-    user_id = callback.from_user.id
-    language = db.get_user_language(user_id)
-    balance = db.get_user_balance(user_id)
+async def settings_handler(callback: CallbackQuery, user: UserContext):
+    language, balance = user.language, user.balance
     
     # Показываем профиль пользователя
     profile_text = f"{get_text(language, 'profile')}\n\n{get_text(language, 'balance', balance=balance)}"
     
     await callback.message.edit_text(
         profile_text,
-        reply_markup=get_settings_keyboard(language, balance)
+        reply_markup=get_settings_keyboard(language)
     )
     
     await callback.answer()
 
 @router.callback_query(F.data == "top_up_balance")
-async def top_up_balance_handler(callback: CallbackQuery):
-    user_id = callback.from_user.id
-    language = db.get_user_language(user_id)
+async def top_up_balance_handler(callback: CallbackQuery, user: UserContext):
+    language = user.language
     
     # Показываем выбор способа оплаты
     await callback.message.edit_text(
@@ -632,10 +488,9 @@ async def top_up_balance_handler(callback: CallbackQuery):
     
     await callback.answer()
 
-@router.callback_query(F.data.startswith("payment_"))
-async def payment_method_selected(callback: CallbackQuery, state: FSMContext):
-    user_id = callback.from_user.id
-    language = db.get_user_language(user_id)
+@router.callback_query(F.data.startswith("payment_"), flags={"throttling": "payment"})
+async def payment_method_selected(callback: CallbackQuery, state: FSMContext, user: UserContext):
+    language = user.language
     payment_method = callback.data.split("_")[1]
     
     # Сохраняем выбранный способ оплаты
@@ -650,13 +505,13 @@ async def payment_method_selected(callback: CallbackQuery, state: FSMContext):
     
     await callback.answer()
 
-@router.message(PaymentStates.waiting_for_amount)
-async def process_payment_amount(message: Message, state: FSMContext):
-    user_id = message.from_user.id
-    language = db.get_user_language(user_id)
+@router.message(PaymentStates.waiting_for_amount, flags={"throttling": "payment"})
+async def process_payment_amount(message: Message, state: FSMContext, user: UserContext):
+    language = user.language
     
     try:
-        amount = float(message.text)
+        # Сообщение без текста (например, фото) - тоже ошибка ввода
+        amount = float(message.text or "")
         if amount <= 0:
             await message.answer(get_text(language, "amount_error"))
             return
@@ -666,7 +521,7 @@ async def process_payment_amount(message: Message, state: FSMContext):
         payment_method = data.get("payment_method")
         
         # Пополняем баланс на введенную сумму
-        new_balance = db.add_balance(user_id, amount)
+        new_balance = await user.add_balance(amount)
         
         # Показываем сообщение об успешном пополнении
         await message.answer(
@@ -681,16 +536,15 @@ async def process_payment_amount(message: Message, state: FSMContext):
         
         await message.answer(
             profile_text,
-            reply_markup=get_settings_keyboard(language, new_balance)
+            reply_markup=get_settings_keyboard(language)
         )
         
     except ValueError:
         await message.answer(get_text(language, "amount_error"))
 
 @router.callback_query(F.data == "change_language")
-async def change_language_handler(callback: CallbackQuery):
-    user_id = callback.from_user.id
-    current_language = db.get_user_language(user_id)
+async def change_language_handler(callback: CallbackQuery, user: UserContext):
+    current_language = user.language
     
     # Показываем выбор языка
     await callback.message.edit_text(
@@ -701,9 +555,8 @@ async def change_language_handler(callback: CallbackQuery):
     await callback.answer()
 
 @router.callback_query(F.data == "back_to_menu")
-async def back_to_menu_handler(callback: CallbackQuery):
-    user_id = callback.from_user.id
-    language = db.get_user_language(user_id)
+async def back_to_menu_handler(callback: CallbackQuery, user: UserContext):
+    language = user.language
     
     # Возвращаемся в главное меню
     await callback.message.edit_text(
@@ -714,21 +567,86 @@ async def back_to_menu_handler(callback: CallbackQuery):
     await callback.answer()
 
 @router.callback_query(F.data == "back_to_settings")
-async def back_to_settings_handler(callback: CallbackQuery):
-    user_id = callback.from_user.id
-    language = db.get_user_language(user_id)
-    balance = db.get_user_balance(user_id)
+async def back_to_settings_handler(callback: CallbackQuery, user: UserContext):
+    language, balance = user.language, user.balance
     
     # Возвращаемся в настройки
     profile_text = f"{get_text(language, 'profile')}\n\n{get_text(language, 'balance', balance=balance)}"
     
     await callback.message.answer(
         profile_text,
-        reply_markup=get_settings_keyboard(language, balance)
+        reply_markup=get_settings_keyboard(language)
     )
     
     await callback.answer()
 
+@router.message(Command("stats"), F.from_user.id.in_(ADMIN_IDS))
+async def cmd_stats(message: Message, user: UserContext):
+    """Сводная статистика для администраторов (из снимка user_statistics)"""
+    language = user.language
+    summary = await db.get_statistics_summary()
+    
+    if not summary:
+        await message.answer(get_text(language, "admin_stats_unavailable"))
+        return
+    
+    await message.answer(get_text(language, "admin_stats", **summary))
+
+@router.message(Command("profile"), F.from_user.id.in_(ADMIN_IDS))
+async def cmd_profile(message: Message, user: UserContext):
+    """Профилирование работающего бота для администраторов: /profile [секунды]"""
+    language = user.language
+    parts = message.text.split()
+    try:
+        # clamp() отклоняет nan, inf и неположительные значения
+        seconds = loop_profiler.clamp(float(parts[1]) if len(parts) > 1 else PROFILE_DEFAULT_SECONDS)
+    except ValueError:
+        await message.answer(get_text(language, "admin_profile_usage"))
+        return
+    
+    if loop_profiler.running:
+        await message.answer(get_text(language, "admin_profile_busy"))
+        return
+    
+    await message.answer(get_text(language, "admin_profile_started", seconds=f"{seconds:g}"))
+    try:
+        path = await loop_profiler.run(seconds)
+    except ProfilerBusyError:
+        await message.answer(get_text(language, "admin_profile_busy"))
+        return
+    
+    # Сообщение Telegram ограничено 4096 символами
+    summary = loop_profiler.summary(path)[:3500]
+    await message.answer(get_text(language, "admin_profile_done", path=path, summary=summary))
+
+# Ограничение частоты обновлений (класс обработчика задается флагом throttling)
+throttling = create_throttling()
+user_context = UserContextMiddleware()
+
+registry.counter(
+    "bot_throttle_allowed_total", "Обновления, пропущенные ограничением частоты", ("class",),
+    function=lambda: {(name,): count for name, count in throttling.allowed.items()}
+)
+registry.counter(
+    "bot_throttled_total", "Обновления, отклоненные лимитом пользователя", ("class",),
+    function=lambda: {(name,): count for name, count in throttling.throttled.items()}
+)
+registry.counter(
+    "bot_throttled_global_total", "Обновления, отклоненные общим лимитом",
+    function=lambda: throttling.throttled_global
+)
+handler_metrics = HandlerMetricsMiddleware()
+
 def register_handlers(dp):
     """Регистрирует все обработчики"""
+    # Внутренние middleware выполняются в порядке регистрации
+    router.message.middleware(throttling)
+    router.callback_query.middleware(throttling)
+    # Профиль пользователя загружается один раз на обновление и только для
+    # обновлений, нашедших обработчик и пропущенных ограничением частоты
+    router.message.middleware(user_context)
+    router.callback_query.middleware(user_context)
+    # Отклоненные обновления не попадают в метрики обработчиков
+    router.message.middleware(handler_metrics)
+    router.callback_query.middleware(handler_metrics)
     dp.include_router(router)
@@ -0,0 +1,309 @@
+from typing import Dict, List, Tuple
+
+from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton
+from aiogram.utils.keyboard import InlineKeyboardBuilder
+from pydantic import ConfigDict, field_serializer
+
+from texts import DEFAULT_LANGUAGE, available_languages, get_text, on_catalog_reload
+
+# Пагинация шаблонов
+TEMPLATES_PER_PAGE = 5
+TOTAL_TEMPLATES = 20
+TEMPLATE_PAGES = (TOTAL_TEMPLATES + TEMPLATES_PER_PAGE - 1) // TEMPLATES_PER_PAGE
+
+def _build_language_keyboard():
+    """Создает клавиатуру для выбора языка"""
+    builder = InlineKeyboardBuilder()
+    builder.button(text="🇷🇺 Русский", callback_data="lang_ru")
+    builder.button(text="🇺🇸 English", callback_data="lang_en")
+    builder.adjust(2)
+    return builder.as_markup()
+
+def _build_main_menu_keyboard(language):
+    """Создает главное меню"""
+    builder = InlineKeyboardBuilder()
+    builder.button(
+        text=get_text(language, "send_photo"), 
+        callback_data="send_photo"
+    )
+    builder.button(
+        text=get_text(language, "settings"), 
+        callback_data="settings"
+    )
+    builder.adjust(1)
+    return builder.as_markup()
+
+def _build_settings_keyboard(language):
+    """Создает клавиатуру настроек"""
+    builder = InlineKeyboardBuilder()
+    builder.button(
+        text=get_text(language, "top_up_balance"), 
+        callback_data="top_up_balance"
+    )
+    builder.button(
+        text=get_text(language, "change_language"), 
+        callback_data="change_language"
+    )
+    builder.button(
+        text=get_text(language, "back_to_menu"), 
+        callback_data="back_to_menu"
+    )
+    builder.adjust(1)
+    return builder.as_markup()
+
+def _build_payment_methods_keyboard(language):
+    """Создает клавиатуру для выбора способа оплаты"""
+    builder = InlineKeyboardBuilder()
+    builder.button(
+        text=get_text(language, "yookassa"), 
+        callback_data="payment_yookassa"
+    )
+    builder.button(
+        text=get_text(language, "card_transfer"), 
+        callback_data="payment_card"
+    )
+    builder.button(
+        text=get_text(language, "sbp"), 
+        callback_data="payment_sbp"
+    )
+    builder.button(
+        text=get_text(language, "back_to_settings"), 
+        callback_data="back_to_settings"
+    )
+    builder.adjust(1)
+    return builder.as_markup()
+
+def _build_templates_keyboard(language, page=0):
+    """Создает клавиатуру для выбора шаблонов с пагинацией"""
+    templates_per_page = TEMPLATES_PER_PAGE
+    total_templates = TOTAL_TEMPLATES
+    total_pages = TEMPLATE_PAGES
+    
+    builder = InlineKeyboardBuilder()
+    
+    # Добавляем шаблоны для текущей страницы
+    start_template = page * templates_per_page + 1
+    end_template = min(start_template + templates_per_page - 1, total_templates)
+    
+    for i in range(start_template, end_template + 1):
+        builder.button(
+            text=get_text(language, f"template_{i}"), 
+            callback_data=f"template_{i}"
+        )
+    
+    # Добавляем кнопки "Свой промпт" и "Назад в меню" на каждую страницу
+    builder.button(
+        text=get_text(language, "custom_prompt"), 
+        callback_data="custom_prompt"
+    )
+    builder.button(
+        text=get_text(language, "back_to_menu"), 
+        callback_data="back_to_menu"
+    )
+    
+    # Добавляем навигацию по страницам
+    if total_pages > 1:
+        nav_row = []
+        
+        # Кнопка "Предыдущая страница"
+        if page > 0:
+            nav_row.append(("⬅️", f"templates_page_{page - 1}"))
+        
+        # Индикатор текущей страницы
+        nav_row.append((f"{page + 1}/{total_pages}", "current_page"))
+        
+        # Кнопка "Следующая страница"
+        if page < total_pages - 1:
+            nav_row.append(("➡️", f"templates_page_{page + 1}"))
+        
+        # Добавляем кнопки навигации
+        for text, callback_data in nav_row:
+            if callback_data != "current_page":  # Пропускаем индикатор страницы
+                builder.button(text=text, callback_data=callback_data)
+    
+    # Настраиваем расположение: шаблоны по одному в ряд, затем 2 кнопки в ряд, затем навигация
+    layout = [1] * (end_template - start_template + 1) + [2] + [len(nav_row) if total_pages > 1 else 0]
+    builder.adjust(*[x for x in layout if x > 0])
+    
+    return builder.as_markup()
+
+def _build_custom_prompt_keyboard(language):
+    """Создает клавиатуру для ввода собственного промпта"""
+    builder = InlineKeyboardBuilder()
+    builder.button(
+        text=get_text(language, "back_to_templates"), 
+        callback_data="back_to_templates"
+    )
+    builder.adjust(1)
+    return builder.as_markup()
+
+def _build_prompt_review_keyboard(language):
+    """Создает клавиатуру для просмотра промпта с предложением улучшить"""
+    builder = InlineKeyboardBuilder()
+    builder.button(
+        text=get_text(language, "improve_prompt"), 
+        callback_data="improve_prompt"
+    )
+    builder.button(
+        text=get_text(language, "keep_my_prompt"), 
+        callback_data="keep_my_prompt"
+    )
+    builder.button(
+        text=get_text(language, "back_to_templates"), 
+        callback_data="back_to_templates"
+    )
+    builder.adjust(1)
+    return builder.as_markup()
+
+def _build_generation_result_keyboard(language):
+    """Создает клавиатуру для результата генерации"""
+    builder = InlineKeyboardBuilder()
+    builder.button(
+        text=get_text(language, "try_again"), 
+        callback_data="try_again"
+    )
+    builder.button(
+        text=get_text(language, "send_another_photo"), 
+        callback_data="send_another_photo"
+    )
+    builder.button(
+        text=get_text(language, "menu"), 
+        callback_data="back_to_menu"
+    )
+    builder.adjust(1)
+    return builder.as_markup()
+
+def _build_insufficient_balance_keyboard(language: str) -> InlineKeyboardMarkup:
+    """Создает клавиатуру для случаев недостатка баланса"""
+    keyboard = [
+        [InlineKeyboardButton(
+            text=get_text(language, "top_up_balance_button"),
+            callback_data="top_up_balance"
+        )],
+        [InlineKeyboardButton(
+            text=get_text(language, "main_menu_button"),
+            callback_data="back_to_menu"
+        )]
+    ]
+    return InlineKeyboardMarkup(inline_keyboard=keyboard)
+
+
+class FrozenInlineKeyboardButton(InlineKeyboardButton):
+    """Кнопка, которую нельзя изменить после создания"""
+
+    model_config = ConfigDict(frozen=True)
+
+
+class FrozenInlineKeyboardMarkup(InlineKeyboardMarkup):
+    """Неизменяемая клавиатура: ряды хранятся кортежами неизменяемых кнопок"""
+
+    model_config = ConfigDict(frozen=True)
+
+    inline_keyboard: Tuple[Tuple[FrozenInlineKeyboardButton, ...], ...]
+
+    @field_serializer("inline_keyboard")
+    def _serialize_rows(self, rows) -> List[List[FrozenInlineKeyboardButton]]:
+        # Сессия aiogram обходит только списки, кортежи отправлялись бы с null-полями
+        return [list(row) for row in rows]
+
+
+def freeze_keyboard(markup: InlineKeyboardMarkup) -> FrozenInlineKeyboardMarkup:
+    """Неизменяемая копия клавиатуры для общего использования"""
+    return FrozenInlineKeyboardMarkup.model_validate(markup.model_dump(exclude_none=True))
+
+
+class KeyboardTable:
+    """Таблица готовых клавиатур по языку, (клавиатуре, странице).
+
+    Клавиатуры зависят только от языка и страницы, поэтому строятся для всех
+    языков при создании таблицы и перестраиваются после перезагрузки
+    каталога текстов. Разметка общая для всех обработчиков, поэтому хранится
+    в неизменяемом виде.
+    """
+
+    # Имя клавиатуры -> (функция построения, число страниц)
+    BUILDERS = {
+        "main_menu": (_build_main_menu_keyboard, 1),
+        "settings": (_build_settings_keyboard, 1),
+        "payment_methods": (_build_payment_methods_keyboard, 1),
+        "templates": (_build_templates_keyboard, TEMPLATE_PAGES),
+        "custom_prompt": (_build_custom_prompt_keyboard, 1),
+        "prompt_review": (_build_prompt_review_keyboard, 1),
+        "generation_result": (_build_generation_result_keyboard, 1),
+        "insufficient_balance": (_build_insufficient_balance_keyboard, 1),
+    }
+
+    def __init__(self):
+        self._table: Dict[str, Dict[Tuple[str, int], FrozenInlineKeyboardMarkup]] = {}
+        self._language_keyboard = freeze_keyboard(_build_language_keyboard())
+        self.rebuild()
+
+    def get(self, name: str, language: str, page: int = 0) -> InlineKeyboardMarkup:
+        """Возвращает готовую клавиатуру"""
+        # Неизвестный язык отображается так же, как в get_text
+        language_table = self._table.get(language) or self._table[DEFAULT_LANGUAGE]
+        return language_table[(name, page)]
+
+    def language(self) -> InlineKeyboardMarkup:
+        """Клавиатура выбора языка (не зависит от каталога текстов)"""
+        return self._language_keyboard
+
+    def rebuild(self):
+        """Строит клавиатуры всех языков по текущему каталогу текстов"""
+        languages = set(available_languages()) | {DEFAULT_LANGUAGE}
+        # Новая таблица заменяет прежнюю целиком, get() не видит частично построенную
+        self._table = {language: self._build(language) for language in languages}
+
+    def _build(self, language: str) -> Dict[Tuple[str, int], FrozenInlineKeyboardMarkup]:
+        language_table = {}
+        for name, (builder, pages) in self.BUILDERS.items():
+            for page in range(pages):
+                if pages > 1:
+                    markup = builder(language, page)
+                else:
+                    markup = builder(language)
+                language_table[(name, page)] = freeze_keyboard(markup)
+        return language_table
+
+
+# Клавиатуры всех языков строятся при импорте модуля, то есть при запуске бота
+keyboards = KeyboardTable()
+on_catalog_reload(keyboards.rebuild)
+
+
+def get_language_keyboard():
+    """Клавиатура для выбора языка"""
+    return keyboards.language()
+
+def get_main_menu_keyboard(language):
+    """Главное меню"""
+    return keyboards.get("main_menu", language)
+
+def get_settings_keyboard(language):
+    """Клавиатура настроек"""
+    return keyboards.get("settings", language)
+
+def get_payment_methods_keyboard(language):
+    """Клавиатура для выбора способа оплаты"""
+    return keyboards.get("payment_methods", language)
+
+def get_templates_keyboard(language, page=0):
+    """Клавиатура для выбора шаблонов (страница ограничивается допустимым диапазоном)"""
+    page = min(max(page, 0), TEMPLATE_PAGES - 1)
+    return keyboards.get("templates", language, page)
+
+def get_custom_prompt_keyboard(language):
+    """Клавиатура для ввода собственного промпта"""
+    return keyboards.get("custom_prompt", language)
+
+def get_prompt_review_keyboard(language):
+    """Клавиатура для просмотра промпта с предложением улучшить"""
+    return keyboards.get("prompt_review", language)
+
+def get_generation_result_keyboard(language):
+    """Клавиатура для результата генерации"""
+    return keyboards.get("generation_result", language)
+
+def get_insufficient_balance_keyboard(language: str) -> InlineKeyboardMarkup:
+    """Клавиатура для случаев недостатка баланса"""
+    return keyboards.get("insufficient_balance", language)
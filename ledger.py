@@ -0,0 +1,148 @@
+import asyncio
+import io
+from typing import List, Tuple
+
+import psycopg2
+
+from db_pool import PoolTimeoutError
+
+# Колонки, заполняемые при пакетной записи истории операций
+LEDGER_COLUMNS = ('user_id', 'operation_type', 'amount', 'balance_before', 'balance_after', 'created_at')
+
+
+class LedgerJournal:
+    """Буфер отложенной записи истории операций.
+
+    Баланс изменяется синхронно, а строки истории копятся в памяти и
+    записываются одним COPY каждые flush_rows строк или flush_interval
+    секунд. При остановке буфер записывается в базу, а если это невозможно -
+    в файл spill_path в формате COPY, чтобы строки не были потеряны. Пока
+    база недоступна, строки ждут следующей попытки в памяти, но не более
+    max_rows: сверх этого буфер сбрасывается в тот же файл.
+    """
+
+    def __init__(self, pool, flush_rows: int = 500, flush_interval: float = 0.2,
+                 spill_path: str = 'ledger_unflushed.tsv', max_rows: int = 100000):
+        self.pool = pool
+        self.flush_rows = flush_rows
+        self.flush_interval = flush_interval
+        self.spill_path = spill_path
+        self.max_rows = max_rows
+        self.flushed_rows = 0
+        self.spilled_rows = 0
+
+        self._rows: List[Tuple] = []
+        self._task = None
+        self._closing = False
+        self._flush_requested = None
+        # Создается при первой записи внутри event loop (Python 3.8 привязывает
+        # Lock к циклу при создании)
+        self._lock = None
+
+    def __len__(self) -> int:
+        return len(self._rows)
+
+    def start(self):
+        """Запускает фоновую запись буфера"""
+        if self._task is not None:
+            return
+        self._closing = False
+        self._flush_requested = asyncio.Event()
+        self._task = asyncio.create_task(self._run())
+
+    def append(self, row: Tuple):
+        """Добавляет строку истории в буфер"""
+        self._rows.append(row)
+        if len(self._rows) >= self.flush_rows and self._flush_requested is not None:
+            self._flush_requested.set()
+
+    async def flush(self) -> int:
+        """Записывает накопленные строки в базу данных (можно вызывать и до start())"""
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+
+        async with self._lock:
+            if not self._rows:
+                return 0
+
+            rows, self._rows = self._rows, []
+            try:
+                await self.pool.run(self._copy_rows, rows)
+            except (psycopg2.Error, PoolTimeoutError) as e:
+                print(f"Ошибка записи истории операций: {e}")
+                # Возвращаем строки в начало буфера для следующей попытки
+                self._rows[:0] = rows
+                if len(self._rows) > self.max_rows:
+                    # Буфер не растет неограниченно, пока база недоступна
+                    rows, self._rows = self._rows, []
+                    if not await asyncio.get_running_loop().run_in_executor(None, self._spill, rows):
+                        self._rows[:0] = rows
+                return 0
+
+            self.flushed_rows += len(rows)
+            return len(rows)
+
+    async def close(self):
+        """Останавливает фоновую запись и сохраняет остаток буфера"""
+        if self._task is None:
+            return
+
+        self._closing = True
+        self._flush_requested.set()
+        await self._task
+        self._task = None
+
+        # Строки, добавленные после последней записи
+        await self.flush()
+        if self._rows:
+            rows, self._rows = self._rows, []
+            if not self._spill(rows):
+                self._rows = rows
+                print(f"Строки истории операций потеряны: {len(rows)}")
+
+    async def _run(self):
+        while not self._closing:
+            try:
+                await asyncio.wait_for(self._flush_requested.wait(), self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._flush_requested.clear()
+            await self.flush()
+
+    def _spill(self, rows: List[Tuple]) -> bool:
+        """Дописывает строки в spill_path; False, если файл записать не удалось"""
+        try:
+            with open(self.spill_path, 'a', encoding='utf-8') as f:
+                position = f.tell()
+                try:
+                    f.write(self._format_rows(rows))
+                    f.flush()
+                except OSError:
+                    # Частично записанные строки попали бы в файл повторно
+                    f.truncate(position)
+                    raise
+        except OSError as e:
+            print(f"Ошибка записи истории операций в {self.spill_path}: {e}")
+            return False
+
+        self.spilled_rows += len(rows)
+        print(
+            f"Не записано строк истории операций: {len(rows)}. "
+            f"Они сохранены в {self.spill_path}, загрузите их командой: "
+            f"\\copy operations ({', '.join(LEDGER_COLUMNS)}) FROM '{self.spill_path}'"
+        )
+        return True
+
+    @staticmethod
+    def _format_rows(rows: List[Tuple]) -> str:
+        # Текстовый формат COPY: значения через табуляцию, строки через перевод строки
+        return ''.join('\t'.join(str(value) for value in row) + '\n' for row in rows)
+
+    @classmethod
+    def _copy_rows(cls, conn, rows: List[Tuple]):
+        with conn.cursor() as cursor:
+            cursor.copy_expert(
+                f"COPY operations ({', '.join(LEDGER_COLUMNS)}) FROM STDIN",
+                io.StringIO(cls._format_rows(rows))
+            )
+        conn.commit()
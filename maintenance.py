@@ -0,0 +1,36 @@
+import asyncio
+import psycopg2
+from config import (
+    OPERATIONS_PARTITIONS_AHEAD, PARTITION_MAINTENANCE_INTERVAL, USER_STATISTICS_REFRESH_INTERVAL,
+    FSM_PURGE_INTERVAL
+)
+from db_pool import PoolTimeoutError
+
+
+async def maintain_partitions(db):
+    """Периодически создает секции истории операций на несколько месяцев вперед"""
+    while True:
+        created = await db.ensure_operations_partitions(OPERATIONS_PARTITIONS_AHEAD)
+        if created:
+            print(f"Создано секций истории операций: {created}")
+        await asyncio.sleep(PARTITION_MAINTENANCE_INTERVAL)
+
+
+async def refresh_user_statistics(db):
+    """Периодически обновляет снимок статистики пользователей для отчетов"""
+    while True:
+        await asyncio.sleep(USER_STATISTICS_REFRESH_INTERVAL)
+        await db.refresh_user_statistics()
+
+
+async def purge_fsm_states(storage):
+    """Периодически удаляет истекшие состояния FSM из базы данных"""
+    while True:
+        await asyncio.sleep(FSM_PURGE_INTERVAL)
+        try:
+            deleted = await storage.purge_expired()
+        except (psycopg2.Error, PoolTimeoutError) as e:
+            print(f"Ошибка удаления истекших состояний FSM: {e}")
+            continue
+        if deleted:
+            print(f"Удалено истекших состояний FSM: {deleted}")
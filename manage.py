@@ -0,0 +1,289 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Служебные команды для обслуживания базы данных GenBot
+Запустите: python manage.py --help
+"""
+
+import argparse
+import glob
+import gzip
+import os
+import re
+import sys
+from datetime import datetime
+
+import psycopg2
+from psycopg2 import sql
+
+from config import OPERATIONS_RETENTION_MONTHS, OPERATIONS_ARCHIVE_DIR
+
+# Верхняя граница секции в выражении pg_get_expr(relpartbound)
+PARTITION_UPPER_BOUND_RE = re.compile(r"TO \('([^']+)'\)")
+
+
+def migrate(args):
+    """Применяет миграции схемы базы данных"""
+    from database import db
+    from migrator import apply_migrations, get_schema_version
+
+    conn = db.get_connection()
+    if not conn:
+        return False
+
+    try:
+        applied = apply_migrations(conn, target=args.target)
+        for migration in applied:
+            print(f"Применена миграция {migration.version:04d}_{migration.name}")
+        print(f"Текущая версия схемы: {get_schema_version(conn)}")
+        return True
+    except (psycopg2.Error, OSError, ValueError) as e:
+        print(f"Ошибка применения миграций: {e}")
+        return False
+    finally:
+        conn.close()
+
+
+def archived_partitions(conn, archive_dir: str):
+    """Архивы секций истории операций: по журналу в базе и файлам в каталоге"""
+    with conn.cursor() as cursor:
+        cursor.execute("SELECT to_regclass('operations_archives') IS NOT NULL")
+        archives = set()
+        if cursor.fetchone()[0]:
+            cursor.execute("SELECT path FROM operations_archives")
+            archives.update(os.path.basename(row[0]) for row in cursor.fetchall())
+    # Архивы, созданные до появления журнала
+    archives.update(os.path.basename(path) for path in glob.glob(os.path.join(archive_dir, "operations_*.csv.gz")))
+    return sorted(archives)
+
+
+def backfill_stats(args):
+    """Пересчитывает user_stats по всей истории операций"""
+    from database import db
+
+    conn = db.get_connection()
+    if not conn:
+        return False
+
+    try:
+        # Пересчет заменяет итоги, поэтому операции из архивов в них не попадут
+        archives = archived_partitions(conn, args.archive_dir)
+        conn.rollback()
+        if archives and not args.force:
+            print("Часть истории операций архивирована и удалена из базы:")
+            for name in archives:
+                print(f"  {name}")
+            print("Пересчет заменит итоги user_stats суммами только по оставшимся операциям.")
+            print("Чтобы все равно выполнить пересчет, добавьте --force")
+            return False
+
+        with conn.cursor() as cursor:
+            # Блокируем запись в историю на время пересчета, чтобы не потерять
+            # операции, выполненные параллельно с ним
+            cursor.execute("LOCK TABLE operations IN SHARE MODE")
+            cursor.execute("""
+                INSERT INTO user_stats (user_id, total_operations, total_top_ups, total_deductions)
+                SELECT
+                    user_id,
+                    COUNT(*),
+                    COALESCE(SUM(CASE WHEN operation_type = 'top_up' THEN amount ELSE 0 END), 0),
+                    COALESCE(SUM(CASE WHEN operation_type = 'deduct' THEN amount ELSE 0 END), 0)
+                FROM operations
+                GROUP BY user_id
+                ON CONFLICT (user_id) DO UPDATE SET
+                    total_operations = EXCLUDED.total_operations,
+                    total_top_ups = EXCLUDED.total_top_ups,
+                    total_deductions = EXCLUDED.total_deductions
+            """)
+            updated = cursor.rowcount
+        conn.commit()
+        print(f"Статистика пересчитана для {updated} пользователей")
+        return True
+    except psycopg2.Error as e:
+        print(f"Ошибка пересчета статистики: {e}")
+        return False
+    finally:
+        conn.close()
+
+
+def split_default_partition(conn, cutoff, dry_run: bool) -> int:
+    """Переносит строки operations_default за месяцы до cutoff в месячные секции.
+
+    Строки за месяцы без секции (например, история, загруженная задним
+    числом) попадают в секцию по умолчанию, которая не архивируется целиком.
+    После переноса они архивируются вместе с остальными месячными секциями.
+    """
+    with conn.cursor() as cursor:
+        cursor.execute("""
+            SELECT DISTINCT date_trunc('month', created_at) AS month_start,
+                   date_trunc('month', created_at) + INTERVAL '1 month'
+            FROM operations_default
+            WHERE created_at < %s
+            ORDER BY month_start
+        """, (cutoff,))
+        months = cursor.fetchall()
+    conn.rollback()
+
+    for month_start, month_end in months:
+        name = f"operations_{month_start:%Y_%m}"
+        if dry_run:
+            print(f"Строки operations_default за {month_start:%Y-%m} будут перенесены в секцию {name}")
+            continue
+
+        # Секция заполняется до подключения, поэтому ATTACH не нарушает
+        # ограничение секции по умолчанию
+        partition = sql.Identifier(name)
+        with conn.cursor() as cursor:
+            cursor.execute(
+                sql.SQL("CREATE TABLE {} (LIKE operations INCLUDING DEFAULTS INCLUDING CONSTRAINTS)").format(partition)
+            )
+            cursor.execute(
+                sql.SQL("""
+                    WITH moved AS (
+                        DELETE FROM operations_default
+                        WHERE created_at >= %s AND created_at < %s
+                        RETURNING *
+                    )
+                    INSERT INTO {} SELECT * FROM moved
+                """).format(partition),
+                (month_start, month_end)
+            )
+            moved = cursor.rowcount
+            cursor.execute(
+                sql.SQL("ALTER TABLE operations ATTACH PARTITION {} FOR VALUES FROM (%s) TO (%s)").format(partition),
+                (month_start, month_end)
+            )
+        conn.commit()
+        print(f"Строки operations_default за {month_start:%Y-%m} ({moved}) перенесены в секцию {name}")
+
+    return len(months)
+
+
+def archive_operations(args):
+    """Выгружает старые секции истории операций в сжатые файлы и удаляет их"""
+    from database import db
+
+    conn = db.get_connection()
+    if not conn:
+        return False
+
+    try:
+        with conn.cursor() as cursor:
+            cursor.execute(
+                "SELECT date_trunc('month', LOCALTIMESTAMP) - make_interval(months => %s)",
+                (args.keep_months,)
+            )
+            cutoff = cursor.fetchone()[0]
+        conn.rollback()
+
+        split_default_partition(conn, cutoff, args.dry_run)
+
+        with conn.cursor() as cursor:
+            cursor.execute("""
+                SELECT c.relname, pg_get_expr(c.relpartbound, c.oid)
+                FROM pg_inherits i
+                JOIN pg_class c ON c.oid = i.inhrelid
+                WHERE i.inhparent = 'operations'::regclass
+                ORDER BY c.relname
+            """)
+            partitions = cursor.fetchall()
+        conn.rollback()
+
+        os.makedirs(args.output_dir, exist_ok=True)
+        archived = 0
+
+        for name, bound in partitions:
+            # Секция по умолчанию не имеет границ и не архивируется
+            match = PARTITION_UPPER_BOUND_RE.search(bound)
+            if not match or datetime.fromisoformat(match.group(1)) > cutoff:
+                continue
+
+            path = os.path.join(args.output_dir, f"{name}.csv.gz")
+            # Месяц мог архивироваться раньше, если позже в него попали
+            # строки из operations_default: прежний архив не перезаписывается
+            if os.path.exists(path):
+                path = os.path.join(args.output_dir, f"{name}_{datetime.now():%Y%m%d_%H%M%S}.csv.gz")
+            if args.dry_run:
+                print(f"Будет архивирована секция {name} -> {path}")
+                continue
+
+            # Сначала выгружаем данные, и только после успешной записи файла
+            # отсоединяем и удаляем секцию
+            temp_path = path + ".tmp"
+            with conn.cursor() as cursor:
+                with gzip.open(temp_path, "wt", encoding="utf-8") as archive:
+                    cursor.copy_expert(
+                        sql.SQL("COPY {} TO STDOUT WITH (FORMAT csv, HEADER)").format(sql.Identifier(name)),
+                        archive
+                    )
+                with open(temp_path, "rb") as archive:
+                    os.fsync(archive.fileno())
+                os.replace(temp_path, path)
+
+                cursor.execute(
+                    sql.SQL("ALTER TABLE operations DETACH PARTITION {}").format(sql.Identifier(name))
+                )
+                cursor.execute(sql.SQL("DROP TABLE {}").format(sql.Identifier(name)))
+                cursor.execute(
+                    "INSERT INTO operations_archives (partition_name, path) VALUES (%s, %s)",
+                    (name, os.path.abspath(path))
+                )
+            conn.commit()
+
+            archived += 1
+            print(f"Секция {name} архивирована в {path}")
+
+        print(f"Архивировано секций: {archived}")
+        return True
+    except (psycopg2.Error, OSError) as e:
+        print(f"Ошибка архивации истории операций: {e}")
+        return False
+    finally:
+        conn.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Обслуживание базы данных GenBot")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    migrate_parser = commands.add_parser("migrate", help="применить миграции схемы")
+    migrate_parser.add_argument(
+        "--target", type=int, default=None, help="версия, до которой применить миграции"
+    )
+    migrate_parser.set_defaults(handler=migrate)
+
+    backfill = commands.add_parser(
+        "backfill-stats", help="пересчитать накопительную статистику пользователей"
+    )
+    backfill.add_argument(
+        "--force", action="store_true",
+        help="пересчитать, даже если часть истории архивирована (ее итоги будут потеряны)"
+    )
+    backfill.add_argument(
+        "--archive-dir", default=OPERATIONS_ARCHIVE_DIR,
+        help="каталог архивов .csv.gz для проверки"
+    )
+    backfill.set_defaults(handler=backfill_stats)
+
+    archive = commands.add_parser(
+        "archive-operations", help="выгрузить и удалить старые секции истории операций"
+    )
+    archive.add_argument(
+        "--keep-months", type=int, default=OPERATIONS_RETENTION_MONTHS,
+        help="сколько последних месяцев оставить в базе"
+    )
+    archive.add_argument(
+        "--output-dir", default=OPERATIONS_ARCHIVE_DIR,
+        help="каталог для архивов .csv.gz"
+    )
+    archive.add_argument(
+        "--dry-run", action="store_true", help="только показать секции для архивации"
+    )
+    archive.set_defaults(handler=archive_operations)
+
+    args = parser.parse_args(argv)
+    return 0 if args.handler(args) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,294 @@
+import bisect
+from abc import ABC, abstractmethod
+import functools
+import time
+from contextvars import ContextVar
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Sequence, Tuple, Union
+
+from aiogram import BaseMiddleware
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware
+from aiogram.types import TelegramObject
+from aiohttp import web
+
+# Границы корзин гистограмм задержки, с
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+LabelValues = Tuple[str, ...]
+
+# Функция, вычисляющая значение метрики в момент чтения: число для метрики
+# без меток или словарь значений меток -> число
+MetricFunction = Callable[[], Union[float, Dict[LabelValues, float]]]
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str]) -> str:
+    if not names:
+        return ""
+    pairs = ",".join(f'{name}="{_escape(str(value))}"' for name, value in zip(names, values))
+    return "{" + pairs + "}"
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Metric(ABC):
+    """Базовая метрика с набором меток"""
+
+    kind = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        lines.extend(self._samples())
+        return lines
+
+    @abstractmethod
+    def _samples(self) -> List[str]:
+        """Строки значений метрики в текстовом формате"""
+
+
+class ValueMetric(Metric):
+    """Одно значение на набор меток; может вычисляться функцией в момент чтения.
+
+    Функция используется для счетчиков, которые уже ведут другие объекты
+    (например, stats() планировщика отправки).
+    """
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 function: Optional[MetricFunction] = None):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[LabelValues, float] = {}
+        self._function = function
+
+    def _samples(self) -> List[str]:
+        if self._function is None:
+            values = self._values
+        elif self.labelnames:
+            values = self._function()
+        else:
+            values = {(): self._function()}
+        return [
+            f"{self.name}{_format_labels(self.labelnames, labels)} {_format_value(value)}"
+            for labels, value in values.items()
+        ]
+
+
+class Counter(ValueMetric):
+    """Монотонно растущий счетчик"""
+
+    kind = "counter"
+
+    def inc(self, *labels: str, amount: float = 1):
+        self._values[labels] = self._values.get(labels, 0) + amount
+
+    def value(self, *labels: str) -> float:
+        return self._values.get(labels, 0)
+
+
+class Gauge(ValueMetric):
+    """Текущее значение"""
+
+    kind = "gauge"
+
+    def set(self, value: float, *labels: str):
+        self._values[labels] = value
+
+    def inc(self, *labels: str, amount: float = 1):
+        self._values[labels] = self._values.get(labels, 0) + amount
+
+    def dec(self, *labels: str, amount: float = 1):
+        self.inc(*labels, amount=-amount)
+
+
+class Histogram(Metric):
+    """Распределение значений по корзинам с суммой и количеством"""
+
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # Метки -> (количество в каждой корзине, сумма, количество)
+        self._values: Dict[LabelValues, List[Any]] = {}
+
+    def observe(self, value: float, *labels: str):
+        entry = self._values.get(labels)
+        if entry is None:
+            entry = self._values[labels] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+        entry[0][bisect.bisect_left(self.buckets, value)] += 1
+        entry[1] += value
+        entry[2] += 1
+
+    def _samples(self) -> List[str]:
+        lines = []
+        bucket_labels = self.labelnames + ("le",)
+        for labels, (counts, total, count) in self._values.items():
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += bucket_count
+                bucket = _format_labels(bucket_labels, labels + (_format_value(bound),))
+                lines.append(f"{self.name}_bucket{bucket} {cumulative}")
+            label_text = _format_labels(self.labelnames, labels)
+            lines.append(f"{self.name}_sum{label_text} {_format_value(total)}")
+            lines.append(f"{self.name}_count{label_text} {count}")
+        return lines
+
+
+class MetricsRegistry:
+    """Набор метрик процесса в текстовом формате Prometheus"""
+
+    def __init__(self):
+        self._metrics: Dict[str, Metric] = {}
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                function: Optional[MetricFunction] = None) -> Counter:
+        return self._register(Counter(name, documentation, labelnames, function))
+
+    def gauge(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+              function: Optional[MetricFunction] = None) -> Gauge:
+        return self._register(Gauge(name, documentation, labelnames, function))
+
+    def histogram(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                  buckets: Sequence[float] = LATENCY_BUCKETS) -> Histogram:
+        return self._register(Histogram(name, documentation, labelnames, buckets))
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics.values():
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+    def _register(self, metric):
+        if metric.name in self._metrics:
+            raise ValueError(f"Метрика {metric.name} уже зарегистрирована")
+        self._metrics[metric.name] = metric
+        return metric
+
+
+# Глобальный реестр метрик процесса
+registry = MetricsRegistry()
+
+updates_in_flight = registry.gauge(
+    "bot_updates_in_flight", "Обновления, обрабатываемые в данный момент"
+)
+handler_latency = registry.histogram(
+    "bot_handler_duration_seconds", "Время выполнения обработчиков", ("handler", "status")
+)
+db_method_latency = registry.histogram(
+    "bot_db_method_duration_seconds", "Время выполнения методов PostgreSQLDatabase", ("method",)
+)
+db_method_errors = registry.counter(
+    "bot_db_method_errors_total", "Ошибки базы данных в методах PostgreSQLDatabase", ("method",)
+)
+api_latency = registry.histogram(
+    "bot_api_request_duration_seconds", "Время запросов к Telegram Bot API", ("method", "status")
+)
+
+# Метод PostgreSQLDatabase, выполняющийся в текущей задаче
+current_db_method: ContextVar[str] = ContextVar("current_db_method", default="other")
+
+
+def observe_db_method(method):
+    """Декоратор метода базы данных: время выполнения по имени метода"""
+    name = method.__name__
+
+    @functools.wraps(method)
+    async def wrapper(*args, **kwargs):
+        token = current_db_method.set(name)
+        started = time.perf_counter()
+        try:
+            return await method(*args, **kwargs)
+        finally:
+            db_method_latency.observe(time.perf_counter() - started, name)
+            current_db_method.reset(token)
+
+    return wrapper
+
+
+def count_db_error():
+    """Учитывает ошибку базы данных в методе, выполняющемся в текущей задаче"""
+    db_method_errors.inc(current_db_method.get())
+
+
+class InFlightMiddleware(BaseMiddleware):
+    """Внешний middleware обновлений: количество обрабатываемых обновлений"""
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any]
+    ) -> Any:
+        updates_in_flight.inc()
+        try:
+            return await handler(event, data)
+        finally:
+            updates_in_flight.dec()
+
+
+class HandlerMetricsMiddleware(BaseMiddleware):
+    """Время выполнения обработчиков по имени функции обработчика.
+
+    Имя обработчика однозначно соответствует префиксу callback data или
+    состоянию FSM, по которому он выбран, и не зависит от параметров
+    (номера страницы, шаблона, суммы), поэтому число меток ограничено.
+    """
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any]
+    ) -> Any:
+        handler_object = data.get("handler")
+        name = handler_object.callback.__name__ if handler_object is not None else "unknown"
+        status = "error"
+        started = time.perf_counter()
+        try:
+            result = await handler(event, data)
+            status = "ok"
+            return result
+        finally:
+            handler_latency.observe(time.perf_counter() - started, name, status)
+
+
+class ApiMetricsMiddleware(BaseRequestMiddleware):
+    """Время запросов к Bot API по методу"""
+
+    async def __call__(self, make_request, bot, method):
+        status = "error"
+        started = time.perf_counter()
+        try:
+            response = await make_request(bot, method)
+            status = "ok"
+            return response
+        finally:
+            api_latency.observe(time.perf_counter() - started, method.__api_method__, status)
+
+
+async def handle_metrics(request: web.Request) -> web.Response:
+    return web.Response(body=registry.render().encode("utf-8"), headers={"Content-Type": CONTENT_TYPE})
+
+
+async def start_metrics_server(host: str, port: int) -> web.AppRunner:
+    """Запускает HTTP-сервер с /metrics; остановка - runner.cleanup()"""
+    app = web.Application()
+    app.router.add_get("/metrics", handle_metrics)
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    await web.TCPSite(runner, host, port).start()
+    print(f"Метрики доступны на http://{host}:{port}/metrics")
+    return runner
@@ -0,0 +1,28 @@
+-- Начальная схема: пользователи и история операций
+
+CREATE TABLE IF NOT EXISTS users (
+    user_id BIGINT PRIMARY KEY,
+    language VARCHAR(2) NOT NULL DEFAULT 'ru',
+    balance DECIMAL(10,2) NOT NULL DEFAULT 10.0,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE TABLE IF NOT EXISTS operations (
+    id SERIAL PRIMARY KEY,
+    user_id BIGINT NOT NULL,
+    operation_type VARCHAR(50) NOT NULL,
+    amount DECIMAL(10,2) NOT NULL,
+    balance_before DECIMAL(10,2) NOT NULL,
+    balance_after DECIMAL(10,2) NOT NULL,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    FOREIGN KEY (user_id) REFERENCES users(user_id)
+);
+
+CREATE INDEX IF NOT EXISTS idx_operations_user_id ON operations(user_id);
+CREATE INDEX IF NOT EXISTS idx_operations_created_at ON operations(created_at);
+
+COMMENT ON TABLE users IS 'Таблица пользователей бота';
+COMMENT ON COLUMN users.user_id IS 'ID пользователя в Telegram';
+COMMENT ON COLUMN users.language IS 'Язык интерфейса (ru/en)';
+COMMENT ON COLUMN users.balance IS 'Баланс в кредитах';
@@ -0,0 +1,45 @@
+-- Накопительная статистика пользователей, обновляемая триггером
+
+CREATE TABLE IF NOT EXISTS user_stats (
+    user_id BIGINT PRIMARY KEY REFERENCES users(user_id),
+    total_operations BIGINT NOT NULL DEFAULT 0,
+    total_top_ups DECIMAL(14,2) NOT NULL DEFAULT 0,
+    total_deductions DECIMAL(14,2) NOT NULL DEFAULT 0
+);
+
+CREATE OR REPLACE FUNCTION update_user_stats() RETURNS TRIGGER AS $$
+BEGIN
+    INSERT INTO user_stats (user_id, total_operations, total_top_ups, total_deductions)
+    VALUES (
+        NEW.user_id,
+        1,
+        CASE WHEN NEW.operation_type = 'top_up' THEN NEW.amount ELSE 0 END,
+        CASE WHEN NEW.operation_type = 'deduct' THEN NEW.amount ELSE 0 END
+    )
+    ON CONFLICT (user_id) DO UPDATE SET
+        total_operations = user_stats.total_operations + EXCLUDED.total_operations,
+        total_top_ups = user_stats.total_top_ups + EXCLUDED.total_top_ups,
+        total_deductions = user_stats.total_deductions + EXCLUDED.total_deductions;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS operations_user_stats ON operations;
+CREATE TRIGGER operations_user_stats
+    AFTER INSERT ON operations
+    FOR EACH ROW EXECUTE FUNCTION update_user_stats();
+
+CREATE OR REPLACE VIEW user_statistics AS
+SELECT
+    u.user_id,
+    u.language,
+    u.balance,
+    u.created_at,
+    u.updated_at,
+    COALESCE(s.total_operations, 0) as total_operations,
+    COALESCE(s.total_top_ups, 0) as total_top_ups,
+    COALESCE(s.total_deductions, 0) as total_deductions
+FROM users u
+LEFT JOIN user_stats s ON u.user_id = s.user_id;
+
+COMMENT ON TABLE user_stats IS 'Накопительная статистика операций пользователей';
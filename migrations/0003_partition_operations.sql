@@ -0,0 +1,105 @@
+-- Секционирование истории операций по месяцам
+
+-- Перевод существующей непартиционированной таблицы: она переименовывается
+-- и затем подключается к новой таблице как секция со всей прежней историей
+DO $$
+BEGIN
+    IF to_regclass('operations') IS NOT NULL AND NOT EXISTS (
+        SELECT 1 FROM pg_partitioned_table WHERE partrelid = 'operations'::regclass
+    ) THEN
+        ALTER TABLE operations RENAME TO operations_legacy;
+        ALTER TABLE operations_legacy RENAME CONSTRAINT operations_pkey TO operations_legacy_pkey;
+        ALTER INDEX IF EXISTS idx_operations_user_id RENAME TO idx_operations_legacy_user_id;
+        ALTER INDEX IF EXISTS idx_operations_created_at RENAME TO idx_operations_legacy_created_at;
+        DROP TRIGGER IF EXISTS operations_user_stats ON operations_legacy;
+        ALTER SEQUENCE operations_id_seq AS BIGINT OWNED BY NONE;
+        ALTER TABLE operations_legacy
+            ALTER COLUMN id TYPE BIGINT,
+            ALTER COLUMN created_at SET NOT NULL;
+    END IF;
+END $$;
+
+CREATE SEQUENCE IF NOT EXISTS operations_id_seq AS BIGINT;
+
+CREATE TABLE IF NOT EXISTS operations (
+    id BIGINT NOT NULL DEFAULT nextval('operations_id_seq'),
+    user_id BIGINT NOT NULL,
+    operation_type VARCHAR(50) NOT NULL,
+    amount DECIMAL(10,2) NOT NULL,
+    balance_before DECIMAL(10,2) NOT NULL,
+    balance_after DECIMAL(10,2) NOT NULL,
+    created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (id, created_at),
+    FOREIGN KEY (user_id) REFERENCES users(user_id)
+) PARTITION BY RANGE (created_at);
+
+ALTER SEQUENCE operations_id_seq OWNED BY operations.id;
+
+CREATE INDEX IF NOT EXISTS idx_operations_user_id ON operations(user_id);
+CREATE INDEX IF NOT EXISTS idx_operations_created_at ON operations(created_at);
+
+DO $$
+BEGIN
+    IF to_regclass('operations_legacy') IS NULL OR EXISTS (
+        SELECT 1 FROM pg_inherits WHERE inhrelid = 'operations_legacy'::regclass
+    ) THEN
+        RETURN;
+    END IF;
+
+    -- Пустую прежнюю таблицу (новая установка) подключать незачем
+    IF NOT EXISTS (SELECT 1 FROM operations_legacy) THEN
+        DROP TABLE operations_legacy;
+    ELSE
+        EXECUTE format(
+            'ALTER TABLE operations ATTACH PARTITION operations_legacy FOR VALUES FROM (MINVALUE) TO (%L)',
+            date_trunc('month', LOCALTIMESTAMP) + INTERVAL '1 month'
+        );
+    END IF;
+END $$;
+
+-- Создает месячные секции operations_ГГГГ_ММ на months_ahead месяцев вперед
+CREATE OR REPLACE FUNCTION ensure_operations_partitions(months_ahead INTEGER) RETURNS INTEGER AS $$
+DECLARE
+    month_start TIMESTAMP;
+    partition_name TEXT;
+    created INTEGER := 0;
+BEGIN
+    FOR i IN 0..months_ahead LOOP
+        month_start := date_trunc('month', LOCALTIMESTAMP) + make_interval(months => i);
+        partition_name := 'operations_' || to_char(month_start, 'YYYY_MM');
+        CONTINUE WHEN to_regclass(partition_name) IS NOT NULL;
+
+        BEGIN
+            EXECUTE format(
+                'CREATE TABLE %I PARTITION OF operations FOR VALUES FROM (%L) TO (%L)',
+                partition_name, month_start, month_start + INTERVAL '1 month'
+            );
+            created := created + 1;
+        EXCEPTION
+            WHEN invalid_object_definition THEN
+                -- Месяц уже покрыт другой секцией (например, operations_legacy)
+                NULL;
+            WHEN check_violation THEN
+                RAISE WARNING 'Секция % не создана: в operations_default есть строки за этот месяц', partition_name;
+        END;
+    END LOOP;
+    RETURN created;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Секция для строк вне созданных месяцев, чтобы запись не завершалась ошибкой
+CREATE TABLE IF NOT EXISTS operations_default PARTITION OF operations DEFAULT;
+
+SELECT ensure_operations_partitions(3);
+
+-- Триггер статистики переносится на секционированную таблицу
+DROP TRIGGER IF EXISTS operations_user_stats ON operations;
+CREATE TRIGGER operations_user_stats
+    AFTER INSERT ON operations
+    FOR EACH ROW EXECUTE FUNCTION update_user_stats();
+
+COMMENT ON TABLE operations IS 'История операций с балансом пользователей';
+COMMENT ON COLUMN operations.operation_type IS 'Тип операции: top_up/deduct';
+COMMENT ON COLUMN operations.amount IS 'Сумма операции';
+COMMENT ON COLUMN operations.balance_before IS 'Баланс до операции';
+COMMENT ON COLUMN operations.balance_after IS 'Баланс после операции';
@@ -0,0 +1,24 @@
+-- Снимок статистики пользователей для отчетов администратора.
+-- Обновляется ботом через REFRESH MATERIALIZED VIEW CONCURRENTLY,
+-- поэтому отчеты не конкурируют с рабочими запросами к users и user_stats
+
+DROP VIEW IF EXISTS user_statistics;
+
+CREATE MATERIALIZED VIEW IF NOT EXISTS user_statistics AS
+SELECT
+    u.user_id,
+    u.language,
+    u.balance,
+    u.created_at,
+    u.updated_at,
+    COALESCE(s.total_operations, 0) as total_operations,
+    COALESCE(s.total_top_ups, 0) as total_top_ups,
+    COALESCE(s.total_deductions, 0) as total_deductions
+FROM users u
+LEFT JOIN user_stats s ON u.user_id = s.user_id
+WITH DATA;
+
+-- Уникальный индекс обязателен для обновления с CONCURRENTLY
+CREATE UNIQUE INDEX IF NOT EXISTS idx_user_statistics_user_id ON user_statistics(user_id);
+
+COMMENT ON MATERIALIZED VIEW user_statistics IS 'Снимок статистики пользователей для отчетов';
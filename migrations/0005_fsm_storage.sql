@@ -0,0 +1,16 @@
+-- Состояния FSM пользователей, общие для всех экземпляров бота.
+-- Ключ объединяет bot_id, chat_id, user_id, thread_id, business_connection_id
+-- и destiny из StorageKey aiogram. Записи с истекшим expires_at не читаются
+-- и периодически удаляются ботом
+
+CREATE TABLE IF NOT EXISTS fsm_states (
+    key TEXT PRIMARY KEY,
+    state TEXT,
+    data JSONB NOT NULL DEFAULT '{}',
+    expires_at TIMESTAMPTZ
+);
+
+CREATE INDEX IF NOT EXISTS idx_fsm_states_expires_at ON fsm_states(expires_at)
+WHERE expires_at IS NOT NULL;
+
+COMMENT ON TABLE fsm_states IS 'Состояния и данные FSM пользователей';
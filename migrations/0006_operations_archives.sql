@@ -0,0 +1,11 @@
+-- Журнал секций истории операций, выгруженных manage.py archive-operations.
+-- Строки архивированных секций удалены из operations, поэтому пересчет
+-- user_stats по оставшейся истории потерял бы их итоги
+
+CREATE TABLE IF NOT EXISTS operations_archives (
+    partition_name TEXT NOT NULL,
+    path TEXT PRIMARY KEY,
+    archived_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
+
+COMMENT ON TABLE operations_archives IS 'Архивированные и удаленные секции operations';
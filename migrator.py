@@ -0,0 +1,95 @@
+import os
+import re
+from typing import List, NamedTuple, Optional
+
+# Каталог с файлами миграций вида 0001_name.sql
+MIGRATIONS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "migrations")
+MIGRATION_FILE_RE = re.compile(r"^(\d+)_(\w+)\.sql$")
+
+# Ключ advisory-блокировки, чтобы миграции не выполнялись параллельно
+MIGRATION_LOCK_ID = 62000001
+
+
+class Migration(NamedTuple):
+    version: int
+    name: str
+    path: str
+
+
+def discover_migrations(directory: str = MIGRATIONS_DIR) -> List[Migration]:
+    """Возвращает миграции из каталога в порядке версий"""
+    migrations = []
+    for filename in os.listdir(directory):
+        match = MIGRATION_FILE_RE.match(filename)
+        if match:
+            migrations.append(Migration(
+                version=int(match.group(1)),
+                name=match.group(2),
+                path=os.path.join(directory, filename)
+            ))
+
+    migrations.sort(key=lambda m: m.version)
+    versions = [m.version for m in migrations]
+    if len(versions) != len(set(versions)):
+        raise ValueError("Найдены миграции с одинаковыми номерами версий")
+    return migrations
+
+
+def latest_version(directory: str = MIGRATIONS_DIR) -> int:
+    """Номер последней доступной миграции"""
+    migrations = discover_migrations(directory)
+    return migrations[-1].version if migrations else 0
+
+
+def get_schema_version(conn) -> int:
+    """Текущая версия схемы базы данных (0, если миграции не применялись)"""
+    with conn.cursor() as cursor:
+        cursor.execute("SELECT to_regclass('schema_version') IS NOT NULL")
+        if not cursor.fetchone()[0]:
+            return 0
+        cursor.execute("SELECT COALESCE(MAX(version), 0) FROM schema_version")
+        return cursor.fetchone()[0]
+
+
+def apply_migrations(conn, target: Optional[int] = None) -> List[Migration]:
+    """Применяет непримененные миграции, каждую в отдельной транзакции"""
+    with conn.cursor() as cursor:
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS schema_version (
+                version INTEGER PRIMARY KEY,
+                name VARCHAR(255) NOT NULL,
+                applied_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+            )
+        """)
+        cursor.execute("SELECT pg_advisory_lock(%s)", (MIGRATION_LOCK_ID,))
+    conn.commit()
+
+    applied = []
+    try:
+        current = get_schema_version(conn)
+        for migration in discover_migrations():
+            if migration.version <= current:
+                continue
+            if target is not None and migration.version > target:
+                break
+
+            with open(migration.path, encoding="utf-8") as f:
+                migration_sql = f.read()
+
+            with conn.cursor() as cursor:
+                cursor.execute(migration_sql)
+                cursor.execute(
+                    "INSERT INTO schema_version (version, name) VALUES (%s, %s)",
+                    (migration.version, migration.name)
+                )
+            conn.commit()
+            applied.append(migration)
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        with conn.cursor() as cursor:
+            cursor.execute("SELECT pg_advisory_unlock(%s)", (MIGRATION_LOCK_ID,))
+        conn.commit()
+
+    return applied
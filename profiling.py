@@ -0,0 +1,207 @@
+import asyncio
+import cProfile
+import io
+import math
+import os
+import pstats
+import signal
+import sys
+import threading
+import time
+from typing import Dict, Optional
+
+from config import PROFILE_DIR, PROFILE_MAX_SECONDS, LOOP_LAG_THRESHOLD_MS
+from metrics import registry
+
+loop_lag = registry.histogram(
+    "bot_event_loop_lag_seconds", "Задержка event loop относительно расписания",
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+)
+
+
+class ProfilerBusyError(Exception):
+    """Профилирование уже выполняется"""
+
+
+class LoopProfiler:
+    """Профилирование работающего бота с помощью cProfile.
+
+    Профилируется поток event loop, то есть обработчики, middleware, разбор
+    обновлений и построение клавиатур. Запросы psycopg2 выполняются в пуле
+    потоков и видны как ожидание результата.
+    """
+
+    def __init__(self, directory: str, max_seconds: float):
+        self.directory = directory
+        self.max_seconds = max_seconds
+        self._running = False
+
+    @property
+    def running(self) -> bool:
+        return self._running
+
+    def clamp(self, seconds: float) -> float:
+        """Длительность профилирования: от 1 секунды до max_seconds.
+
+        Бесконечные, NaN и неположительные значения не принимаются: NaN не
+        ограничивается min/max, и asyncio.sleep(nan) никогда не завершается.
+        """
+        if not math.isfinite(seconds) or seconds <= 0:
+            raise ValueError(f"Недопустимая длительность профилирования: {seconds}")
+        return min(max(seconds, 1.0), self.max_seconds)
+
+    async def run(self, seconds: float) -> str:
+        """Профилирует seconds секунд (см. clamp) и возвращает путь к файлу статистики"""
+        seconds = self.clamp(seconds)
+        if self._running:
+            raise ProfilerBusyError("Профилирование уже выполняется")
+
+        self._running = True
+        profiler = cProfile.Profile()
+        try:
+            profiler.enable()
+            try:
+                await asyncio.sleep(seconds)
+            finally:
+                profiler.disable()
+        finally:
+            self._running = False
+
+        path = os.path.join(self.directory, time.strftime("profile_%Y%m%d_%H%M%S.prof"))
+        await asyncio.get_running_loop().run_in_executor(None, self._dump, profiler, path)
+        return path
+
+    @staticmethod
+    def summary(path: str, limit: int = 15) -> str:
+        """Функции с наибольшим суммарным временем из файла статистики"""
+        output = io.StringIO()
+        stats = pstats.Stats(path, stream=output)
+        stats.strip_dirs().sort_stats("cumulative").print_stats(limit)
+        return output.getvalue()
+
+    def _dump(self, profiler: cProfile.Profile, path: str):
+        os.makedirs(self.directory, exist_ok=True)
+        profiler.dump_stats(path)
+
+
+class LoopLagMonitor:
+    """Обнаружение блокировок event loop.
+
+    Задача в event loop отмечается каждые interval секунд и измеряет, на
+    сколько опоздало ее пробуждение. Отдельный поток проверяет отметки и,
+    если loop не отвечает дольше threshold, выводит имя обработчика и место
+    в коде, где поток event loop находится в этот момент.
+    """
+
+    def __init__(self, threshold: float):
+        self.threshold = threshold
+        self.interval = threshold / 2
+        self.stalls = 0
+        self.max_lag = 0.0
+
+        # Код функций обработчиков -> имя для отчета
+        self._handler_codes: Dict[object, str] = {}
+        self._beat = time.monotonic()
+        self._loop_thread_id: Optional[int] = None
+        self._task: Optional[asyncio.Task] = None
+        self._thread: Optional[threading.Thread] = None
+        self._stopped = threading.Event()
+
+    def watch(self, dispatcher):
+        """Запоминает обработчики диспетчера и вложенных роутеров"""
+        for router in dispatcher.chain_tail:
+            for observer in router.observers.values():
+                for handler in observer.handlers:
+                    code = getattr(handler.callback, "__code__", None)
+                    if code is not None:
+                        self._handler_codes[code] = handler.callback.__name__
+
+    def start(self):
+        if self._task is not None:
+            return
+        self._loop_thread_id = threading.get_ident()
+        self._beat = time.monotonic()
+        self._stopped.clear()
+        self._task = asyncio.create_task(self._heartbeat())
+        self._thread = threading.Thread(target=self._watch, name="loop-lag-monitor", daemon=True)
+        self._thread.start()
+
+    async def stop(self):
+        if self._task is None:
+            return
+        self._stopped.set()
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+        self._thread = None
+
+    async def _heartbeat(self):
+        while True:
+            self._beat = started = time.monotonic()
+            await asyncio.sleep(self.interval)
+            lag = max(time.monotonic() - started - self.interval, 0.0)
+            loop_lag.observe(lag)
+            self.max_lag = max(self.max_lag, lag)
+
+    def _watch(self):
+        reported_beat = None
+        while not self._stopped.wait(self.interval):
+            beat = self._beat
+            blocked = time.monotonic() - beat - self.interval
+            # Об одной блокировке сообщаем один раз
+            if blocked > self.threshold and beat != reported_beat:
+                reported_beat = beat
+                self.stalls += 1
+                self._report(blocked)
+
+    def _report(self, blocked: float):
+        frame = sys._current_frames().get(self._loop_thread_id)
+        if frame is None:
+            return
+
+        location = f"{os.path.basename(frame.f_code.co_filename)}:{frame.f_lineno} в {frame.f_code.co_name}"
+        handler = "вне обработчиков"
+        while frame is not None:
+            name = self._handler_codes.get(frame.f_code)
+            if name is not None:
+                handler = f"обработчик {name}"
+                break
+            frame = frame.f_back
+
+        print(f"Event loop заблокирован более {blocked * 1000:.0f} мс: {handler}, {location}")
+
+
+def install_profile_signal(profiler: LoopProfiler, seconds: float):
+    """Запускать профилирование по SIGUSR1 (сигнал недоступен на Windows)"""
+    if not hasattr(signal, "SIGUSR1"):
+        return False
+
+    def start_profile():
+        if profiler.running:
+            print("Профилирование уже выполняется")
+            return
+        asyncio.create_task(_profile_to_log(profiler, seconds))
+
+    try:
+        asyncio.get_running_loop().add_signal_handler(signal.SIGUSR1, start_profile)
+    except NotImplementedError:
+        return False
+    return True
+
+
+async def _profile_to_log(profiler: LoopProfiler, seconds: float):
+    print(f"Профилирование на {seconds} с")
+    try:
+        path = await profiler.run(seconds)
+    except (ProfilerBusyError, ValueError, OSError) as e:
+        print(f"Ошибка профилирования: {e}")
+        return
+    print(f"Профиль сохранен в {path}")
+
+
+# Глобальные профилировщик и монитор event loop (LOOP_LAG_THRESHOLD_MS=0 отключает монитор)
+loop_profiler = LoopProfiler(PROFILE_DIR, PROFILE_MAX_SECONDS)
+loop_monitor = LoopLagMonitor(LOOP_LAG_THRESHOLD_MS / 1000) if LOOP_LAG_THRESHOLD_MS > 0 else None
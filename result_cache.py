@@ -0,0 +1,201 @@
+import asyncio
+import hashlib
+import os
+import tempfile
+import unicodedata
+from collections import OrderedDict
+from typing import Optional
+
+from aiogram.exceptions import TelegramBadRequest
+from aiogram.types import BufferedInputFile
+
+from config import RESULT_CACHE_DIR, RESULT_CACHE_MAX_BYTES
+
+# Расширения файлов кэша: результат генерации и file_id загруженного результата
+DATA_SUFFIX = ".bin"
+FILE_ID_SUFFIX = ".file_id"
+
+
+def normalize_prompt(prompt: str) -> str:
+    """Приводит промпт к каноническому виду для ключа кэша"""
+    return " ".join(unicodedata.normalize("NFC", prompt).casefold().split())
+
+
+class ResultCache:
+    """Кэш результатов генерации на локальном диске.
+
+    Ключ - хэш от file_unique_id исходного фото, нормализованного промпта
+    и версии движка. Вместе с результатом хранится file_id загруженного в
+    Telegram изображения, чтобы повторно отправлять его без загрузки.
+    Суммарный размер результатов ограничен max_bytes, при превышении
+    удаляются давно не использованные записи.
+    """
+
+    def __init__(self, directory: str, max_bytes: int):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+
+        # key -> размер результата, в порядке последнего использования
+        self._entries: Optional["OrderedDict[str, int]"] = None
+        self._size = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_bytes > 0
+
+    @property
+    def size(self) -> int:
+        return self._size
+
+    @staticmethod
+    def make_key(file_unique_id: str, prompt: str, engine_version: str) -> str:
+        """Вычисляет ключ результата генерации"""
+        source = "\0".join((file_unique_id, normalize_prompt(prompt), engine_version))
+        return hashlib.sha256(source.encode("utf-8")).hexdigest()
+
+    async def send(self, bot, chat_id: int, key: str, caption: str) -> bool:
+        """Отправляет результат из кэша. Возвращает False, если его нет"""
+        await self._ensure_loaded()
+        if key not in self._entries:
+            self.misses += 1
+            return False
+
+        file_id = await self._run(self._read_file_id, key)
+        if file_id:
+            try:
+                await bot.send_photo(chat_id, photo=file_id, caption=caption)
+                self._touch(key)
+                self.hits += 1
+                return True
+            except TelegramBadRequest:
+                # file_id больше не действителен, загружаем результат заново
+                pass
+
+        try:
+            data = await self._run(self._read_data, key)
+        except OSError:
+            self._forget(key)
+            self.misses += 1
+            return False
+
+        message = await bot.send_photo(
+            chat_id, photo=BufferedInputFile(data, filename="result.jpg"), caption=caption
+        )
+        await self._run(self._write_file_id, key, message.photo[-1].file_id)
+        self._touch(key)
+        self.hits += 1
+        return True
+
+    async def put(self, key: str, data: bytes, file_id: Optional[str] = None):
+        """Сохраняет результат генерации и file_id загруженного изображения"""
+        if len(data) > self.max_bytes:
+            return
+        await self._ensure_loaded()
+
+        try:
+            await self._run(self._write_entry, key, data, file_id)
+        except OSError as e:
+            print(f"Ошибка записи в кэш результатов: {e}")
+            return
+
+        self._forget(key)
+        self._entries[key] = len(data)
+        self._size += len(data)
+
+        evicted = []
+        while self._size > self.max_bytes:
+            old_key, old_size = self._entries.popitem(last=False)
+            self._size -= old_size
+            evicted.append(old_key)
+        if evicted:
+            await self._run(self._remove_entries, evicted)
+
+    async def _ensure_loaded(self):
+        if self._entries is None:
+            entries = await self._run(self._scan)
+            if self._entries is None:
+                self._entries = entries
+                self._size = sum(entries.values())
+
+    def _touch(self, key: str):
+        self._entries.move_to_end(key)
+        # Время изменения файла хранит порядок использования между перезапусками
+        asyncio.get_running_loop().run_in_executor(None, self._utime, key)
+
+    def _forget(self, key: str):
+        size = self._entries.pop(key, None)
+        if size is not None:
+            self._size -= size
+
+    @staticmethod
+    async def _run(func, *args):
+        return await asyncio.get_running_loop().run_in_executor(None, func, *args)
+
+    def _path(self, key: str, suffix: str) -> str:
+        return os.path.join(self.directory, key + suffix)
+
+    def _scan(self) -> "OrderedDict[str, int]":
+        os.makedirs(self.directory, exist_ok=True)
+        found = []
+        for entry in os.scandir(self.directory):
+            if entry.is_file() and entry.name.endswith(DATA_SUFFIX):
+                stat = entry.stat()
+                found.append((stat.st_mtime, entry.name[:-len(DATA_SUFFIX)], stat.st_size))
+        found.sort()
+        return OrderedDict((key, size) for _, key, size in found)
+
+    def _read_data(self, key: str) -> bytes:
+        with open(self._path(key, DATA_SUFFIX), "rb") as f:
+            return f.read()
+
+    def _read_file_id(self, key: str) -> Optional[str]:
+        try:
+            with open(self._path(key, FILE_ID_SUFFIX), encoding="utf-8") as f:
+                return f.read().strip() or None
+        except OSError:
+            return None
+
+    def _write_file_id(self, key: str, file_id: str):
+        self._write_atomic(self._path(key, FILE_ID_SUFFIX), file_id.encode("utf-8"))
+
+    def _write_entry(self, key: str, data: bytes, file_id: Optional[str]):
+        self._write_atomic(self._path(key, DATA_SUFFIX), data)
+        if file_id:
+            self._write_file_id(key, file_id)
+
+    @staticmethod
+    def _write_atomic(path: str, data: bytes):
+        # Уникальное имя: параллельные записи одного ключа не пишут в общий файл
+        fd, temp_path = tempfile.mkstemp(
+            dir=os.path.dirname(path), prefix=os.path.basename(path) + ".", suffix=".tmp"
+        )
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.replace(temp_path, path)
+        except BaseException:
+            try:
+                os.remove(temp_path)
+            except OSError:
+                pass
+            raise
+
+    def _utime(self, key: str):
+        try:
+            os.utime(self._path(key, DATA_SUFFIX))
+        except OSError:
+            pass
+
+    def _remove_entries(self, keys):
+        for key in keys:
+            for suffix in (DATA_SUFFIX, FILE_ID_SUFFIX):
+                try:
+                    os.remove(self._path(key, suffix))
+                except FileNotFoundError:
+                    pass
+
+
+# Глобальный кэш результатов генерации (RESULT_CACHE_MAX_BYTES=0 отключает кэш)
+result_cache = ResultCache(RESULT_CACHE_DIR, RESULT_CACHE_MAX_BYTES)
@@ -0,0 +1,215 @@
+import asyncio
+import heapq
+import itertools
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, List, Optional, Tuple, Union
+
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware
+from aiogram.exceptions import TelegramRetryAfter
+
+from config import (
+    SEND_GLOBAL_RATE, SEND_GLOBAL_BURST, SEND_CHAT_RATE, SEND_CHAT_BURST,
+    SEND_GROUP_RATE, SEND_GROUP_BURST, SEND_MAX_RETRIES
+)
+from metrics import registry
+from throttling import TokenBucket
+
+# Приоритеты отправки: меньшее значение обслуживается раньше
+INTERACTIVE = 0
+BULK = 1
+
+send_priority: ContextVar[int] = ContextVar("send_priority", default=INTERACTIVE)
+
+# Методы Bot API, на которые распространяются лимиты отправки
+LIMITED_METHOD_PREFIXES = ("send", "edit", "copy", "forward")
+
+# Как часто удаляются корзины неактивных чатов, с
+SWEEP_INTERVAL = 60.0
+
+ChatId = Union[int, str]
+
+
+@contextmanager
+def bulk_sends():
+    """Помечает отправки внутри блока как массовые: они уступают ответам пользователям"""
+    token = send_priority.set(BULK)
+    try:
+        yield
+    finally:
+        send_priority.reset(token)
+
+
+class PriorityLimiter:
+    """Общий лимит отправки: токены выдаются ожидающим в порядке приоритета"""
+
+    def __init__(self, rate: float, burst: float):
+        self._bucket = TokenBucket(rate, burst, time.monotonic())
+        # (приоритет, порядковый номер, future ожидающего)
+        self._waiters: List[Tuple[int, int, asyncio.Future]] = []
+        self._sequence = itertools.count()
+        self._pump_task: Optional[asyncio.Task] = None
+
+    @property
+    def waiting(self) -> int:
+        return len(self._waiters)
+
+    async def acquire(self, priority: int):
+        """Ждет свободного токена"""
+        if not self._waiters and self._bucket.consume(time.monotonic()):
+            return
+
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (priority, next(self._sequence), future))
+        if self._pump_task is None or self._pump_task.done():
+            self._pump_task = asyncio.create_task(self._pump())
+        await future
+
+    async def _pump(self):
+        while self._waiters:
+            future = self._waiters[0][2]
+            if future.done():
+                # Ожидание отменено, токен не расходуется
+                heapq.heappop(self._waiters)
+                continue
+
+            now = time.monotonic()
+            if self._bucket.consume(now):
+                heapq.heappop(self._waiters)
+                future.set_result(None)
+            else:
+                await asyncio.sleep(self._bucket.wait_time(now))
+
+
+class SendScheduler(BaseRequestMiddleware):
+    """Планировщик исходящих запросов сессии бота.
+
+    Отправка и изменение сообщений проходят через общий лимит бота и лимит
+    чата (для групп и каналов он ниже). Ответы пользователям обслуживаются
+    раньше массовых отправок (bulk_sends()), например результатов генерации.
+    При ответе 429 чат (для запросов без chat_id, например изменения
+    inline-сообщений, - все запросы) приостанавливается на retry_after, и запрос
+    повторяется до max_retries раз.
+    """
+
+    def __init__(self, global_limit: Tuple[float, float], chat_limit: Tuple[float, float],
+                 group_limit: Tuple[float, float], max_retries: int = 3):
+        self.chat_limit = chat_limit
+        self.group_limit = group_limit
+        self.max_retries = max_retries
+        self.sent = 0
+        self.delayed = 0
+        self.retried = 0
+        self.failed = 0
+
+        self._global = PriorityLimiter(*global_limit)
+        self._chats: Dict[ChatId, TokenBucket] = {}
+        # Момент окончания паузы после 429: для всех запросов и по чатам
+        self._global_paused_until = 0.0
+        self._paused_until: Dict[ChatId, float] = {}
+        self._next_sweep = time.monotonic() + SWEEP_INTERVAL
+
+    async def __call__(self, make_request, bot, method):
+        if not method.__api_method__.startswith(LIMITED_METHOD_PREFIXES):
+            return await make_request(bot, method)
+
+        chat_id = getattr(method, "chat_id", None)
+        priority = send_priority.get()
+        attempt = 0
+        while True:
+            await self._wait_turn(chat_id, priority)
+            try:
+                response = await make_request(bot, method)
+            except TelegramRetryAfter as e:
+                if attempt >= self.max_retries:
+                    self.failed += 1
+                    raise
+                attempt += 1
+                self.retried += 1
+                paused_until = time.monotonic() + e.retry_after
+                if chat_id is None:
+                    self._global_paused_until = max(self._global_paused_until, paused_until)
+                else:
+                    self._paused_until[chat_id] = paused_until
+                continue
+
+            self.sent += 1
+            return response
+
+    def stats(self) -> dict:
+        """Счетчики отправленных, задержанных и повторенных запросов"""
+        return {
+            "sent": self.sent,
+            "delayed": self.delayed,
+            "retried": self.retried,
+            "failed": self.failed,
+            "waiting": self._global.waiting,
+            "chats": len(self._chats)
+        }
+
+    async def _wait_turn(self, chat_id: Optional[ChatId], priority: int):
+        now = time.monotonic()
+        if now >= self._next_sweep:
+            self._sweep(now)
+
+        delay = self._global_paused_until - now
+        if chat_id is not None:
+            delay = max(
+                delay,
+                self._paused_until.get(chat_id, 0.0) - now,
+                self._chat_bucket(chat_id, now).reserve(now)
+            )
+
+        if delay > 0:
+            self.delayed += 1
+            await asyncio.sleep(delay)
+        await self._global.acquire(priority)
+
+    def _chat_bucket(self, chat_id: ChatId, now: float) -> TokenBucket:
+        bucket = self._chats.get(chat_id)
+        if bucket is None:
+            # Отрицательные id и @username - группы и каналы
+            is_group = isinstance(chat_id, str) or chat_id < 0
+            limit = self.group_limit if is_group else self.chat_limit
+            bucket = self._chats[chat_id] = TokenBucket(*limit, now)
+        return bucket
+
+    def _sweep(self, now: float):
+        self._chats = {
+            chat_id: bucket for chat_id, bucket in self._chats.items() if not bucket.is_full(now)
+        }
+        self._paused_until = {
+            chat_id: until for chat_id, until in self._paused_until.items() if until > now
+        }
+        self._next_sweep = now + SWEEP_INTERVAL
+
+
+# Глобальный планировщик отправки (подключается к сессии бота в start_bot)
+send_scheduler = SendScheduler(
+    global_limit=(SEND_GLOBAL_RATE, SEND_GLOBAL_BURST),
+    chat_limit=(SEND_CHAT_RATE, SEND_CHAT_BURST),
+    group_limit=(SEND_GROUP_RATE, SEND_GROUP_BURST),
+    max_retries=SEND_MAX_RETRIES
+)
+
+registry.gauge(
+    "bot_send_scheduler_waiting", "Запросы, ожидающие общего лимита отправки",
+    function=lambda: send_scheduler.stats()["waiting"]
+)
+registry.counter(
+    "bot_send_scheduler_sent_total", "Запросы, отправленные через планировщик",
+    function=lambda: send_scheduler.sent
+)
+registry.counter(
+    "bot_send_scheduler_delayed_total", "Запросы, задержанные лимитом чата или паузой после 429",
+    function=lambda: send_scheduler.delayed
+)
+registry.counter(
+    "bot_send_scheduler_retried_total", "Повторы запросов после ответа 429",
+    function=lambda: send_scheduler.retried
+)
+registry.counter(
+    "bot_send_scheduler_failed_total", "Запросы, получившие 429 после всех повторов",
+    function=lambda: send_scheduler.failed
+)
@@ -42,10 +42,10 @@ if %errorlevel% equ 0 (
 )
 
 echo.
-echo Подключение к базе данных genbot...
+echo Применение миграций схемы базы данных...
 
-REM Подключаемся к базе данных и выполняем SQL скрипт
-psql -U postgres -h localhost -p 6200 -d genbot -f database_setup.sql
+REM Применяем миграции (пароль передается через переменную DB_PASSWORD)
+python manage.py migrate
 if %errorlevel% equ 0 (
     echo.
     echo ========================================
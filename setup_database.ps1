@@ -99,13 +99,16 @@ try {
 }
 
 Write-Host ""
-Write-Host "Подключение к базе данных $DatabaseName..."
+Write-Host "Применение миграций схемы базы данных $DatabaseName..."
 
-# Подключаемся к базе данных и выполняем SQL скрипт
+# Применяем миграции схемы
 try {
-    if (Test-Path "database_setup.sql") {
-        $env:PGPASSWORD = $password
-        $setupResult = psql -U $UserName -h localhost -p $Port -d $DatabaseName -f "database_setup.sql" 2>&1
+    if (Test-Path "manage.py") {
+        $env:DB_PASSWORD = $password
+        $env:DB_PORT = $Port
+        $env:DB_NAME = $DatabaseName
+        $env:DB_USER = $UserName
+        $setupResult = python manage.py migrate 2>&1
         
         if ($LASTEXITCODE -eq 0) {
             Write-Host ""
@@ -140,15 +143,16 @@ try {
             Write-Host ""
         }
     } else {
-        Write-Host "ОШИБКА: Файл database_setup.sql не найден!" -ForegroundColor Red
+        Write-Host "ОШИБКА: Файл manage.py не найден!" -ForegroundColor Red
         Write-Host "Убедитесь, что файл находится в текущей папке" -ForegroundColor Yellow
     }
 } catch {
-    Write-Host "ОШИБКА при выполнении SQL скрипта: $_" -ForegroundColor Red
+    Write-Host "ОШИБКА при применении миграций: $_" -ForegroundColor Red
 }
 
-# Очищаем переменную окружения
+# Очищаем переменные окружения
 Remove-Item Env:PGPASSWORD -ErrorAction SilentlyContinue
+Remove-Item Env:DB_PASSWORD -ErrorAction SilentlyContinue
 
 Write-Host ""
 Write-Host "Нажмите любую клавишу для выхода..."
@@ -72,6 +72,15 @@ def test_postgresql_connection():
                 operations_exists = cursor.fetchone()[0]
                 print(f"   {'✓' if operations_exists else '❌'} Таблица 'operations': {'существует' if operations_exists else 'не найдена'}")
                 
+                # Проверяем версию схемы
+                from migrator import get_schema_version, latest_version
+                schema_version = get_schema_version(conn)
+                expected_version = latest_version()
+                schema_ok = schema_version >= expected_version
+                print(f"   {'✓' if schema_ok else '❌'} Версия схемы: {schema_version} (последняя: {expected_version})")
+                if not schema_ok:
+                    print("   Выполните: python manage.py migrate")
+                
                 # Проверяем количество пользователей
                 if users_exists:
                     cursor.execute("SELECT COUNT(*) FROM users;")
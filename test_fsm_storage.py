@@ -0,0 +1,132 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Проверка общих хранилищ FSM: PostgreSQLStorage (таблица fsm_states в базе
+из config.py) и RedisStorage (FSM_REDIS_URL или fakeredis в памяти).
+Записи создаются под служебным ключом и удаляются после проверки, но
+запускайте скрипт на тестовой базе данных.
+Запустите: python test_fsm_storage.py postgres redis
+Без сервера Redis: pip install fakeredis && python test_fsm_storage.py redis --fakeredis
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from aiogram.fsm.storage.base import BaseStorage, StorageKey
+
+# Служебный ключ, не совпадающий с чатами Telegram
+CHECK_KEY = StorageKey(bot_id=0, chat_id=-int(time.time()), user_id=0)
+
+# Срок хранения для проверки истечения записей, с
+SHORT_TTL = 1
+
+
+def check(condition: bool, description: str):
+    print(f"   {'✓' if condition else '❌'} {description}")
+    if not condition:
+        raise AssertionError(description)
+
+
+async def check_storage(storage: BaseStorage):
+    """Состояние и данные сохраняются, объединяются и удаляются"""
+    await storage.set_state(CHECK_KEY, "Check:state")
+    check(await storage.get_state(CHECK_KEY) == "Check:state", "set_state / get_state")
+
+    await storage.set_data(CHECK_KEY, {"template": 1, "text": "проверка"})
+    data = await storage.update_data(CHECK_KEY, {"amount": 100.5})
+    check(data == {"template": 1, "text": "проверка", "amount": 100.5}, "update_data объединяет данные")
+    check(await storage.get_data(CHECK_KEY) == data, "get_data возвращает объединенные данные")
+    check(await storage.get_state(CHECK_KEY) == "Check:state", "состояние не изменяется при записи данных")
+
+    await storage.set_state(CHECK_KEY, None)
+    await storage.set_data(CHECK_KEY, {})
+    check(await storage.get_state(CHECK_KEY) is None, "состояние очищено")
+    check(await storage.get_data(CHECK_KEY) == {}, "данные очищены")
+
+
+async def check_expiry(storage: BaseStorage):
+    """Записи не читаются после истечения срока хранения"""
+    await storage.set_state(CHECK_KEY, "Check:expiring")
+    await storage.set_data(CHECK_KEY, {"template": 2})
+    check(await storage.get_state(CHECK_KEY) == "Check:expiring", "запись со сроком хранения читается")
+    await asyncio.sleep(SHORT_TTL + 1)
+    check(await storage.get_state(CHECK_KEY) is None, "состояние истекло")
+    check(await storage.get_data(CHECK_KEY) == {}, "данные истекли")
+
+
+async def check_postgres():
+    from config import FSM_STATE_TTL
+    from database import db
+    from fsm_storage import PostgreSQLStorage
+
+    print("PostgreSQL (таблица fsm_states)...")
+    await db.open()
+    try:
+        await check_storage(PostgreSQLStorage(db.pool, ttl=FSM_STATE_TTL or None))
+        expiring = PostgreSQLStorage(db.pool, ttl=SHORT_TTL)
+        await check_expiry(expiring)
+        check(await expiring.purge_expired() >= 1, "purge_expired удаляет истекшие записи")
+    finally:
+        await db.close()
+
+
+async def check_redis(use_fakeredis: bool):
+    from config import FSM_REDIS_URL, FSM_STATE_TTL
+    from fsm_storage import create_redis_storage
+
+    if use_fakeredis:
+        from fakeredis import FakeAsyncRedis
+        print("Redis (fakeredis)...")
+        redis = FakeAsyncRedis()
+    else:
+        from redis.asyncio import Redis
+        print(f"Redis ({FSM_REDIS_URL})...")
+        redis = Redis.from_url(FSM_REDIS_URL)
+
+    storage = create_redis_storage(redis, FSM_STATE_TTL or None)
+    try:
+        await check_storage(storage)
+        # Дробный срок проверяет приведение к целым секундам для SET ex
+        await check_expiry(create_redis_storage(redis, SHORT_TTL + 0.5))
+    finally:
+        await storage.close()
+
+
+async def main(args) -> bool:
+    checks = {"postgres": check_postgres, "redis": lambda: check_redis(args.fakeredis)}
+    success = True
+    for backend in args.backends:
+        try:
+            await checks[backend]()
+        except ImportError as e:
+            print(f"   ❌ Ошибка импорта: {e}")
+            success = False
+        except AssertionError:
+            success = False
+        except Exception as e:
+            print(f"   ❌ Ошибка: {e}")
+            success = False
+        print()
+    return success
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Проверка хранилищ FSM")
+    parser.add_argument("backends", nargs="*", help="postgres и/или redis (по умолчанию оба)")
+    parser.add_argument("--fakeredis", action="store_true", help="Redis в памяти процесса (пакет fakeredis)")
+    args = parser.parse_args()
+    args.backends = args.backends or ["postgres", "redis"]
+    unknown = [backend for backend in args.backends if backend not in ("postgres", "redis")]
+    if unknown:
+        parser.error(f"неизвестные хранилища: {', '.join(unknown)}")
+
+    if asyncio.run(main(args)):
+        print("✅ Все проверки пройдены успешно!")
+    else:
+        print("❌ Проверка не пройдена.")
+        sys.exit(1)
@@ -0,0 +1,177 @@
+import time
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+from aiogram import BaseMiddleware
+from aiogram.dispatcher.flags import get_flag
+from aiogram.types import CallbackQuery, Message, TelegramObject, User
+
+from config import (
+    THROTTLE_NAVIGATION_RATE, THROTTLE_NAVIGATION_BURST,
+    THROTTLE_GENERATION_RATE, THROTTLE_GENERATION_BURST,
+    THROTTLE_PAYMENT_RATE, THROTTLE_PAYMENT_BURST,
+    THROTTLE_GLOBAL_RATE, THROTTLE_GLOBAL_BURST
+)
+from texts import DEFAULT_LANGUAGE, get_text
+
+# Класс обработчика по умолчанию (флаг throttling не задан)
+DEFAULT_CLASS = "navigation"
+
+# Как часто удаляются корзины неактивных пользователей, с
+SWEEP_INTERVAL = 60.0
+
+# Результат обработки отклоненного обновления
+THROTTLED = object()
+
+
+class TokenBucket:
+    """Корзина токенов: rate токенов в секунду, не более capacity"""
+
+    __slots__ = ("rate", "capacity", "tokens", "updated")
+
+    def __init__(self, rate: float, capacity: float, now: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = now
+
+    def consume(self, now: float) -> bool:
+        """Забирает один токен, если он есть"""
+        self._refill(now)
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return True
+        return False
+
+    def reserve(self, now: float) -> float:
+        """Забирает токен, возможно в долг, и возвращает время ожидания его появления"""
+        self._refill(now)
+        self.tokens -= 1
+        return 0.0 if self.tokens >= 0 else -self.tokens / self.rate
+
+    def wait_time(self, now: float) -> float:
+        """Время до появления свободного токена"""
+        self._refill(now)
+        return 0.0 if self.tokens >= 1 else (1 - self.tokens) / self.rate
+
+    def refund(self):
+        """Возвращает токен, забранный consume()"""
+        self.tokens = min(self.capacity, self.tokens + 1)
+
+    def is_full(self, now: float) -> bool:
+        return self.tokens + (now - self.updated) * self.rate >= self.capacity
+
+    def _refill(self, now: float):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+
+class ThrottlingMiddleware(BaseMiddleware):
+    """Ограничение частоты обновлений по пользователю и классу обработчика.
+
+    Класс обработчика задается флагом throttling (например,
+    flags={"throttling": "generation"}), без флага используется navigation.
+    Для каждой пары (класс, пользователь) и для всех обновлений вместе
+    ведутся корзины токенов. Лишние обновления не передаются обработчику:
+    на callback отвечается уведомлением, на сообщение - тем же уведомлением,
+    но не чаще одного раза за время пополнения корзины на один токен.
+    """
+
+    def __init__(self, classes: Dict[str, Tuple[float, float]],
+                 global_limit: Optional[Tuple[float, float]] = None):
+        # Класс обработчика -> (токенов в секунду, размер корзины)
+        self.classes = classes
+        # False пропускает все обновления (например, в нагрузочном тесте)
+        self.enabled = True
+        self.allowed: Dict[str, int] = {name: 0 for name in classes}
+        self.throttled: Dict[str, int] = {name: 0 for name in classes}
+        self.throttled_global = 0
+
+        now = time.monotonic()
+        self._global = TokenBucket(*global_limit, now) if global_limit else None
+        self._buckets: Dict[Tuple[str, int], TokenBucket] = {}
+        # (класс, пользователь) -> время, до которого уведомление на сообщения не повторяется
+        self._notice_until: Dict[Tuple[str, int], float] = {}
+        self._next_sweep = now + SWEEP_INTERVAL
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any]
+    ) -> Any:
+        user = data.get("event_from_user")
+        handler_class = get_flag(data, "throttling", default=DEFAULT_CLASS)
+        limit = self.classes.get(handler_class)
+        if not self.enabled or user is None or limit is None:
+            return await handler(event, data)
+
+        now = time.monotonic()
+        if now >= self._next_sweep:
+            self._sweep(now)
+
+        key = (handler_class, user.id)
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            bucket = self._buckets[key] = TokenBucket(*limit, now)
+
+        if not bucket.consume(now):
+            self.throttled[handler_class] += 1
+            return await self._reject(event, user, key, bucket, now)
+
+        if self._global is not None and not self._global.consume(now):
+            # Обновление не обработано, токен пользователя не должен тратиться
+            bucket.refund()
+            self.throttled_global += 1
+            return await self._reject(event, user, key, self._global, now)
+
+        self.allowed[handler_class] += 1
+        return await handler(event, data)
+
+    def stats(self) -> dict:
+        """Счетчики пропущенных и отклоненных обновлений"""
+        return {
+            "allowed": dict(self.allowed),
+            "throttled": dict(self.throttled),
+            "throttled_global": self.throttled_global,
+            "buckets": len(self._buckets)
+        }
+
+    async def _reject(self, event: TelegramObject, user: User, key: Tuple[str, int],
+                      bucket: TokenBucket, now: float) -> object:
+        if isinstance(event, Message):
+            # Серия отклоненных сообщений получает одно уведомление за время
+            # появления токена в отклонившей корзине
+            if now < self._notice_until.get(key, 0.0):
+                return THROTTLED
+            self._notice_until[key] = now + 1 / bucket.rate
+        elif not isinstance(event, CallbackQuery):
+            return THROTTLED
+
+        # Без ответа на callback у пользователя продолжает крутиться индикатор.
+        # Профиль не загружается для отклоненных обновлений: язык берется
+        # из клиента Telegram (неизвестные языки заменяются языком по умолчанию)
+        language = (user.language_code or DEFAULT_LANGUAGE).split("-")[0]
+        await event.answer(get_text(language, "throttled"))
+        return THROTTLED
+
+    def _sweep(self, now: float):
+        # Полная корзина ничем не отличается от новой, ее можно удалить
+        self._buckets = {
+            key: bucket for key, bucket in self._buckets.items() if not bucket.is_full(now)
+        }
+        self._notice_until = {
+            key: until for key, until in self._notice_until.items() if until > now
+        }
+        self._next_sweep = now + SWEEP_INTERVAL
+
+
+def create_throttling() -> ThrottlingMiddleware:
+    """Создает middleware с ограничениями из конфигурации"""
+    return ThrottlingMiddleware(
+        {
+            "navigation": (THROTTLE_NAVIGATION_RATE, THROTTLE_NAVIGATION_BURST),
+            "generation": (THROTTLE_GENERATION_RATE, THROTTLE_GENERATION_BURST),
+            "payment": (THROTTLE_PAYMENT_RATE, THROTTLE_PAYMENT_BURST),
+        },
+        global_limit=(THROTTLE_GLOBAL_RATE, THROTTLE_GLOBAL_BURST) if THROTTLE_GLOBAL_RATE > 0 else None
+    )
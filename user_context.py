@@ -0,0 +1,62 @@
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Dict, Tuple
+
+from aiogram import BaseMiddleware
+from aiogram.types import TelegramObject
+
+from database import db
+
+
+@dataclass
+class UserContext:
+    """Данные пользователя в пределах одного обновления.
+
+    Загружается один раз до обработчика и передается ему аргументом user.
+    Изменения баланса и языка выполняются через методы контекста, которые
+    сразу обновляют его поля, поэтому повторно читать профиль не нужно.
+    """
+    user_id: int
+    language: str
+    balance: float
+    exists: bool = True
+
+    async def deduct_credits(self, amount: float) -> Tuple[bool, float]:
+        """Списывает кредиты и обновляет баланс контекста"""
+        success, balance = await db.deduct_credits(self.user_id, amount)
+        # При нехватке средств запрос тоже возвращает актуальный баланс
+        self.balance = balance
+        return success, balance
+
+    async def add_balance(self, amount: float) -> float:
+        """Пополняет баланс и обновляет баланс контекста"""
+        balance = await db.add_balance(self.user_id, amount)
+        self.balance = balance
+        return balance
+
+    async def set_language(self, language: str):
+        """Сохраняет язык (создавая пользователя при необходимости)"""
+        profile = await db.set_user_language(self.user_id, language)
+        self.language = profile.language
+        self.balance = profile.balance
+        self.exists = True
+
+
+class UserContextMiddleware(BaseMiddleware):
+    """Загружает профиль пользователя один раз на обновление"""
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any]
+    ) -> Any:
+        from_user = data.get("event_from_user")
+        if from_user is not None:
+            profile = await db.get_user_profile(from_user.id)
+            data["user"] = UserContext(
+                user_id=from_user.id,
+                language=profile.language,
+                balance=profile.balance,
+                exists=profile.exists
+            )
+        return await handler(event, data)
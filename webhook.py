@@ -0,0 +1,131 @@
+import asyncio
+import secrets
+import signal
+from typing import Optional, Set
+
+from aiohttp import web
+from aiogram import Bot, Dispatcher
+
+from config import (
+    WEBHOOK_URL, WEBHOOK_PATH, WEBHOOK_HOST, WEBHOOK_PORT,
+    WEBHOOK_SECRET, WEBHOOK_MAX_IN_FLIGHT, WEBHOOK_SHUTDOWN_TIMEOUT
+)
+
+# Заголовок, в котором Telegram передает секрет, заданный в setWebhook
+SECRET_TOKEN_HEADER = "X-Telegram-Bot-Api-Secret-Token"
+
+
+class WebhookHandler:
+    """Прием обновлений от Telegram через webhook.
+
+    Обновление подтверждается ответом 200 сразу после проверки секрета и
+    разбора тела, а обработчики выполняются в фоновой задаче. Если в работе
+    уже max_in_flight обновлений, запрос отклоняется с кодом 503 и Telegram
+    повторит его позже.
+    """
+
+    def __init__(self, dp: Dispatcher, bot: Bot, secret_token: Optional[str] = None,
+                 max_in_flight: int = 100):
+        self.dp = dp
+        self.bot = bot
+        self.secret_token = secret_token
+        self.max_in_flight = max_in_flight
+        self.accepted = 0
+        self.rejected = 0
+
+        self._tasks: Set[asyncio.Task] = set()
+        self._closing = False
+
+    @property
+    def in_flight(self) -> int:
+        return len(self._tasks)
+
+    async def handle(self, request: web.Request) -> web.Response:
+        """Принимает одно обновление"""
+        if self.secret_token and not secrets.compare_digest(
+                request.headers.get(SECRET_TOKEN_HEADER, ""), self.secret_token):
+            return web.Response(status=401, text="Unauthorized")
+
+        if self._closing or len(self._tasks) >= self.max_in_flight:
+            self.rejected += 1
+            return web.Response(status=503, text="Busy", headers={"Retry-After": "1"})
+
+        # Тело не в UTF-8 (UnicodeDecodeError) и некорректный JSON - ValueError
+        try:
+            update = await request.json()
+        except ValueError:
+            return web.Response(status=400, text="Bad Request")
+        if not isinstance(update, dict):
+            return web.Response(status=400, text="Bad Request")
+
+        task = asyncio.create_task(self._process(update))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        self.accepted += 1
+        return web.Response(status=200)
+
+    async def close(self, timeout: float):
+        """Перестает принимать обновления и ждет завершения начатых"""
+        self._closing = True
+        if not self._tasks:
+            return
+
+        _, pending = await asyncio.wait(set(self._tasks), timeout=timeout)
+        for task in pending:
+            task.cancel()
+        if pending:
+            print(f"Прервана обработка обновлений при остановке: {len(pending)}")
+
+    async def _process(self, update: dict):
+        try:
+            await self.dp.feed_raw_update(self.bot, update)
+        except Exception as e:
+            print(f"Ошибка обработки обновления {update.get('update_id')}: {e}")
+
+
+async def run_webhook(dp: Dispatcher, bot: Bot):
+    """Запускает aiohttp-сервер и обрабатывает обновления до сигнала остановки"""
+    handler = WebhookHandler(
+        dp, bot,
+        secret_token=WEBHOOK_SECRET or None,
+        max_in_flight=WEBHOOK_MAX_IN_FLIGHT
+    )
+
+    app = web.Application()
+    app.router.add_post(WEBHOOK_PATH, handler.handle)
+
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, WEBHOOK_HOST, WEBHOOK_PORT)
+
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for signal_name in ('SIGINT', 'SIGTERM'):
+        # На Windows обработчики сигналов в цикле событий не поддерживаются,
+        # там остановка происходит через KeyboardInterrupt
+        try:
+            loop.add_signal_handler(getattr(signal, signal_name), stop.set)
+        except (AttributeError, NotImplementedError):
+            pass
+
+    await dp.emit_startup(bot=bot)
+    try:
+        await site.start()
+        if WEBHOOK_URL:
+            # Вызов идемпотентен, поэтому его могут выполнять все экземпляры бота
+            await bot.set_webhook(
+                WEBHOOK_URL.rstrip('/') + WEBHOOK_PATH,
+                secret_token=WEBHOOK_SECRET or None,
+                allowed_updates=dp.resolve_used_update_types(),
+                # Telegram принимает от 1 до 100 соединений
+                max_connections=max(1, min(WEBHOOK_MAX_IN_FLIGHT, 100))
+            )
+        if not WEBHOOK_SECRET:
+            print("WEBHOOK_SECRET не задан: запросы к webhook не проверяются")
+        print(f"Webhook слушает http://{WEBHOOK_HOST}:{WEBHOOK_PORT}{WEBHOOK_PATH}")
+
+        await stop.wait()
+    finally:
+        await handler.close(WEBHOOK_SHUTDOWN_TIMEOUT)
+        await runner.cleanup()
+        await dp.emit_shutdown(bot=bot)